@@ -0,0 +1,38 @@
+"""add lookup indexes
+
+Revision ID: 3f1c8e2a9b47
+Revises: d39356de87a3
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f1c8e2a9b47'
+down_revision = 'd39356de87a3'
+
+INDEXES = [
+    ('chatd_user__idx__tenant_uuid', 'chatd_user', ['tenant_uuid']),
+    ('chatd_session__idx__user_uuid', 'chatd_session', ['user_uuid']),
+    ('chatd_refresh_token__idx__user_uuid', 'chatd_refresh_token', ['user_uuid']),
+    ('chatd_line__idx__user_uuid', 'chatd_line', ['user_uuid']),
+    ('chatd_line__idx__endpoint_name', 'chatd_line', ['endpoint_name']),
+    ('chatd_channel__idx__line_id', 'chatd_channel', ['line_id']),
+    ('chatd_room__idx__tenant_uuid', 'chatd_room', ['tenant_uuid']),
+    ('chatd_room_user__idx__uuid', 'chatd_room_user', ['uuid', 'tenant_uuid']),
+    (
+        'chatd_room_message__idx__room_uuid_created_at',
+        'chatd_room_message',
+        ['room_uuid', 'created_at'],
+    ),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
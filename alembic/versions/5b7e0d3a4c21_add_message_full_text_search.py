@@ -0,0 +1,63 @@
+"""add message full text search
+
+Revision ID: 5b7e0d3a4c21
+Revises: 9a4d2c61e0f3
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0d3a4c21'
+down_revision = '9a4d2c61e0f3'
+
+
+def upgrade():
+    # The simple dictionary does not stem, which keeps the search language agnostic
+    op.execute('CREATE TEXT SEARCH CONFIGURATION chatd_unaccent (COPY = simple)')
+    op.execute('''
+        ALTER TEXT SEARCH CONFIGURATION chatd_unaccent
+        ALTER MAPPING FOR
+            asciiword, asciihword, hword_asciipart,
+            word, hword, hword_part,
+            numword, numhword, hword_numpart
+        WITH unaccent, simple
+        ''')
+
+    op.add_column('chatd_room_message', sa.Column('search_vector', TSVECTOR))
+    op.execute('''
+        CREATE FUNCTION chatd_room_message_search_vector()
+        RETURNS trigger AS
+        $$
+        BEGIN
+            NEW.search_vector := to_tsvector('chatd_unaccent', coalesce(NEW.content, ''));
+            RETURN NEW;
+        END
+        $$
+        LANGUAGE plpgsql
+        ''')
+    op.execute('''
+        CREATE TRIGGER chatd_room_message_search_vector
+        BEFORE INSERT OR UPDATE OF content ON chatd_room_message
+        FOR EACH ROW EXECUTE PROCEDURE chatd_room_message_search_vector()
+        ''')
+    op.execute('''
+        UPDATE chatd_room_message
+        SET search_vector = to_tsvector('chatd_unaccent', coalesce(content, ''))
+        ''')
+    op.create_index(
+        'chatd_room_message__idx__search_vector',
+        'chatd_room_message',
+        ['search_vector'],
+        postgresql_using='gin',
+    )
+
+
+def downgrade():
+    op.drop_index('chatd_room_message__idx__search_vector')
+    op.execute('DROP TRIGGER chatd_room_message_search_vector ON chatd_room_message')
+    op.execute('DROP FUNCTION chatd_room_message_search_vector()')
+    op.drop_column('chatd_room_message', 'search_vector')
+    op.execute('DROP TEXT SEARCH CONFIGURATION chatd_unaccent')
@@ -0,0 +1,33 @@
+"""add room message count
+
+Revision ID: 9a4d2c61e0f3
+Revises: 3f1c8e2a9b47
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2c61e0f3'
+down_revision = '3f1c8e2a9b47'
+
+
+def upgrade():
+    op.add_column(
+        'chatd_room',
+        sa.Column('message_count', sa.Integer, nullable=False, server_default='0'),
+    )
+    op.execute('''
+        UPDATE chatd_room SET message_count = counts.count
+        FROM (
+            SELECT room_uuid, count(*) AS count
+            FROM chatd_room_message
+            GROUP BY room_uuid
+        ) AS counts
+        WHERE chatd_room.uuid = counts.room_uuid
+        ''')
+
+
+def downgrade():
+    op.drop_column('chatd_room', 'message_count')
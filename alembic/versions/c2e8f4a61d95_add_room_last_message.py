@@ -0,0 +1,31 @@
+"""add room last message
+
+Revision ID: c2e8f4a61d95
+Revises: 5b7e0d3a4c21
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8f4a61d95'
+down_revision = '5b7e0d3a4c21'
+
+
+def upgrade():
+    op.add_column('chatd_room', sa.Column('last_message_uuid', UUID))
+    op.execute('''
+        UPDATE chatd_room SET last_message_uuid = latest.uuid
+        FROM (
+            SELECT DISTINCT ON (room_uuid) room_uuid, uuid
+            FROM chatd_room_message
+            ORDER BY room_uuid, created_at DESC
+        ) AS latest
+        WHERE chatd_room.uuid = latest.room_uuid
+        ''')
+
+
+def downgrade():
+    op.drop_column('chatd_room', 'last_message_uuid')
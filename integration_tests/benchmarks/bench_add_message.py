@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import logging
+import statistics
+import time
+import uuid
+
+from wazo_chatd.database.helpers import Session, init_db
+from wazo_chatd.database.models import Room, RoomMessage
+from wazo_chatd.database.queries import DAO
+
+from bench_initiator import DEFAULT_DB_URI
+from bench_search import percentile
+
+
+def seed(session, tenant_uuid, messages):
+    room_uuid = str(uuid.uuid4())
+    params = {'tenant_uuid': tenant_uuid, 'room_uuid': room_uuid, 'messages': messages}
+    session.execute(
+        'INSERT INTO chatd_tenant (uuid) VALUES (:tenant_uuid) ON CONFLICT DO NOTHING',
+        params,
+    )
+    session.execute(
+        '''
+        INSERT INTO chatd_room (uuid, tenant_uuid, message_count)
+        VALUES (:room_uuid, :tenant_uuid, :messages)
+        ''',
+        params,
+    )
+    session.execute(
+        '''
+        INSERT INTO chatd_room_message
+            (room_uuid, content, user_uuid, tenant_uuid, wazo_uuid, created_at)
+        SELECT
+            :room_uuid,
+            'message ' || i,
+            uuid_generate_v4(),
+            :tenant_uuid,
+            uuid_generate_v4(),
+            now() - i * interval '1 second'
+        FROM generate_series(1, :messages) AS i
+        ''',
+        params,
+    )
+    session.commit()
+    session.execute('ANALYZE chatd_room, chatd_room_message')
+    return room_uuid
+
+
+def clean(session, tenant_uuid):
+    session.execute(
+        'DELETE FROM chatd_tenant WHERE uuid = :tenant_uuid',
+        {'tenant_uuid': tenant_uuid},
+    )
+    session.commit()
+
+
+def insert_message(dao, room, message):
+    dao.room.add_message(room, message)
+
+
+def append_message(dao, room, message):
+    """The previous implementation, loading the history through room.messages"""
+    room.messages.append(message)
+    dao.room.session.flush()
+    room.message_count = Room.message_count + 1
+    room.last_message_uuid = message.uuid
+    dao.room.session.flush()
+
+
+def time_inserts(dao, tenant_uuid, room_uuid, runs, add_message):
+    durations = []
+    for run in range(runs):
+        room = dao.room.get([tenant_uuid], room_uuid)
+        message = RoomMessage(
+            content=f'benchmark {run}',
+            user_uuid=uuid.uuid4(),
+            tenant_uuid=tenant_uuid,
+            wazo_uuid=uuid.uuid4(),
+        )
+        start = time.monotonic()
+        add_message(dao, room, message)
+        Session.commit()
+        durations.append(time.monotonic() - start)
+        Session.remove()
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the insertion of a message by size of the room history'
+    )
+    parser.add_argument('--db-uri', default=DEFAULT_DB_URI)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 10000, 1000000])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument(
+        '--compare',
+        action='store_true',
+        help='also time the previous insertion through room.messages',
+    )
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    init_db(args.db_uri)
+    dao = DAO()
+
+    implementations = [('add_message', insert_message)]
+    if args.compare:
+        implementations.append(('room.messages', append_message))
+
+    tenant_uuid = str(uuid.uuid4())
+    try:
+        for size in args.sizes:
+            start = time.monotonic()
+            room_uuid = seed(Session(), tenant_uuid, size)
+            elapsed = time.monotonic() - start
+            print(f'seeded a room of {size} messages in {elapsed:.1f}s')
+            for label, add_message in implementations:
+                durations = time_inserts(
+                    dao, tenant_uuid, room_uuid, args.runs, add_message
+                )
+                print(
+                    f'{label} ({size} messages): '
+                    f'p50 {statistics.median(durations) * 1000:.1f}ms '
+                    f'p99 {percentile(durations, 99) * 1000:.1f}ms '
+                    f'({args.runs} runs)'
+                )
+    finally:
+        clean(Session(), tenant_uuid)
+
+
+if __name__ == '__main__':
+    main()
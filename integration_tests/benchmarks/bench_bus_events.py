@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import json
+import logging
+import threading
+import time
+import uuid
+
+from collections import defaultdict
+
+from sqlalchemy import event as sa_event
+
+from wazo_chatd.bus import BusEventDispatcher
+from wazo_chatd.database.helpers import Session, init_db
+from wazo_chatd.database.queries import DAO
+from wazo_chatd.plugins.presences.bus_consume import (
+    BusEventHandler,
+    EndpointOwners,
+    StoreBusEventHandler,
+)
+from wazo_chatd.plugins.presences.initiator import Initiator
+from wazo_chatd.plugins.presences.notifier import PresenceNotifier, PresencePublisher
+from wazo_chatd.plugins.presences.persister import PresencePersister
+from wazo_chatd.plugins.presences.store import PresenceStore
+
+from bench_initiator import (
+    DEFAULT_DB_URI,
+    FakeAmid,
+    FakeAuth,
+    FakeConfd,
+    generate_dataset,
+)
+
+
+class CountingBus:
+    def __init__(self):
+        self.count = 0
+
+    def publish(self, event, on_error=None):
+        self.count += 1
+
+
+class FakeConsumer:
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, event_name, handler):
+        self._handlers[event_name] = handler
+
+    def consume(self, event_name, payload):
+        self._handlers[event_name](payload)
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self._lock = threading.Lock()
+        self.count = 0
+        sa_event.listen(engine, 'before_cursor_execute', self._executed)
+
+    def _executed(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+class LatencyRecorder:
+    """Wrap the handlers to time them"""
+
+    def __init__(self, dispatcher):
+        self._dispatcher = dispatcher
+        self._lock = threading.Lock()
+        self.latencies = []
+
+    def subscribe(self, event_name, handler, key=None):
+        def timed(payload):
+            start = time.monotonic()
+            try:
+                handler(payload)
+            finally:
+                elapsed = time.monotonic() - start
+                with self._lock:
+                    self.latencies.append(elapsed)
+
+        self._dispatcher.subscribe(event_name, timed, key=key)
+
+
+def channel_storm(users, calls):
+    """Every call rings, is answered, put on hold, resumed and hung up"""
+    events = []
+    for call in range(calls):
+        user = users[call % len(users)]
+        endpoint = f'PJSIP/{user["lines"][0]["name"]}'
+        channel = f'{endpoint}-{call:08x}'
+        events += [
+            ('Newchannel', {'Channel': channel, 'ChannelStateDesc': 'Ring'}),
+            ('DeviceStateChange', {'Device': endpoint, 'State': 'RINGING'}),
+            ('Newstate', {'Channel': channel, 'ChannelStateDesc': 'Ringing'}),
+            ('Newstate', {'Channel': channel, 'ChannelStateDesc': 'Up'}),
+            ('DeviceStateChange', {'Device': endpoint, 'State': 'INUSE'}),
+            ('Hold', {'Channel': channel}),
+            ('Unhold', {'Channel': channel, 'ChannelStateDesc': 'Up'}),
+            ('Hangup', {'Channel': channel}),
+            ('DeviceStateChange', {'Device': endpoint, 'State': 'NOT_INUSE'}),
+        ]
+    return events
+
+
+def login_wave(users, logins):
+    """Users log in, then every session is deleted"""
+    created, deleted = [], []
+    for login in range(logins):
+        user = users[login % len(users)]
+        session = {
+            'uuid': str(uuid.uuid4()),
+            'user_uuid': user['uuid'],
+            'tenant_uuid': user['tenant_uuid'],
+        }
+        created.append(('auth_session_created', dict(session, mobile=login % 3 == 0)))
+        deleted.append(('auth_session_deleted', session))
+    return created + deleted
+
+
+def load_recording(path):
+    """One JSON object per line: {"name": "Newstate", "payload": {...}}"""
+    with open(path) as f:
+        return [
+            (record['name'], record['payload'])
+            for record in (json.loads(line) for line in f if line.strip())
+        ]
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def replay(events, args, store, persister, endpoint_owners, query_counter):
+    notifier_bus = CountingBus()
+    notifier = PresenceNotifier(PresencePublisher(notifier_bus))
+    if store:
+        handler = StoreBusEventHandler(
+            DAO(), notifier, store, persister, endpoint_owners
+        )
+    else:
+        handler = BusEventHandler(DAO(), notifier, endpoint_owners)
+
+    consumer = FakeConsumer()
+    dispatcher = BusEventDispatcher(consumer, workers=args.workers)
+    recorder = LatencyRecorder(dispatcher)
+    handler.subscribe(recorder)
+
+    queries = query_counter.count
+    start = time.monotonic()
+    with dispatcher:
+        for name, payload in events:
+            consumer.consume(name, payload)
+    if persister:
+        persister.flush()
+    elapsed = time.monotonic() - start
+    queries = query_counter.count - queries
+
+    status = defaultdict(dict)
+    dispatcher.provide_status(status)
+    latencies = recorder.latencies
+    return {
+        'events': len(events),
+        'failed': status['bus_dispatcher']['failed'],
+        'published': notifier_bus.count,
+        'events_per_second': len(events) / elapsed,
+        'latency_p50_ms': percentile(latencies, 50) * 1000,
+        'latency_p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_event': queries / len(events),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay bus events against the presence handlers'
+    )
+    parser.add_argument('--db-uri', default=DEFAULT_DB_URI)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tenants', type=int, default=10)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--logins', type=int, default=5000)
+    parser.add_argument(
+        '--recording',
+        action='append',
+        default=[],
+        help='JSON lines file of recorded events to replay, may be repeated',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='bus dispatcher threads, 0 to handle the events sequentially',
+    )
+    parser.add_argument(
+        '--store', action='store_true', help='use the in-memory presence store'
+    )
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    init_db(args.db_uri, pool_size=max(args.workers, 1) + 2)
+    query_counter = QueryCounter(Session.bind)
+
+    tenants, users, sessions, tokens, devices, channels = generate_dataset(
+        args.users, args.tenants
+    )
+    store = persister = None
+    if args.store:
+        store = PresenceStore()
+        persister = PresencePersister()
+        persister.start()
+    endpoint_owners = EndpointOwners()
+    initiator = Initiator(
+        DAO(),
+        FakeAuth(tenants, sessions, tokens),
+        FakeAmid(devices, channels),
+        FakeConfd(users),
+        store,
+        persister,
+        endpoint_owners=endpoint_owners,
+    )
+    initiator.initiate()
+
+    scenarios = [
+        ('channel_storm', channel_storm(users, args.calls)),
+        ('login_wave', login_wave(users, args.logins)),
+    ]
+    scenarios += [(path, load_recording(path)) for path in args.recording]
+
+    results = {}
+    try:
+        for name, events in scenarios:
+            result = results[name] = replay(
+                events, args, store, persister, endpoint_owners, query_counter
+            )
+            print(
+                f'{name}: {result["events"]} events, '
+                f'{result["events_per_second"]:.0f} events/s, '
+                f'p50 {result["latency_p50_ms"]:.2f}ms, '
+                f'p99 {result["latency_p99_ms"]:.2f}ms, '
+                f'{result["queries_per_event"]:.1f} queries/event, '
+                f'{result["published"]} presence events, '
+                f'{result["failed"]} failed'
+            )
+    finally:
+        if persister:
+            persister.stop()
+        initiator.initiate_tenants([])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
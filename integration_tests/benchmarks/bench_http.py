@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import logging
+import multiprocessing
+import random
+import re
+import threading
+import time
+import uuid
+
+from collections import defaultdict
+
+import requests
+
+from cheroot import wsgi
+
+from wazo_chatd.database.helpers import Session, init_db
+from wazo_chatd.database.models import (
+    Endpoint,
+    Line,
+    RefreshToken,
+    Room,
+    RoomMessage,
+    RoomUser,
+    Session as UserSession,
+    Tenant,
+    User,
+)
+
+from bench_initiator import DEFAULT_DB_URI
+
+WAZO_UUID = str(uuid.uuid4())
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+STATES = ('available', 'unavailable', 'invisible', 'away')
+
+logger = logging.getLogger(__name__)
+
+
+class AuthStandIn:
+    """Answers the wazo-auth requests of wazo-chatd for the seeded tokens
+
+    Every known token is valid for every ACL: only the cost of the round trip
+    to wazo-auth is kept.
+    """
+
+    def __init__(self, dataset, host, port):
+        self._tokens = {
+            dataset['admin']['token']: dataset['admin'],
+            dataset['service']['token']: dataset['service'],
+        }
+        self._tokens.update((user['token'], user) for user in dataset['users'])
+        self._children = defaultdict(list)
+        for tenant in dataset['tenants']:
+            if tenant['parent_uuid'] != tenant['uuid']:
+                self._children[tenant['parent_uuid']].append(tenant)
+        self._tenants = {tenant['uuid']: tenant for tenant in dataset['tenants']}
+        self._service = dataset['service']
+        self._server = wsgi.WSGIServer((host, port), self._app, numthreads=32)
+        self._thread = None
+
+    def start(self):
+        self._server.prepare()
+        self._thread = threading.Thread(target=self._server.serve, name='auth')
+        self._thread.start()
+
+    def stop(self):
+        self._server.stop()
+        self._thread.join()
+
+    def _app(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ['PATH_INFO']
+        if method == 'POST' and path.endswith('/token'):
+            return self._respond(start_response, '200 OK', self._token(self._service))
+
+        match = re.search(r'/token/([^/]+)$', path)
+        if match:
+            owner = self._tokens.get(match.group(1))
+            if not owner:
+                return self._respond(start_response, '404 Not Found', {})
+            if method == 'HEAD':
+                return self._respond(start_response, '204 No Content')
+            return self._respond(start_response, '200 OK', self._token(owner))
+
+        if path.endswith('/tenants'):
+            owner = self._tokens.get(environ.get('HTTP_X_AUTH_TOKEN'))
+            if not owner:
+                return self._respond(start_response, '401 Unauthorized', {})
+            tenant_uuid = environ.get('HTTP_WAZO_TENANT') or owner['tenant_uuid']
+            tenants = self._visible_tenants(tenant_uuid)
+            body = {'items': tenants, 'total': len(tenants), 'filtered': len(tenants)}
+            return self._respond(start_response, '200 OK', body)
+
+        return self._respond(start_response, '404 Not Found', {})
+
+    def _respond(self, start_response, status, body=None):
+        if body is None:
+            start_response(status, [])
+            return []
+        start_response(status, [('Content-Type', 'application/json')])
+        return [json.dumps(body).encode()]
+
+    def _token(self, owner):
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        return {
+            'data': {
+                'token': owner['token'],
+                'auth_id': owner['uuid'],
+                'xivo_uuid': WAZO_UUID,
+                'expires_at': expires_at.isoformat(),
+                'utc_expires_at': expires_at.isoformat(),
+                'acl': ['#'],
+                'metadata': {
+                    'uuid': owner['uuid'],
+                    'tenant_uuid': owner['tenant_uuid'],
+                    'pbx_user_uuid': owner.get('pbx_user_uuid'),
+                },
+            }
+        }
+
+    def _visible_tenants(self, tenant_uuid):
+        tenant = self._tenants.get(tenant_uuid)
+        if not tenant:
+            return []
+        tenants = [tenant]
+        for child in self._children[tenant_uuid]:
+            tenants += self._visible_tenants(child['uuid'])
+        return tenants
+
+
+def seed(session, tenant_count, user_count, room_count, messages_per_room):
+    master = {'uuid': str(uuid.uuid4())}
+    master['parent_uuid'] = master['uuid']
+    tenants = [master] + [
+        {'uuid': str(uuid.uuid4()), 'parent_uuid': master['uuid']}
+        for _ in range(tenant_count)
+    ]
+    session.execute(Tenant.__table__.insert(), [{'uuid': t['uuid']} for t in tenants])
+
+    users, lines, endpoints, sessions, tokens = [], [], [], [], []
+    line_id = random.randint(1000000, 2000000000 - user_count)
+    for i in range(user_count):
+        tenant_uuid = tenants[i % len(tenants)]['uuid']
+        user_uuid = str(uuid.uuid4())
+        users.append(
+            {
+                'uuid': user_uuid,
+                'tenant_uuid': tenant_uuid,
+                'state': random.choice(STATES),
+                'status': f'status {i}',
+                'do_not_disturb': i % 10 == 0,
+            }
+        )
+        endpoint_name = f'PJSIP/load-{user_uuid}'
+        endpoints.append({'name': endpoint_name, 'state': 'available'})
+        lines.append(
+            {'id': line_id + i, 'user_uuid': user_uuid, 'endpoint_name': endpoint_name}
+        )
+        if i % 2:
+            sessions.append({'uuid': str(uuid.uuid4()), 'user_uuid': user_uuid})
+        if i % 3 == 0:
+            tokens.append(
+                {'client_id': 'mobile', 'user_uuid': user_uuid, 'mobile': True}
+            )
+    session.execute(User.__table__.insert(), users)
+    session.execute(Endpoint.__table__.insert(), endpoints)
+    session.execute(Line.__table__.insert(), lines)
+    session.execute(UserSession.__table__.insert(), sessions)
+    session.execute(RefreshToken.__table__.insert(), tokens)
+
+    users_by_tenant = defaultdict(list)
+    for user in users:
+        users_by_tenant[user['tenant_uuid']].append(user)
+
+    rooms, room_users, messages = [], [], []
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user_rooms = defaultdict(list)
+    for i in range(room_count):
+        members = random.sample(users_by_tenant[tenants[i % len(tenants)]['uuid']], 2)
+        room = {
+            'uuid': str(uuid.uuid4()),
+            'name': f'room {i}',
+            'tenant_uuid': members[0]['tenant_uuid'],
+            'message_count': messages_per_room,
+            'last_message_uuid': None,
+        }
+        for member in members:
+            user_rooms[member['uuid']].append(room['uuid'])
+            room_users.append(
+                {
+                    'room_uuid': room['uuid'],
+                    'uuid': member['uuid'],
+                    'tenant_uuid': member['tenant_uuid'],
+                    'wazo_uuid': WAZO_UUID,
+                }
+            )
+        for j in range(messages_per_room):
+            author = members[j % 2]
+            message_uuid = str(uuid.uuid4())
+            messages.append(
+                {
+                    'uuid': message_uuid,
+                    'room_uuid': room['uuid'],
+                    'content': f'message {j} of room {i}',
+                    'alias': f'alias {j % 2}',
+                    'user_uuid': author['uuid'],
+                    'tenant_uuid': author['tenant_uuid'],
+                    'wazo_uuid': WAZO_UUID,
+                    'created_at': now - datetime.timedelta(minutes=j),
+                }
+            )
+            if j == 0:
+                room['last_message_uuid'] = message_uuid
+        rooms.append(room)
+    session.execute(Room.__table__.insert(), rooms)
+    session.execute(RoomUser.__table__.insert(), room_users)
+    for start in range(0, len(messages), 10000):
+        stop = start + 10000
+        session.execute(RoomMessage.__table__.insert(), messages[start:stop])
+    session.commit()
+    session.execute('ANALYZE')
+
+    return {
+        'tenants': tenants,
+        'admin': {
+            'token': str(uuid.uuid4()),
+            'uuid': str(uuid.uuid4()),
+            'tenant_uuid': master['uuid'],
+        },
+        'service': {
+            'token': str(uuid.uuid4()),
+            'uuid': str(uuid.uuid4()),
+            'tenant_uuid': master['uuid'],
+        },
+        'users': [
+            {
+                'token': str(uuid.uuid4()),
+                'uuid': str(uuid.uuid4()),
+                'pbx_user_uuid': user['uuid'],
+                'tenant_uuid': user['tenant_uuid'],
+                'rooms': user_rooms[user['uuid']],
+            }
+            for user in users
+        ],
+    }
+
+
+def clean(session, dataset):
+    tenant_uuids = [tenant['uuid'] for tenant in dataset['tenants']]
+    # Lines and endpoints are not deleted along with the tenants
+    session.execute(
+        'DELETE FROM chatd_endpoint WHERE name IN '
+        '(SELECT endpoint_name FROM chatd_line WHERE user_uuid IN '
+        '(SELECT uuid FROM chatd_user WHERE tenant_uuid::text = ANY(:tenants)))',
+        {'tenants': tenant_uuids},
+    )
+    session.execute(
+        'DELETE FROM chatd_tenant WHERE uuid::text = ANY(:tenants)',
+        {'tenants': tenant_uuids},
+    )
+    session.commit()
+
+
+def _presences(dataset, rng):
+    return dataset['admin']['token'], 'GET', '/users/presences', None
+
+
+def _presences_recurse(dataset, rng):
+    return dataset['admin']['token'], 'GET', '/users/presences?recurse=true', None
+
+
+def _presences_by_user(dataset, rng):
+    users = rng.sample(dataset['users'], 10)
+    uuids = ','.join(user['pbx_user_uuid'] for user in users)
+    return (
+        dataset['admin']['token'],
+        'GET',
+        f'/users/presences?recurse=true&user_uuid={uuids}',
+        None,
+    )
+
+
+def _presence_get(dataset, rng):
+    user = rng.choice(dataset['users'])
+    return user['token'], 'GET', f'/users/{user["pbx_user_uuid"]}/presences', None
+
+
+def _presence_update(dataset, rng):
+    user = rng.choice(dataset['users'])
+    body = {'state': rng.choice(STATES), 'status': 'load test'}
+    return user['token'], 'PUT', f'/users/{user["pbx_user_uuid"]}/presences', body
+
+
+def _rooms(dataset, rng):
+    user = rng.choice(dataset['users'])
+    return user['token'], 'GET', '/users/me/rooms', None
+
+
+def _room_messages(dataset, rng):
+    user = rng.choice(dataset['room_users'])
+    room_uuid = rng.choice(user['rooms'])
+    path = f'/users/me/rooms/{room_uuid}/messages?limit=50'
+    return user['token'], 'GET', path, None
+
+
+def _room_message_create(dataset, rng):
+    user = rng.choice(dataset['room_users'])
+    room_uuid = rng.choice(user['rooms'])
+    body = {'content': 'load test message', 'alias': 'load'}
+    path = f'/users/me/rooms/{room_uuid}/messages'
+    return user['token'], 'POST', path, body
+
+
+SCENARIOS = {
+    'presences': (_presences, 10),
+    'presences_recurse': (_presences_recurse, 5),
+    'presences_user_uuid': (_presences_by_user, 10),
+    'presence_get': (_presence_get, 20),
+    'presence_update': (_presence_update, 5),
+    'rooms': (_rooms, 15),
+    'room_messages': (_room_messages, 25),
+    'room_message_create': (_room_message_create, 10),
+}
+
+
+def run_client(base_url, dataset, scenarios, duration, client_id):
+    rng = random.Random(client_id)
+    names = list(scenarios)
+    weights = [SCENARIOS[name][1] for name in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    http = requests.Session()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        name = rng.choices(names, weights)[0]
+        token, method, path, body = SCENARIOS[name][0](dataset, rng)
+        start = time.monotonic()
+        try:
+            response = http.request(
+                method,
+                f'{base_url}{path}',
+                json=body,
+                headers={'X-Auth-Token': token},
+                timeout=30,
+            )
+        except requests.RequestException:
+            errors[name] += 1
+            continue
+        if response.status_code >= 400:
+            errors[name] += 1
+            continue
+        latencies[name].append(time.monotonic() - start)
+    return dict(latencies), dict(errors)
+
+
+def wait_ready(base_url, token, timeout):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            response = requests.get(
+                f'{base_url}/status', headers={'X-Auth-Token': token}, timeout=1
+            )
+            if response.status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise Exception(f'wazo-chatd not ready after {timeout} seconds')
+
+
+def percentile(values, percent):
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    histogram = []
+    count = 0
+    for bound in BUCKETS_MS:
+        while count < len(latencies) and latencies[count] * 1000 <= bound:
+            count += 1
+        histogram.append({'le_ms': str(bound), 'count': count})
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / duration,
+        'histogram': histogram,
+    }
+    if latencies:
+        summary.update(
+            p50_ms=percentile(latencies, 50) * 1000,
+            p90_ms=percentile(latencies, 90) * 1000,
+            p99_ms=percentile(latencies, 99) * 1000,
+            max_ms=latencies[-1] * 1000,
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test the presences and rooms endpoints of wazo-chatd'
+    )
+    parser.add_argument('--db-uri', default=DEFAULT_DB_URI)
+    parser.add_argument('--chatd-url', default='http://127.0.0.1:9304/1.0')
+    parser.add_argument('--auth-host', default='127.0.0.1')
+    parser.add_argument('--auth-port', type=int, default=19497)
+    parser.add_argument('--tenants', type=int, default=10)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=50, help='per room')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=sorted(SCENARIOS),
+        help='scenario to run, may be repeated (default: the weighted mix of all)',
+    )
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    init_db(args.db_uri)
+    session = Session()
+
+    start = time.monotonic()
+    dataset = seed(session, args.tenants, args.users, args.rooms, args.messages)
+    dataset['room_users'] = [user for user in dataset['users'] if user['rooms']]
+    print(f'seeded the dataset in {time.monotonic() - start:.1f}s')
+
+    auth = AuthStandIn(dataset, args.auth_host, args.auth_port)
+    auth.start()
+    try:
+        wait_ready(args.chatd_url, dataset['admin']['token'], timeout=60)
+        scenarios = args.scenario or sorted(SCENARIOS)
+        # Spawned clients: they must not inherit the threads of the auth stand-in
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(
+            args.clients, mp_context=context
+        ) as executor:
+            futures = [
+                executor.submit(
+                    run_client,
+                    args.chatd_url,
+                    dataset,
+                    scenarios,
+                    args.duration,
+                    client_id,
+                )
+                for client_id in range(args.clients)
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        auth.stop()
+        clean(session, dataset)
+
+    latencies, errors = defaultdict(list), defaultdict(int)
+    for client_latencies, client_errors in results:
+        for name, values in client_latencies.items():
+            latencies[name] += values
+        for name, count in client_errors.items():
+            errors[name] += count
+
+    report = {
+        name: summarize(latencies[name], errors[name], args.duration)
+        for name in scenarios
+    }
+    total = sum(summary['requests'] for summary in report.values())
+    print(f'total: {total / args.duration:.0f} req/s')
+    for name, summary in report.items():
+        line = f'{name}: {summary["requests_per_second"]:.0f} req/s'
+        if summary['requests']:
+            line += (
+                f', p50 {summary["p50_ms"]:.1f}ms, p90 {summary["p90_ms"]:.1f}ms, '
+                f'p99 {summary["p99_ms"]:.1f}ms'
+            )
+        print(f'{line}, {summary["errors"]} errors')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'duration': args.duration, 'scenarios': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
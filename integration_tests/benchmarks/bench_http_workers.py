@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import concurrent.futures
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+import requests
+import yaml
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def hammer(url, token, duration):
+    latencies = []
+    errors = 0
+    session = requests.Session()
+    session.headers['X-Auth-Token'] = token
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        start = time.monotonic()
+        try:
+            response = session.get(url, timeout=10)
+        except requests.RequestException:
+            errors += 1
+            continue
+        if response.status_code != 200:
+            errors += 1
+            continue
+        latencies.append(time.monotonic() - start)
+    return latencies, errors
+
+
+def wait_ready(base_url, token, timeout):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            response = requests.get(
+                f'{base_url}/status', headers={'X-Auth-Token': token}, timeout=1
+            )
+            status = response.json()
+            if status['presence_initialization']['status'] == 'ok':
+                return
+        except (requests.RequestException, KeyError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise Exception(f'wazo-chatd not ready after {timeout} seconds')
+
+
+def start_chatd(args, workers):
+    with open(args.config_file) as f:
+        config = yaml.safe_load(f) or {}
+    config.setdefault('rest_api', {}).update(workers=workers, port=args.port)
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.yml', delete=False)
+    with config_file:
+        yaml.safe_dump(config, config_file)
+    process = subprocess.Popen([args.chatd, '-c', config_file.name])
+    return process, config_file.name
+
+
+def stop_chatd(process, config_file):
+    process.terminate()
+    process.wait(timeout=30)
+    os.unlink(config_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the HTTP throughput of wazo-chatd by number of workers'
+    )
+    parser.add_argument('--token', required=True)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--path', default='/1.0/users/presences')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9304)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--config-file', default='/etc/wazo-chatd/config.yml')
+    parser.add_argument('--chatd', default='wazo-chatd')
+    parser.add_argument(
+        '--no-start',
+        action='store_true',
+        help='load the already running wazo-chatd once instead of starting it',
+    )
+    args = parser.parse_args()
+
+    base_url = f'http://{args.host}:{args.port}/1.0'
+    url = f'http://{args.host}:{args.port}{args.path}'
+    for workers in [None] if args.no_start else args.workers:
+        process = None
+        if workers:
+            process, config_file = start_chatd(args, workers)
+        try:
+            wait_ready(base_url, args.token, timeout=60)
+            # One process per client, the load generator must not share a GIL
+            with concurrent.futures.ProcessPoolExecutor(args.clients) as executor:
+                futures = [
+                    executor.submit(hammer, url, args.token, args.duration)
+                    for _ in range(args.clients)
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            if process:
+                stop_chatd(process, config_file)
+
+        latencies = [latency for result in results for latency in result[0]]
+        errors = sum(result[1] for result in results)
+        if not latencies:
+            print(f'workers {workers or "?"}: no successful request, {errors} errors')
+            continue
+        print(
+            f'workers {workers or "?"}: {len(latencies) / args.duration:.0f} req/s, '
+            f'mean {statistics.mean(latencies) * 1000:.1f}ms, '
+            f'p50 {percentile(latencies, 50) * 1000:.1f}ms, '
+            f'p99 {percentile(latencies, 99) * 1000:.1f}ms, '
+            f'{errors} errors'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import datetime
+import random
+import timeit
+import uuid
+
+from wazo_chatd.plugins.presences.schemas import (
+    UserPresenceSchema,
+    dump_user_presences,
+)
+from wazo_chatd.plugins.presences.store import PresenceStore
+
+CHANNEL_STATES = ('undefined', 'holding', 'ringing', 'talking', 'progressing')
+
+
+def make_users(count, lines, channels):
+    store = PresenceStore()
+    tenant_uuid = uuid.uuid4()
+    line_id = 0
+    for _ in range(count):
+        user = store.add_user(uuid.uuid4(), tenant_uuid)
+        store.update_user(
+            user.uuid,
+            status='benchmark',
+            last_activity=datetime.datetime.now(datetime.timezone.utc),
+        )
+        store.add_session(user.uuid, uuid.uuid4(), mobile=False)
+        store.add_refresh_token(user.uuid, 'mobile', mobile=random.random() < 0.5)
+        for _ in range(lines):
+            line_id += 1
+            endpoint_name = f'PJSIP/{line_id}'
+            store.associate_line(user.uuid, line_id, endpoint_name)
+            store.update_endpoint_state(endpoint_name, 'available')
+            for i in range(channels):
+                channel_name = f'{endpoint_name}-{i}'
+                store.add_channel(
+                    endpoint_name, channel_name, random.choice(CHANNEL_STATES)
+                )
+    return store.list_users(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare UserPresenceSchema and dump_user_presences'
+    )
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--lines', type=int, default=2)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    users = make_users(args.users, args.lines, args.channels)
+    assert dump_user_presences(users) == UserPresenceSchema().dump(users, many=True)
+
+    candidates = (
+        ('UserPresenceSchema', lambda: UserPresenceSchema().dump(users, many=True)),
+        ('dump_user_presences', lambda: dump_user_presences(users)),
+    )
+    results = {}
+    for name, dump in candidates:
+        best = min(timeit.repeat(dump, number=1, repeat=args.runs))
+        results[name] = best
+        print(
+            f'{name}: {best * 1000:.2f}ms for {args.users} users, '
+            f'{best / args.users * 1e6:.1f}us per user'
+        )
+    speedup = results['UserPresenceSchema'] / results['dump_user_presences']
+    print(f'speedup: {speedup:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
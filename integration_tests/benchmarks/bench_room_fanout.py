@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import datetime
+import logging
+import time
+import uuid
+
+from wazo_chatd.bus import BusPublisher
+from wazo_chatd.database.models import Room, RoomMessage, RoomUser
+from wazo_chatd.plugins.rooms.notifier import RoomNotifier
+
+
+class CountingPublisher:
+    def __init__(self, publisher):
+        self._publisher = publisher
+        self.count = 0
+
+    def publish(self, event):
+        self._publisher.publish(event)
+        self.count += 1
+
+
+def make_room(members):
+    tenant_uuid = uuid.uuid4()
+    users = [
+        RoomUser(uuid=uuid.uuid4(), tenant_uuid=tenant_uuid, wazo_uuid=tenant_uuid)
+        for _ in range(members)
+    ]
+    return Room(uuid=uuid.uuid4(), tenant_uuid=tenant_uuid, users=users)
+
+
+def make_message(room):
+    return RoomMessage(
+        uuid=uuid.uuid4(),
+        room_uuid=room.uuid,
+        content='benchmark message',
+        alias='benchmark',
+        user_uuid=room.users[0].uuid,
+        tenant_uuid=room.tenant_uuid,
+        wazo_uuid=room.tenant_uuid,
+        created_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the room events fan-out')
+    parser.add_argument('--bus-host', default='127.0.0.1')
+    parser.add_argument('--bus-port', type=int, default=5672)
+    parser.add_argument('--members', type=int, nargs='+', default=[2, 50, 500])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    bus_config = {
+        'username': 'guest',
+        'password': 'guest',
+        'host': args.bus_host,
+        'port': args.bus_port,
+        'exchange_name': 'wazo-headers',
+        'exchange_type': 'headers',
+    }
+    publisher = CountingPublisher(
+        BusPublisher.from_config(str(uuid.uuid4()), bus_config)
+    )
+
+    for members in args.members:
+        room = make_room(members)
+        messages = [make_message(room) for _ in range(args.messages)]
+        for mode in ('user', 'room'):
+            notifier = RoomNotifier(publisher, mode)
+            publisher.count = 0
+            start = time.monotonic()
+            for message in messages:
+                notifier.message_created(room, message)
+            elapsed = time.monotonic() - start
+            print(
+                f'{members} members, {mode} mode: '
+                f'{elapsed / args.messages * 1000:.2f}ms per message, '
+                f'{publisher.count // args.messages} publishes per message'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import datetime
@@ -210,6 +210,7 @@ def room(**room_args):
             room_args.setdefault('tenant_uuid', TOKEN_TENANT_UUID)
             room_args.setdefault('users', [])
             room_args.setdefault('messages', [])
+            room_args.setdefault('message_count', len(room_args['messages']))
 
             for user_args in room_args['users']:
                 user_args.setdefault('uuid', uuid.uuid4())
@@ -234,6 +235,10 @@ def room(**room_args):
 
             self._session.add(room)
             self._session.flush()
+            if room_args['messages']:
+                latest = max(room_args['messages'], key=lambda m: m.created_at)
+                room.last_message_uuid = latest.uuid
+                self._session.flush()
 
             self._session.commit()
             args = list(args) + [room]
@@ -0,0 +1,171 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import uuid
+
+from hamcrest import assert_that, has_item
+from sqlalchemy.dialects import postgresql
+
+from wazo_chatd.database.models import Line, Room, RoomMessage
+
+from .helpers.base import DBIntegrationTest, TOKEN_TENANT_UUID, use_asset
+
+ROOMS = 500
+MESSAGES_PER_ROOM = 100
+LINES = 5000
+
+
+@use_asset('database')
+class TestDBQueryPlans(DBIntegrationTest):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        session = cls._Session()
+        params = {
+            'tenant_uuid': str(TOKEN_TENANT_UUID),
+            'rooms': ROOMS,
+            'messages': MESSAGES_PER_ROOM,
+            'lines': LINES,
+        }
+        session.execute(
+            'INSERT INTO chatd_tenant (uuid) VALUES (:tenant_uuid) ON CONFLICT DO NOTHING',
+            params,
+        )
+        session.execute(
+            '''
+            INSERT INTO chatd_room (uuid, tenant_uuid)
+            SELECT uuid_generate_v4(), :tenant_uuid FROM generate_series(1, :rooms)
+            ''',
+            params,
+        )
+        session.execute(
+            '''
+            INSERT INTO chatd_room_user (room_uuid, uuid, tenant_uuid, wazo_uuid)
+            SELECT room.uuid, uuid_generate_v4(), :tenant_uuid, uuid_generate_v4()
+            FROM chatd_room AS room, generate_series(1, 2)
+            ''',
+            params,
+        )
+        session.execute(
+            '''
+            INSERT INTO chatd_room_message
+                (room_uuid, content, user_uuid, tenant_uuid, wazo_uuid, created_at)
+            SELECT
+                room.uuid,
+                'message ' || md5(room.uuid::text || i),
+                uuid_generate_v4(),
+                :tenant_uuid,
+                uuid_generate_v4(),
+                now() - i * interval '1 minute'
+            FROM chatd_room AS room, generate_series(1, :messages) AS i
+            ''',
+            params,
+        )
+        session.execute('''
+            UPDATE chatd_room SET last_message_uuid = latest.uuid
+            FROM (
+                SELECT DISTINCT ON (room_uuid) room_uuid, uuid
+                FROM chatd_room_message
+                ORDER BY room_uuid, created_at DESC
+            ) AS latest
+            WHERE chatd_room.uuid = latest.room_uuid
+            ''')
+        session.execute(
+            '''
+            INSERT INTO chatd_endpoint (name, state)
+            SELECT 'PJSIP/line' || i, 'available' FROM generate_series(1, :lines) AS i
+            ''',
+            params,
+        )
+        session.execute(
+            '''
+            INSERT INTO chatd_line (id, endpoint_name)
+            SELECT i, 'PJSIP/line' || i FROM generate_series(1, :lines) AS i
+            ''',
+            params,
+        )
+        session.commit()
+        for table in (
+            'chatd_room',
+            'chatd_room_user',
+            'chatd_room_message',
+            'chatd_line',
+        ):
+            session.execute(f'ANALYZE {table}')
+        session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        session = cls._Session()
+        session.query(Room).delete()
+        session.query(Line).delete(synchronize_session=False)
+        session.execute("DELETE FROM chatd_endpoint WHERE name LIKE 'PJSIP/line%'")
+        session.commit()
+        cls._Session.remove()
+        super().tearDownClass()
+
+    def explain(self, query):
+        statement = query.statement.compile(dialect=postgresql.dialect())
+        result = self._session.connection().execute(
+            f'EXPLAIN (FORMAT JSON) {statement}', statement.params
+        )
+        plan = result.scalar()[0]['Plan']
+        return list(_index_names(plan))
+
+    def test_find_line_by_endpoint_name(self):
+        query = self._session.query(Line).filter(Line.endpoint_name == 'PJSIP/line42')
+
+        indexes = self.explain(query)
+
+        assert_that(indexes, has_item('chatd_line__idx__endpoint_name'))
+
+    def test_list_room_messages(self):
+        room_uuid = str(self._session.query(Room.uuid).first()[0])
+        query = self._dao.room._build_messages_query(room_uuid)
+        query = self._dao.room._paginate(query, limit=100)
+
+        indexes = self.explain(query)
+
+        assert_that(indexes, has_item('chatd_room_message__idx__room_uuid_created_at'))
+
+    def test_list_user_messages(self):
+        user_uuid = str(
+            self._session.execute('SELECT uuid FROM chatd_room_user').scalar()
+        )
+        query = self._dao.room._build_user_messages_query(
+            str(TOKEN_TENANT_UUID), user_uuid
+        )
+        query = self._dao.room._paginate(query, limit=100)
+
+        indexes = self.explain(query)
+
+        assert_that(indexes, has_item('chatd_room_user__idx__uuid'))
+
+    def test_list_latest_user_messages(self):
+        user_uuid = str(
+            self._session.execute('SELECT uuid FROM chatd_room_user').scalar()
+        )
+        query = self._dao.room._build_latest_user_messages_query(
+            str(TOKEN_TENANT_UUID), user_uuid
+        )
+        query = self._dao.room._paginate(query, limit=100)
+
+        indexes = self.explain(query)
+
+        assert_that(indexes, has_item('chatd_room_user__idx__uuid'))
+        assert_that(indexes, has_item('chatd_room_message_pkey'))
+
+    def test_search_messages(self):
+        query = self._session.query(RoomMessage)
+        query = self._dao.room._list_filter(query, search=uuid.uuid4().hex[:8])
+
+        indexes = self.explain(query)
+
+        assert_that(indexes, has_item('chatd_room_message__idx__search_vector'))
+
+
+def _index_names(plan):
+    if 'Index Name' in plan:
+        yield plan['Index Name']
+    for subplan in plan.get('Plans', []):
+        yield from _index_names(subplan)
@@ -1,6 +1,7 @@
-# Copyright 2019-2021 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import contextlib
 import datetime
 import uuid
 
@@ -11,15 +12,19 @@ from hamcrest import (
     contains_inanyorder,
     empty,
     equal_to,
+    has_item,
+    has_length,
     has_properties,
     is_not,
     instance_of,
     none,
 )
+from sqlalchemy import event
 from sqlalchemy.inspection import inspect
 
 from wazo_chatd.database.models import Room, RoomMessage, RoomUser
 from wazo_chatd.exceptions import UnknownRoomException
+from wazo_chatd.plugins.rooms.schemas import MessageSchema, RoomSchema
 from wazo_test_helpers.hamcrest.raises import raises
 
 from .helpers import fixtures
@@ -134,6 +139,36 @@ class TestRoom(DBIntegrationTest):
         self._session.expire_all()
         assert_that(inspect(message).persistent)
         assert_that(room.messages, contains(message))
+        assert_that(room.message_count, equal_to(1))
+        assert_that(room.last_message_uuid, equal_to(message.uuid))
+
+    @fixtures.db.room(messages=[{'content': 'older'}, {'content': 'newer'}])
+    def test_add_message_does_not_load_history(self, room):
+        self._session.expire(room, ['messages'])
+        message = RoomMessage(user_uuid=UUID, tenant_uuid=UUID, wazo_uuid=UUID)
+
+        self._dao.room.add_message(room, message)
+
+        assert_that(inspect(room).unloaded, has_item('messages'))
+        assert_that(room.message_count, equal_to(3))
+        assert_that(room.messages, has_item(message))
+
+    @fixtures.db.room()
+    def test_add_message_older_than_last_message(self, room):
+        newer = RoomMessage(user_uuid=UUID, tenant_uuid=UUID, wazo_uuid=UUID)
+        self._dao.room.add_message(room, newer)
+        older = RoomMessage(
+            user_uuid=UUID,
+            tenant_uuid=UUID,
+            wazo_uuid=UUID,
+            created_at=newer.created_at - datetime.timedelta(seconds=1),
+        )
+
+        self._dao.room.add_message(room, older)
+
+        self._session.expire_all()
+        assert_that(room.message_count, equal_to(2))
+        assert_that(room.last_message_uuid, equal_to(newer.uuid))
 
     @fixtures.db.room(messages=[{'content': 'older'}, {'content': 'newer'}])
     def test_list_messages(self, room):
@@ -169,6 +204,56 @@ class TestRoom(DBIntegrationTest):
 
         assert_that(messages, contains(message_1))
 
+    @fixtures.db.room(
+        messages=[{'content': 'oldest'}, {'content': 'older'}, {'content': 'newer'}]
+    )
+    def test_list_messages_cursor(self, room):
+        message_3, message_2, message_1 = room.messages
+
+        cursor = {
+            'created_at': message_3.created_at,
+            'uuid': message_3.uuid,
+            'before': False,
+        }
+        messages = self._dao.room.list_messages(room, cursor=cursor, limit=1)
+        assert_that(messages, contains(message_2))
+
+        messages = self._dao.room.list_messages(room, cursor=cursor, direction='asc')
+        assert_that(messages, empty())
+
+        cursor = {
+            'created_at': message_1.created_at,
+            'uuid': message_1.uuid,
+            'before': True,
+        }
+        messages = self._dao.room.list_messages(room, cursor=cursor)
+        assert_that(messages, contains(message_3, message_2))
+
+        messages = self._dao.room.list_messages(room, cursor=cursor, limit=1)
+        assert_that(messages, contains(message_2))
+
+    @fixtures.db.room(
+        messages=[{'content': 'oldest'}, {'content': 'older'}, {'content': 'newer'}]
+    )
+    def test_list_messages_with_count(self, room):
+        message_3, message_2, message_1 = room.messages
+
+        messages, count = self._dao.room.list_messages_with_count(room, limit=2)
+        assert_that(messages, contains(message_3, message_2))
+        assert_that(count, equal_to(3))
+
+        messages, count = self._dao.room.list_messages_with_count(room, offset=3)
+        assert_that(messages, empty())
+        assert_that(count, equal_to(3))
+
+        messages, count = self._dao.room.list_messages_with_count(room, limit=0)
+        assert_that(messages, empty())
+        assert_that(count, equal_to(3))
+
+        messages, count = self._dao.room.list_messages_with_count(room, search='old')
+        assert_that(messages, contains(message_2, message_1))
+        assert_that(count, equal_to(2))
+
     @fixtures.db.room(messages=[{'content': 'older'}, {'content': 'newer'}])
     def test_count_messages(self, room):
         count = self._dao.room.count_messages(room)
@@ -274,6 +359,44 @@ class TestRoom(DBIntegrationTest):
 
         assert_that(messages, contains(message_found))
 
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': 'hidden'}, {'content': 'foundation'}],
+    )
+    def test_list_user_messages_search_prefix(self, room):
+        message_found, _ = room.messages
+
+        messages = self._dao.room.list_user_messages(UUID, USER_UUID_1, search='found')
+
+        assert_that(messages, contains(message_found))
+
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[
+            {'content': 'found once among many other words'},
+            {'content': 'found found'},
+        ],
+    )
+    def test_list_user_messages_search_order_by_rank(self, room):
+        message_once, message_twice = room.messages
+
+        messages = self._dao.room.list_user_messages(
+            UUID, USER_UUID_1, search='found', order='rank', direction='desc'
+        )
+
+        assert_that(messages, contains(message_twice, message_once))
+
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': "it's not a fòund"}],
+    )
+    def test_list_user_messages_search_highlight(self, room):
+        messages = self._dao.room.list_user_messages(UUID, USER_UUID_1, search='found')
+
+        assert_that(
+            messages, contains(has_properties(highlight="it's not a <b>fòund</b>"))
+        )
+
     @fixtures.db.room(
         users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
         messages=[
@@ -320,6 +443,19 @@ class TestRoom(DBIntegrationTest):
 
         assert_that(count, equal_to(2))
 
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': 'older'}],
+    )
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': 'newer'}, {'content': 'newest'}],
+    )
+    def test_count_all_user_messages(self, *_):
+        count = self._dao.room.count_all_user_messages(UUID, USER_UUID_1)
+
+        assert_that(count, equal_to(3))
+
     @fixtures.db.room(
         users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
         messages=[{'content': 'hidden'}, {'content': 'found'}],
@@ -432,6 +568,27 @@ class TestRoom(DBIntegrationTest):
 
         assert_that(count, equal_to(1))
 
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': 'older1'}, {'content': 'newer1'}],
+    )
+    @fixtures.db.room(users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}])
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_2, 'tenant_uuid': UUID}],
+        messages=[{'content': 'other user'}],
+    )
+    def test_list_latest_user_messages_pointer(self, room_1, _, __):
+        message = RoomMessage(
+            content='newest', user_uuid=UUID, tenant_uuid=UUID, wazo_uuid=UUID
+        )
+        self._dao.room.add_message(room_1, message)
+
+        messages = self._dao.room.list_latest_user_messages(UUID, USER_UUID_1)
+        assert_that(messages, contains(message))
+
+        count = self._dao.room.count_latest_user_messages(UUID, USER_UUID_1)
+        assert_that(count, equal_to(1))
+
 
 @use_asset('database')
 class TestRoomRelationships(DBIntegrationTest):
@@ -517,3 +674,95 @@ class TestRoomMessageRelationships(DBIntegrationTest):
 
         self._session.expire_all()
         assert_that(message.room, equal_to(room))
+
+
+@use_asset('database')
+class TestRoomQueryCount(DBIntegrationTest):
+    """Statements needed to serve each rooms endpoint, whatever the page size"""
+
+    @contextlib.contextmanager
+    def count_queries(self):
+        queries = []
+
+        def executed(conn, cursor, statement, *args):
+            queries.append(statement)
+
+        # The connection is checked out before counting
+        engine = self._session.connection().engine
+        event.listen(engine, 'before_cursor_execute', executed)
+        try:
+            yield queries
+        finally:
+            event.remove(engine, 'before_cursor_execute', executed)
+
+    @fixtures.db.room(users=[{'uuid': USER_UUID_1}, {'uuid': USER_UUID_2}])
+    @fixtures.db.room(users=[{'uuid': USER_UUID_1}, {'uuid': USER_UUID_3}])
+    @fixtures.db.room(users=[{'uuid': USER_UUID_1}])
+    def test_list_rooms(self, room, _, __):
+        self._session.expire_all()
+
+        with self.count_queries() as queries:
+            rooms = self._dao.room.list_([room.tenant_uuid], user_uuid=USER_UUID_1)
+            self._dao.room.count([room.tenant_uuid], user_uuid=USER_UUID_1)
+            RoomSchema().dump(rooms, many=True)
+
+        assert_that(queries, has_length(3))
+
+    def test_create_room(self):
+        users = [
+            RoomUser(uuid=USER_UUID_1, tenant_uuid=TENANT_1, wazo_uuid=UUID),
+            RoomUser(uuid=USER_UUID_2, tenant_uuid=TENANT_1, wazo_uuid=UUID),
+        ]
+        room = Room(tenant_uuid=TENANT_1, users=users)
+
+        with self.count_queries() as queries:
+            self._dao.room.create(room)
+            RoomSchema().dump(room)
+
+        assert_that(queries, has_length(2))
+
+    @fixtures.db.room(messages=[{'content': 'older'}, {'content': 'newer'}])
+    def test_list_room_messages(self, room):
+        self._session.expire_all()
+
+        with self.count_queries() as queries:
+            room = self._dao.room.get([room.tenant_uuid], room.uuid)
+            messages, _ = self._dao.room.list_messages_with_count(room)
+            MessageSchema().dump(messages, many=True)
+
+        assert_that(queries, has_length(2))
+
+    @fixtures.db.room()
+    def test_create_room_message(self, room):
+        self._session.expire_all()
+        message = RoomMessage(user_uuid=UUID, tenant_uuid=UUID, wazo_uuid=UUID)
+
+        with self.count_queries() as queries:
+            room = self._dao.room.get([room.tenant_uuid], room.uuid)
+            self._dao.room.add_message(room, message)
+            MessageSchema().dump(message)
+
+        # The room is locked before inserting the message
+        assert_that(queries, has_length(4))
+
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': 'found 1'}, {'content': 'found 2'}],
+    )
+    @fixtures.db.room(
+        users=[{'uuid': USER_UUID_1, 'tenant_uuid': UUID}],
+        messages=[{'content': 'found 3'}],
+    )
+    def test_list_user_messages(self, _, __):
+        self._session.expire_all()
+
+        for distinct in (None, 'room_uuid'):
+            with self.count_queries() as queries:
+                messages, _ = self._dao.room.list_user_messages_with_count(
+                    UUID, USER_UUID_1, distinct=distinct, search='found'
+                )
+                self._dao.room.count_all_user_messages(UUID, USER_UUID_1)
+                MessageSchema().dump(messages, many=True)
+
+            # The page and its count, the highlights and the total
+            assert_that(queries, has_length(3))
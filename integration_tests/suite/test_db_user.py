@@ -16,10 +16,19 @@ from hamcrest import (
     is_not,
     none,
 )
+from sqlalchemy import event
 from sqlalchemy.inspection import inspect
 
-from wazo_chatd.database.models import User, Session, Line, RefreshToken
+from wazo_chatd.database.models import (
+    Channel,
+    Endpoint,
+    User,
+    Session,
+    Line,
+    RefreshToken,
+)
 from wazo_chatd.exceptions import UnknownUserException
+from wazo_chatd.plugins.presences.schemas import UserPresenceSchema
 from wazo_test_helpers.hamcrest.raises import raises
 
 from .helpers import fixtures
@@ -260,3 +269,66 @@ class TestUser(DBIntegrationTest):
 
         self._session.expire_all()
         assert_that(user.lines, empty())
+
+
+@use_asset('database')
+class TestUserPresenceLoading(DBIntegrationTest):
+    def _create_users(self, count):
+        tenant_uuid = uuid.uuid4()
+        self._dao.tenant.find_or_create(tenant_uuid)
+        for _ in range(count):
+            line_id = random.randint(1, 1000000)
+            endpoint = Endpoint(name=f'PJSIP/{line_id}', state='available')
+            channel = Channel(name=f'PJSIP/{line_id}-1', state='talking')
+            user = User(
+                uuid=uuid.uuid4(),
+                tenant_uuid=tenant_uuid,
+                state='available',
+                sessions=[Session(uuid=uuid.uuid4(), mobile=False)],
+                refresh_tokens=[RefreshToken(client_id='client', mobile=True)],
+                lines=[Line(id=line_id, endpoint=endpoint, channels=[channel])],
+            )
+            self._session.add(user)
+        self._session.flush()
+        self._session.expunge_all()
+        return tenant_uuid
+
+    def _count_statements(self, function, *args, **kwargs):
+        statements = []
+
+        def count(*_):
+            statements.append(1)
+
+        connection = self._session.connection()
+        event.listen(connection, 'before_cursor_execute', count)
+        try:
+            function(*args, **kwargs)
+        finally:
+            event.remove(connection, 'before_cursor_execute', count)
+        return len(statements)
+
+    def _list_presences(self, tenant_uuid):
+        users = self._dao.user.list_([tenant_uuid], load_presence=True)
+        return UserPresenceSchema().dump(users, many=True)
+
+    def test_list_statement_count(self):
+        tenant_uuid_1 = self._create_users(1)
+        tenant_uuid_20 = self._create_users(20)
+
+        count_1 = self._count_statements(self._list_presences, tenant_uuid_1)
+        self._session.expunge_all()
+        count_20 = self._count_statements(self._list_presences, tenant_uuid_20)
+
+        assert_that(count_20, equal_to(count_1))
+
+    def test_get_statement_count(self):
+        tenant_uuid = self._create_users(1)
+        user_uuid = self._dao.user.list_([tenant_uuid])[0].uuid
+        self._session.expunge_all()
+
+        def get_presence():
+            user = self._dao.user.get([tenant_uuid], user_uuid, load_presence=True)
+            return UserPresenceSchema().dump(user)
+
+        # users, sessions, refresh tokens and lines joined with their endpoint and channels
+        assert_that(self._count_statements(get_presence), equal_to(5))
@@ -76,6 +76,53 @@ class TestUserRoom(APIIntegrationTest):
             ),
         )
 
+    @fixtures.http.room()
+    def test_list_cursor(self, room):
+        message_args = {'content': 'message content'}
+        message_1 = self.chatd.rooms.create_message_from_user(
+            room['uuid'], message_args
+        )
+        message_2 = self.chatd.rooms.create_message_from_user(
+            room['uuid'], message_args
+        )
+        message_3 = self.chatd.rooms.create_message_from_user(
+            room['uuid'], message_args
+        )
+
+        page_1 = self.chatd.rooms.list_messages_from_user(room['uuid'], limit=2)
+        assert_that(
+            page_1,
+            has_entries(
+                items=contains(has_entries(**message_3), has_entries(**message_2)),
+                next=is_not(none()),
+                prev=none(),
+            ),
+        )
+
+        page_2 = self.chatd.rooms.list_messages_from_user(
+            room['uuid'], limit=2, cursor=page_1['next']
+        )
+        assert_that(
+            page_2,
+            has_entries(
+                items=contains(has_entries(**message_1)),
+                total=equal_to(3),
+                filtered=equal_to(3),
+                next=none(),
+                prev=is_not(none()),
+            ),
+        )
+
+        page_1 = self.chatd.rooms.list_messages_from_user(
+            room['uuid'], limit=2, cursor=page_2['prev']
+        )
+        assert_that(
+            page_1,
+            has_entries(
+                items=contains(has_entries(**message_3), has_entries(**message_2))
+            ),
+        )
+
     @fixtures.http.room()
     def test_list_search(self, room):
         message_1_args = message_2_args = {'content': 'found'}
@@ -259,6 +306,32 @@ class TestUserMessage(APIIntegrationTest):
             ),
         )
 
+    @fixtures.http.room()
+    def test_list_search_order_by_rank(self, room):
+        message_1 = self.chatd.rooms.create_message_from_user(
+            room['uuid'], {'content': 'found found'}
+        )
+        message_2 = self.chatd.rooms.create_message_from_user(
+            room['uuid'], {'content': 'found once among many other words'}
+        )
+
+        messages = self.chatd.rooms.search_messages_from_user(
+            search='found', order='rank', direction='desc'
+        )
+        assert_that(
+            messages,
+            has_entries(
+                items=contains(
+                    has_entries(
+                        uuid=message_1['uuid'], highlight='<b>found</b> <b>found</b>'
+                    ),
+                    has_entries(uuid=message_2['uuid']),
+                ),
+                next=none(),
+                prev=none(),
+            ),
+        )
+
     @fixtures.http.room()
     @fixtures.http.room()
     def test_list_distinct(self, room_1, room_2):
@@ -1,10 +1,19 @@
 # Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import logging
+import queue
+import threading
+import time
+
 from xivo.status import Status
 from xivo_bus.consumer import BusConsumer as BaseConsumer
 from xivo_bus.publisher import BusPublisher as BasePublisher
 
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
 
 class BusConsumer(BaseConsumer):
     @classmethod
@@ -21,3 +30,267 @@ class BusPublisher(BasePublisher):
     @classmethod
     def from_config(cls, service_uuid, bus_config):
         return cls(name='wazo-chatd', service_uuid=service_uuid, **bus_config)
+
+
+class BusPublishQueue:
+    """Publish the events from a dedicated thread
+
+    Callers only enqueue their events, so that a slow broker does not stall the
+    HTTP requests nor the bus event handlers. When the queue is full, `overflow`
+    decides what happens: "block" waits up to `block_timeout` seconds for some
+    room before dropping the new event, "drop_newest" drops it immediately and
+    "drop_oldest" makes room by dropping the oldest queued event. The `on_error`
+    callback of an event, if any, is called when it is dropped or fails.
+    """
+
+    def __init__(
+        self,
+        publisher,
+        queue_size=10000,
+        batch_size=100,
+        overflow='block',
+        block_timeout=1.0,
+    ):
+        self._publisher = publisher
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._overflow = overflow
+        self._block_timeout = block_timeout
+        self._lock = threading.Lock()
+        self._published = 0
+        self._dropped = 0
+        self._failed = 0
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, publisher, publisher_config):
+        return cls(publisher, **publisher_config)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self._thread:
+            raise Exception('Bus publish queue already started')
+
+        self._thread = threading.Thread(target=self._run, name='bus_publisher')
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        # Blocking: every queued event is published before stopping
+        self._queue.put(_STOP)
+        logger.debug('joining bus publisher thread...')
+        self._thread.join()
+        self._thread = None
+        self._publish_batch(self._drain())
+
+    def publish(self, *args, on_error=None, **kwargs):
+        item = (args, kwargs, on_error)
+        if not self._thread:
+            # Not started yet or stopping: nobody would empty the queue
+            self._publish_batch([item])
+            return
+
+        if self._overflow == 'block':
+            try:
+                self._queue.put(item, timeout=self._block_timeout)
+            except queue.Full:
+                self._drop(item)
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                if self._overflow != 'drop_oldest':
+                    self._drop(item)
+                    return
+            try:
+                oldest = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            if oldest is _STOP:
+                # Stopping: the stop marker stays last, the new event is dropped
+                self._queue.put(oldest)
+                self._drop(item)
+                return
+            self._drop(oldest)
+
+    def _drop(self, item):
+        args, _, on_error = item
+        logger.warning('Bus publish queue full, dropping event: %s', args[0])
+        with self._lock:
+            self._dropped += 1
+        _call(on_error)
+
+    def provide_status(self, status):
+        with self._lock:
+            status['bus_publisher']['queue_depth'] = self._queue.qsize()
+            status['bus_publisher']['queue_size'] = self._queue_size
+            status['bus_publisher']['published'] = self._published
+            status['bus_publisher']['dropped'] = self._dropped
+            status['bus_publisher']['failed'] = self._failed
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = _STOP in batch
+            self._publish_batch([item for item in batch if item is not _STOP])
+            if stopping:
+                return
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def _publish_batch(self, batch):
+        published = failed = 0
+        for args, kwargs, on_error in batch:
+            try:
+                self._publisher.publish(*args, **kwargs)
+                published += 1
+            except Exception:
+                logger.exception('Bus publish failed: %s', args[0])
+                failed += 1
+                _call(on_error)
+        with self._lock:
+            self._published += published
+            self._failed += failed
+
+
+def _call(on_error):
+    if not on_error:
+        return
+    try:
+        on_error()
+    except Exception:
+        logger.exception('Error in the bus publish error callback')
+
+
+class BusEventDispatcher:
+    """Run the bus event handlers in a pool of worker threads
+
+    Each subscription may give a `key` function returning what the event is
+    about (a user, an endpoint...). Events with the same key always go to the
+    same worker and are handled in the order they were received, events with
+    different keys are handled concurrently. When a worker queue is full, the
+    bus consumer thread waits. Until started, handlers run on the consumer
+    thread.
+    """
+
+    def __init__(self, bus_consumer, workers=4, queue_size=1000):
+        self._bus_consumer = bus_consumer
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._lock = threading.Lock()
+        self._handled = 0
+        self._failed = 0
+        self._threads = []
+
+    @classmethod
+    def from_config(cls, bus_consumer, dispatcher_config):
+        return cls(bus_consumer, **dispatcher_config)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self._threads:
+            raise Exception('Bus event dispatcher already started')
+
+        for i, partition in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run, args=(partition,), name=f'bus_dispatcher_{i}'
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        if not self._threads:
+            return
+        # Blocking: every queued event is handled before stopping
+        for partition in self._queues:
+            partition.put(_STOP)
+        logger.debug('joining bus dispatcher threads...')
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def subscribe(self, event_name, handler, key=None):
+        def dispatch(event):
+            self._dispatch(event_name, handler, key, event)
+
+        self._bus_consumer.subscribe(event_name, dispatch)
+
+    def _dispatch(self, event_name, handler, key, event):
+        # Always computed, in the order of the bus: a key function may keep state
+        partition_key = key(event) if key else None
+        if not self._threads:
+            self._handle(event_name, handler, event)
+            return
+
+        partition = hash(partition_key) % len(self._queues) if key else 0
+        self._queues[partition].put((event_name, handler, event, time.monotonic()))
+
+    def provide_status(self, status):
+        now = time.monotonic()
+        lag = 0.0
+        for partition in self._queues:
+            # Age of the oldest event waiting in this partition
+            with partition.mutex:
+                head = next(
+                    (item for item in partition.queue if item is not _STOP), None
+                )
+            if head:
+                lag = max(lag, now - head[3])
+        with self._lock:
+            status['bus_dispatcher']['workers'] = len(self._queues)
+            status['bus_dispatcher']['queue_depth'] = sum(
+                partition.qsize() for partition in self._queues
+            )
+            status['bus_dispatcher']['lag'] = lag
+            status['bus_dispatcher']['handled'] = self._handled
+            status['bus_dispatcher']['failed'] = self._failed
+
+    def _run(self, partition):
+        while True:
+            item = partition.get()
+            if item is _STOP:
+                return
+            event_name, handler, event, _ = item
+            self._handle(event_name, handler, event)
+
+    def _handle(self, event_name, handler, event):
+        try:
+            handler(event)
+        except Exception:
+            logger.exception('Error while handling bus event "%s"', event_name)
+            failed = 1
+        else:
+            failed = 0
+        with self._lock:
+            self._handled += 1
+            self._failed += failed
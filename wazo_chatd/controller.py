@@ -11,20 +11,31 @@ from xivo.consul_helpers import ServiceCatalogRegistration
 from xivo.status import StatusAggregator
 from xivo.token_renewer import TokenRenewer
 
-from .bus import BusConsumer, BusPublisher
+from .bus import BusConsumer, BusEventDispatcher, BusPublisher, BusPublishQueue
 
 from . import auth
-from .database.helpers import init_db
+from .database.helpers import init_db, provide_db_pool_status
 from .database.queries import DAO
 from .http_server import api, app, CoreRestApi
+from .shared_status import SharedStatus
 from .thread_manager import ThreadManager
+from .token_cache import TokenCache
 
 logger = logging.getLogger(__name__)
 
 
 class Controller:
     def __init__(self, config):
-        init_db(config['db_uri'])
+        db_pool = config['db_pool']
+        init_db(
+            config['db_uri'],
+            pool_size=db_pool['size'],
+            max_overflow=db_pool['max_overflow'],
+            pool_timeout=db_pool['timeout'],
+            pool_recycle=db_pool['recycle'],
+            pool_pre_ping=db_pool['pre_ping'],
+            statement_timeout=db_pool['statement_timeout'],
+        )
         self._service_discovery_args = [
             'wazo-chatd',
             config['uuid'],
@@ -34,9 +45,28 @@ class Controller:
             lambda: True,
         ]
         self.status_aggregator = StatusAggregator()
-        self.rest_api = CoreRestApi(config)
+        self.token_cache = None
+        if config['token_cache']['enabled']:
+            if config['rest_api']['workers'] > 1:
+                # The HTTP workers would keep accepting the tokens of deleted sessions
+                logger.error(
+                    'Token cache is not invalidated in the HTTP workers, disabling it'
+                )
+            else:
+                self.token_cache = TokenCache.from_config(config['token_cache'])
+        self.rest_api = CoreRestApi(config, self.token_cache)
         self.bus_consumer = BusConsumer.from_config(config['bus'])
-        self.bus_publisher = BusPublisher.from_config(config['uuid'], config['bus'])
+        self.bus_dispatcher = BusEventDispatcher.from_config(
+            self.bus_consumer, config['bus_dispatcher']
+        )
+        self.bus_publisher = BusPublishQueue.from_config(
+            BusPublisher.from_config(config['uuid'], config['bus']),
+            config['bus_publisher'],
+        )
+        if self.token_cache:
+            self.bus_consumer.subscribe(
+                'auth_session_deleted', self.token_cache.on_session_deleted
+            )
         self.thread_manager = ThreadManager()
         auth_client = AuthClient(**config['auth'])
         self.token_renewer = TokenRenewer(auth_client)
@@ -44,6 +74,10 @@ class Controller:
             self.token_renewer.subscribe_to_next_token_details_change(
                 auth.init_master_tenant
             )
+        self.shared_status = None
+        if config['rest_api']['workers'] > 1:
+            self.shared_status = SharedStatus(self.status_aggregator)
+            self.thread_manager.manage(self.shared_status)
         plugin_helpers.load(
             namespace='wazo_chatd.plugins',
             names=config['enabled_plugins'],
@@ -52,7 +86,9 @@ class Controller:
                 'config': config,
                 'dao': DAO(),
                 'bus_consumer': self.bus_consumer,
+                'bus_dispatcher': self.bus_dispatcher,
                 'bus_publisher': self.bus_publisher,
+                'shared_status': self.shared_status,
                 'status_aggregator': self.status_aggregator,
                 'thread_manager': self.thread_manager,
                 'token_changed_subscribe': self.token_renewer.subscribe_to_token_change,
@@ -63,14 +99,36 @@ class Controller:
     def run(self):
         logger.info('wazo-chatd starting...')
         self.status_aggregator.add_provider(self.bus_consumer.provide_status)
+        self.status_aggregator.add_provider(self.bus_dispatcher.provide_status)
+        self.status_aggregator.add_provider(self.bus_publisher.provide_status)
         self.status_aggregator.add_provider(auth.provide_status)
+        self.status_aggregator.add_provider(provide_db_pool_status)
+        if self.token_cache:
+            self.status_aggregator.add_provider(self.token_cache.provide_status)
         signal.signal(signal.SIGTERM, partial(_sigterm_handler, self))
 
-        with self.thread_manager:
+        # Forked before starting any thread
+        if self.rest_api.fork_workers():
+            self._run_worker()
+            return
+
+        # The publisher outlives the threads that publish, to send their last events
+        with self.bus_publisher:
+            with self.thread_manager:
+                with self.token_renewer:
+                    with self.bus_dispatcher:
+                        with self.bus_consumer:
+                            with ServiceCatalogRegistration(
+                                *self._service_discovery_args
+                            ):
+                                self.rest_api.run()
+
+    def _run_worker(self):
+        # The bus consumer and the background threads only run in the master
+        self.status_aggregator.add_provider(self.shared_status.provide_status)
+        with self.bus_publisher:
             with self.token_renewer:
-                with self.bus_consumer:
-                    with ServiceCatalogRegistration(*self._service_discovery_args):
-                        self.rest_api.run()
+                self.rest_api.run()
 
     def stop(self, reason):
         logger.warning('Stopping wazo-chatd: %s', reason)
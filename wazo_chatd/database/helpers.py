@@ -1,19 +1,56 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
+from sqlalchemy import Text, any_, cast, create_engine, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
 from sqlalchemy.orm import sessionmaker, scoped_session
 
+from .pool import InstrumentedQueuePool
+
 Session = scoped_session(sessionmaker())
 
+BULK_CHUNK_SIZE = 1000
+
 
-def init_db(db_uri, echo=False):
-    engine = create_engine(db_uri, echo=echo, pool_pre_ping=True)
+def init_db(
+    db_uri,
+    echo=False,
+    pool_size=5,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_recycle=-1,
+    pool_pre_ping=True,
+    statement_timeout=None,
+):
+    connect_args = {}
+    if statement_timeout:
+        connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+    engine = create_engine(
+        db_uri,
+        echo=echo,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        connect_args=connect_args,
+    )
     Session.configure(bind=engine)
 
 
+def provide_db_pool_status(status):
+    Session.bind.pool.provide_status(status)
+
+
+def dispose_db():
+    # A forked process must not share the connections of its parent
+    Session.remove()
+    Session.bind.dispose()
+
+
 @contextmanager
 def session_scope():
     session = Session()
@@ -25,3 +62,59 @@ def session_scope():
         raise
     finally:
         Session.remove()
+
+
+def array(values, type_):
+    # Bind one array parameter instead of one parameter per value
+    return cast(literal(list(values), ARRAY(type_)), ARRAY(type_))
+
+
+def any_uuid(column, uuids):
+    uuids = array((str(uuid) for uuid in uuids), Text)
+    return column == any_(cast(uuids, ARRAY(UUID)))
+
+
+def bulk_insert(session, table, rows):
+    """INSERT ... ON CONFLICT DO NOTHING the rows, chunked in multi-values statements"""
+    rows = list(rows)
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        end = start + BULK_CHUNK_SIZE
+        chunk = rows[start:end]
+        session.execute(insert(table).values(chunk).on_conflict_do_nothing())
+
+
+def bulk_update(session, table, criterion, values):
+    """UPDATE the rows matching criterion, skipping those already up to date"""
+    changed = or_(
+        *(table.c[name].is_distinct_from(value) for name, value in values.items())
+    )
+    session.execute(table.update().values(**values).where(criterion).where(changed))
+
+
+def bulk_update_from(session, table, key, rows):
+    """UPDATE the rows matching the key of each row dict with its other values
+
+    Rows already up to date are skipped. Every row must have the same keys.
+    """
+    if not rows:
+        return
+    names = list(rows[0])
+    data = select(
+        [
+            func.unnest(array((row[name] for row in rows), table.c[name].type)).label(
+                name
+            )
+            for name in names
+        ]
+    ).alias('data')
+    values = {name: data.c[name] for name in names if name != key}
+    changed = or_(
+        *(table.c[name].is_distinct_from(value) for name, value in values.items())
+    )
+    query = (
+        table.update()
+        .values(**values)
+        .where(table.c[key] == data.c[key])
+        .where(changed)
+    )
+    session.execute(query)
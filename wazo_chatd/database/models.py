@@ -9,14 +9,16 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy_utils import UUIDType, generic_repr
 
 Base = declarative_base()
@@ -34,6 +36,7 @@ class Tenant(Base):
 class User(Base):
 
     __tablename__ = 'chatd_user'
+    __table_args__ = (Index('chatd_user__idx__tenant_uuid', 'tenant_uuid'),)
 
     uuid = Column(UUIDType(), primary_key=True)
     tenant_uuid = Column(
@@ -64,6 +67,7 @@ class User(Base):
 class Session(Base):
 
     __tablename__ = 'chatd_session'
+    __table_args__ = (Index('chatd_session__idx__user_uuid', 'user_uuid'),)
 
     uuid = Column(UUIDType(), primary_key=True)
     mobile = Column(Boolean, nullable=False, default=False)
@@ -81,6 +85,7 @@ class Session(Base):
 class RefreshToken(Base):
 
     __tablename__ = 'chatd_refresh_token'
+    __table_args__ = (Index('chatd_refresh_token__idx__user_uuid', 'user_uuid'),)
 
     client_id = Column(Text, nullable=False, primary_key=True)
     user_uuid = Column(
@@ -99,6 +104,10 @@ class RefreshToken(Base):
 class Line(Base):
 
     __tablename__ = 'chatd_line'
+    __table_args__ = (
+        Index('chatd_line__idx__user_uuid', 'user_uuid'),
+        Index('chatd_line__idx__endpoint_name', 'endpoint_name'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_uuid = Column(UUIDType(), ForeignKey('chatd_user.uuid', ondelete='CASCADE'))
@@ -135,6 +144,7 @@ class Endpoint(Base):
 class Channel(Base):
 
     __tablename__ = 'chatd_channel'
+    __table_args__ = (Index('chatd_channel__idx__line_id', 'line_id'),)
 
     name = Column(Text, primary_key=True)
     state = Column(
@@ -156,6 +166,7 @@ class Channel(Base):
 class Room(Base):
 
     __tablename__ = 'chatd_room'
+    __table_args__ = (Index('chatd_room__idx__tenant_uuid', 'tenant_uuid'),)
 
     uuid = Column(
         UUIDType(), server_default=text('uuid_generate_v4()'), primary_key=True
@@ -166,6 +177,10 @@ class Room(Base):
         ForeignKey('chatd_tenant.uuid', ondelete='CASCADE'),
         nullable=False,
     )
+    message_count = Column(Integer, nullable=False, default=0, server_default='0')
+    # Without foreign key: messages are only deleted along with their room and a
+    # second relation between the tables would make their joins ambiguous
+    last_message_uuid = Column(UUIDType())
 
     users = relationship('RoomUser', cascade='all,delete-orphan', passive_deletes=False)
     messages = relationship(
@@ -180,6 +195,7 @@ class Room(Base):
 class RoomUser(Base):
 
     __tablename__ = 'chatd_room_user'
+    __table_args__ = (Index('chatd_room_user__idx__uuid', 'uuid', 'tenant_uuid'),)
 
     room_uuid = Column(
         UUIDType(),
@@ -195,6 +211,17 @@ class RoomUser(Base):
 class RoomMessage(Base):
 
     __tablename__ = 'chatd_room_message'
+    __table_args__ = (
+        Index(
+            'chatd_room_message__idx__room_uuid_created_at', 'room_uuid', 'created_at'
+        ),
+        # search_vector is maintained by a trigger, see the alembic migrations
+        Index(
+            'chatd_room_message__idx__search_vector',
+            'search_vector',
+            postgresql_using='gin',
+        ),
+    )
 
     uuid = Column(
         UUIDType(), server_default=text('uuid_generate_v4()'), primary_key=True
@@ -205,6 +232,7 @@ class RoomMessage(Base):
         nullable=False,
     )
     content = Column(Text)
+    search_vector = deferred(Column(TSVECTOR))
     alias = Column(String(256))
     user_uuid = Column(UUIDType(), nullable=False)
     tenant_uuid = Column(UUIDType(), nullable=False)
@@ -0,0 +1,53 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool measuring how long the checkouts wait for a connection
+
+    The wait includes opening a new connection when the pool is not full.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._checkout_timeouts = 0
+        self._checkout_wait_total = 0.0
+        self._checkout_wait_max = 0.0
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            with self._stats_lock:
+                self._checkout_timeouts += 1
+            raise
+        finally:
+            wait = time.monotonic() - start
+            with self._stats_lock:
+                self._checkouts += 1
+                self._checkout_wait_total += wait
+                self._checkout_wait_max = max(self._checkout_wait_max, wait)
+
+    def provide_status(self, status):
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        with self._stats_lock:
+            status['db_pool'].update(
+                size=self.size(),
+                max_overflow=self._max_overflow,
+                checked_out=checked_out,
+                utilization=checked_out / capacity if capacity else 0.0,
+                checkouts=self._checkouts,
+                checkout_timeouts=self._checkout_timeouts,
+                checkout_wait_total=self._checkout_wait_total,
+                checkout_wait_max=self._checkout_wait_max,
+            )
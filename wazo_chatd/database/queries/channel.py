@@ -1,8 +1,9 @@
-# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2020-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, text
+from sqlalchemy import Text, and_, any_, text
 
+from ..helpers import array, bulk_insert, bulk_update_from
 from ..models import Channel
 
 
@@ -25,6 +26,9 @@ class ChannelDAO:
 
         return self.session.query(Channel).filter(filter_).first()
 
+    def list_(self):
+        return self.session.query(Channel).all()
+
     def update(self, channel):
         self.session.add(channel)
         self.session.flush()
@@ -32,3 +36,17 @@ class ChannelDAO:
     def delete_all(self):
         self.session.query(Channel).delete()
         self.session.flush()
+
+    def bulk_create(self, channels):
+        bulk_insert(self.session, Channel.__table__, channels)
+
+    def bulk_update(self, channels):
+        bulk_update_from(self.session, Channel.__table__, 'name', channels)
+
+    def bulk_delete(self, names):
+        if not names:
+            return
+        table = Channel.__table__
+        self.session.execute(
+            table.delete().where(table.c.name == any_(array(names, Text)))
+        )
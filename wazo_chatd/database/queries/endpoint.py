@@ -1,9 +1,10 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, text
+from sqlalchemy import Text, and_, any_, text
 
 from ...exceptions import UnknownEndpointException
+from ..helpers import array, bulk_insert, bulk_update_from
 from ..models import Endpoint
 
 
@@ -43,10 +44,27 @@ class EndpointDAO:
 
         return self.session.query(Endpoint).filter(filter_).first()
 
+    def list_(self):
+        return self.session.query(Endpoint).all()
+
     def update(self, endpoint):
         self.session.add(endpoint)
         self.session.flush()
 
+    def bulk_create(self, endpoints):
+        bulk_insert(self.session, Endpoint.__table__, endpoints)
+
+    def bulk_update(self, endpoints):
+        bulk_update_from(self.session, Endpoint.__table__, 'name', endpoints)
+
+    def bulk_delete(self, names):
+        if not names:
+            return
+        table = Endpoint.__table__
+        self.session.execute(
+            table.delete().where(table.c.name == any_(array(names, Text)))
+        )
+
     def delete_all(self):
         self.session.query(Endpoint).delete()
         self.session.flush()
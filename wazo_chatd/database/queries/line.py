@@ -1,9 +1,10 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, text
+from sqlalchemy import Integer, and_, any_, text
 
 from ...exceptions import UnknownLineException
+from ..helpers import array, bulk_insert, bulk_update_from
 from ..models import Line
 
 
@@ -61,3 +62,20 @@ class LineDAO:
         if channel in line.channels:
             line.channels.remove(channel)
             self.session.flush()
+
+    def bulk_create(self, lines):
+        bulk_insert(self.session, Line.__table__, lines)
+
+    def bulk_delete(self, line_ids):
+        if not line_ids:
+            return
+        table = Line.__table__
+        ids = array(line_ids, Integer)
+        self.session.execute(table.delete().where(table.c.id == any_(ids)))
+
+    def bulk_associate_endpoints(self, endpoint_names):
+        """Set the endpoint_name of each line id key of endpoint_names"""
+        rows = [
+            {'id': id_, 'endpoint_name': name} for id_, name in endpoint_names.items()
+        ]
+        bulk_update_from(self.session, Line.__table__, 'id', rows)
@@ -1,10 +1,11 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, text
+from sqlalchemy import and_, text, tuple_
 from sqlalchemy.orm import joinedload
 
 from ...exceptions import UnknownRefreshTokenException
+from ..helpers import bulk_insert, bulk_update
 from ..models import RefreshToken
 
 
@@ -41,3 +42,23 @@ class RefreshTokenDAO:
     def update(self, refresh_token):
         self.session.add(refresh_token)
         self.session.flush()
+
+    def bulk_create(self, refresh_tokens):
+        bulk_insert(self.session, RefreshToken.__table__, refresh_tokens)
+
+    def bulk_delete(self, keys):
+        if not keys:
+            return
+        table = RefreshToken.__table__
+        self.session.execute(table.delete().where(self._match_keys(table, keys)))
+
+    def bulk_update(self, keys, **values):
+        if not keys:
+            return
+        table = RefreshToken.__table__
+        bulk_update(self.session, table, self._match_keys(table, keys), values)
+
+    @staticmethod
+    def _match_keys(table, keys):
+        keys = [(client_id, str(user_uuid)) for client_id, user_uuid in keys]
+        return tuple_(table.c.client_id, table.c.user_uuid).in_(keys)
@@ -1,15 +1,23 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy.sql.functions import ReturnTypeFromArgs
-from sqlalchemy import text
+from sqlalchemy import func, literal, text, tuple_
+from sqlalchemy.orm import selectinload
 
 from ...exceptions import UnknownRoomException
+from ..helpers import any_uuid
 from ..models import Room, RoomUser, RoomMessage
 
+SEARCH_CONFIGURATION = 'chatd_unaccent'
 
-class unaccent(ReturnTypeFromArgs):
-    pass
+
+def search_query(search):
+    # Every word must match the beginning of a word of the message
+    words = [word for word in search.split(' ') if word]
+    lexemes = [
+        "'{}':*".format(word.replace('\\', '\\\\').replace("'", "''")) for word in words
+    ]
+    return func.to_tsquery(SEARCH_CONFIGURATION, ' & '.join(lexemes))
 
 
 class RoomDAO:
@@ -35,7 +43,9 @@ class RoomDAO:
         return room
 
     def list_(self, tenant_uuids, **filter_parameters):
-        return self._list_query(tenant_uuids, **filter_parameters).all()
+        query = self._list_query(tenant_uuids, **filter_parameters)
+        # The users of every room in one more query, instead of one per room
+        return query.options(selectinload(Room.users)).all()
 
     def count(self, tenant_uuids, **filter_parameters):
         return self._list_query(tenant_uuids, **filter_parameters).count()
@@ -55,14 +65,38 @@ class RoomDAO:
         return query.filter(Room.tenant_uuid.in_(tenant_uuids))
 
     def add_message(self, room, message):
-        room.messages.append(message)
+        # Locked before inserting, whose foreign key check also locks the room:
+        # the concurrent insertions then see the pointer committed by each other
+        _, latest_created_at = (
+            self.session.query(Room, RoomMessage.created_at)
+            .outerjoin(RoomMessage, RoomMessage.uuid == Room.last_message_uuid)
+            .filter(Room.uuid == room.uuid)
+            .with_for_update(of=Room)
+            .populate_existing()
+            .one()
+        )
+
+        # Inserted without going through room.messages, which would load the
+        # whole history of the room
+        message.room_uuid = room.uuid
+        self.session.add(message)
+        self.session.flush()
+        self.session.expire(room, ['messages'])
+        room.message_count = Room.message_count + 1
+        # A concurrent insertion may have committed a more recent message
+        if latest_created_at is None or latest_created_at <= message.created_at:
+            room.last_message_uuid = message.uuid
         self.session.flush()
 
     def list_messages(self, room, **filter_parameters):
         query = self._build_messages_query(room.uuid)
         query = self._list_filter(query, **filter_parameters)
-        query = self._paginate(query, **filter_parameters)
-        return query.all()
+        return self._fetch_page(query, **filter_parameters)
+
+    def list_messages_with_count(self, room, **filter_parameters):
+        query = self._build_messages_query(room.uuid)
+        query = self._list_filter(query, **filter_parameters)
+        return self._fetch_page_with_count(query, **filter_parameters)
 
     def count_messages(self, room, **filter_parameters):
         query = self._build_messages_query(room.uuid)
@@ -74,13 +108,54 @@ class RoomDAO:
             RoomMessage.room_uuid == room_uuid
         )
 
-    def list_user_messages(self, tenant_uuid, user_uuid, **filter_parameters):
+    def list_user_messages(
+        self, tenant_uuid, user_uuid, distinct=None, **filter_parameters
+    ):
+        if distinct == 'room_uuid':
+            return self.list_latest_user_messages(
+                tenant_uuid, user_uuid, **filter_parameters
+            )
         query = self._build_user_messages_query(tenant_uuid, user_uuid)
         query = self._list_filter(query, **filter_parameters)
-        query = self._paginate(query, **filter_parameters)
-        return query.all()
+        return self._fetch_page(query, **filter_parameters)
+
+    def list_user_messages_with_count(
+        self, tenant_uuid, user_uuid, distinct=None, **filter_parameters
+    ):
+        if distinct == 'room_uuid':
+            query = self._build_latest_user_messages_query(tenant_uuid, user_uuid)
+        else:
+            query = self._build_user_messages_query(tenant_uuid, user_uuid)
+        query = self._list_filter(query, **filter_parameters)
+        return self._fetch_page_with_count(query, **filter_parameters)
 
-    def count_user_messages(self, tenant_uuid, user_uuid, **filter_parameters):
+    def list_latest_user_messages(self, tenant_uuid, user_uuid, **filter_parameters):
+        query = self._build_latest_user_messages_query(tenant_uuid, user_uuid)
+        query = self._list_filter(query, **filter_parameters)
+        return self._fetch_page(query, **filter_parameters)
+
+    def count_latest_user_messages(self, tenant_uuid, user_uuid, **filter_parameters):
+        query = self._build_latest_user_messages_query(tenant_uuid, user_uuid)
+        query = self._list_filter(query, **filter_parameters)
+        return query.count()
+
+    def count_all_user_messages(self, tenant_uuid, user_uuid):
+        # Served from the counters of the rooms instead of counting the messages
+        query = (
+            self.session.query(func.coalesce(func.sum(Room.message_count), 0))
+            .join(RoomUser)
+            .filter(RoomUser.tenant_uuid == tenant_uuid)
+            .filter(RoomUser.uuid == user_uuid)
+        )
+        return query.scalar()
+
+    def count_user_messages(
+        self, tenant_uuid, user_uuid, distinct=None, **filter_parameters
+    ):
+        if distinct == 'room_uuid':
+            return self.count_latest_user_messages(
+                tenant_uuid, user_uuid, **filter_parameters
+            )
         query = self._build_user_messages_query(tenant_uuid, user_uuid)
         query = self._list_filter(query, **filter_parameters)
         return query.count()
@@ -94,6 +169,63 @@ class RoomDAO:
             .filter(RoomUser.uuid == user_uuid)
         )
 
+    def _build_latest_user_messages_query(self, tenant_uuid, user_uuid):
+        # One message per room, reached through the pointer kept by add_message
+        return (
+            self.session.query(RoomMessage)
+            .join(Room, Room.last_message_uuid == RoomMessage.uuid)
+            .join(RoomUser)
+            .filter(RoomUser.tenant_uuid == tenant_uuid)
+            .filter(RoomUser.uuid == user_uuid)
+        )
+
+    def _fetch_page(self, query, cursor=None, **filter_parameters):
+        messages = self._paginate(query, cursor=cursor, **filter_parameters).all()
+        if cursor and cursor['before']:
+            messages.reverse()
+        self._highlight(messages, filter_parameters.get('search'))
+        return messages
+
+    def _fetch_page_with_count(self, query, cursor=None, **filter_parameters):
+        """Return the page and the number of messages matching the filters
+
+        Without a cursor, the count is computed by a window function in the same
+        query as the page. A cursor filters out the previous messages, so the
+        count needs its own query.
+        """
+        if cursor:
+            messages = self._fetch_page(query, cursor=cursor, **filter_parameters)
+            return messages, query.count()
+
+        if filter_parameters.get('limit') == 0:
+            # Only the count is asked, there is no row to carry it
+            return [], query.count()
+
+        counted_query = query.add_columns(func.count().over())
+        rows = self._paginate(counted_query, **filter_parameters).all()
+        if not rows:
+            # The offset may be past the last message
+            count = query.count() if filter_parameters.get('offset') else 0
+            return [], count
+        messages = [message for message, _ in rows]
+        self._highlight(messages, filter_parameters.get('search'))
+        return messages, rows[0][1]
+
+    def _highlight(self, messages, search):
+        # Only the messages of the page are highlighted, ts_headline is expensive
+        if not messages or not search or not search.strip():
+            return
+
+        headline = func.ts_headline(
+            SEARCH_CONFIGURATION, RoomMessage.content, search_query(search)
+        )
+        query = self.session.query(RoomMessage.uuid, headline).filter(
+            any_uuid(RoomMessage.uuid, [message.uuid for message in messages])
+        )
+        highlights = dict(query.all())
+        for message in messages:
+            message.highlight = highlights.get(message.uuid)
+
     def _paginate(
         self,
         query,
@@ -101,11 +233,32 @@ class RoomDAO:
         offset=None,
         order='created_at',
         direction='desc',
+        cursor=None,
+        search=None,
         **ignored
     ):
-        order_column = getattr(RoomMessage, order)
-        order_column = order_column.asc() if direction == 'asc' else order_column.desc()
-        query = query.order_by(order_column)
+        # The uuid makes the order total, which the cursor needs to seek
+        if order == 'rank':
+            rank = func.ts_rank(RoomMessage.search_vector, search_query(search))
+            order_columns = (rank, RoomMessage.created_at, RoomMessage.uuid)
+        else:
+            order_columns = (getattr(RoomMessage, order), RoomMessage.uuid)
+        ascending = direction == 'asc'
+
+        if cursor:
+            # Seek from the cursor instead of skipping the previous pages. A
+            # cursor placed before its page lists in reverse and is reversed back
+            if cursor['before']:
+                ascending = not ascending
+            position = tuple_(*order_columns)
+            value = tuple_(
+                *(literal(cursor[column.key], column.type) for column in order_columns)
+            )
+            query = query.filter(position > value if ascending else position < value)
+
+        query = query.order_by(
+            *(column.asc() if ascending else column.desc() for column in order_columns)
+        )
 
         if limit is not None:
             query = query.limit(limit)
@@ -114,22 +267,12 @@ class RoomDAO:
 
         return query
 
-    def _list_filter(
-        self, query, search=None, from_date=None, distinct=None, **ignored
-    ):
-        if distinct is not None:
-            distinct_field = getattr(RoomMessage, distinct)
-            query = (
-                query.distinct(distinct_field)
-                .order_by(distinct_field, RoomMessage.created_at.desc())
-                .from_self()
+    def _list_filter(self, query, search=None, from_date=None, **ignored):
+        if search is not None and search.strip():
+            query = query.filter(
+                RoomMessage.search_vector.op('@@')(search_query(search))
             )
 
-        if search is not None:
-            words = [word for word in search.split(' ') if word]
-            pattern = '%{}%'.format('%'.join(words))
-            query = query.filter(unaccent(RoomMessage.content).ilike(pattern))
-
         if from_date is not None:
             query = query.filter(RoomMessage.created_at >= from_date)
 
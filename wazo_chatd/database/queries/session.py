@@ -1,10 +1,11 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from sqlalchemy import and_, text
 from sqlalchemy.orm import joinedload
 
 from ...exceptions import UnknownSessionException
+from ..helpers import any_uuid, bulk_insert, bulk_update
 from ..models import Session
 
 
@@ -39,3 +40,20 @@ class SessionDAO:
     def update(self, session):
         self.session.add(session)
         self.session.flush()
+
+    def bulk_create(self, sessions):
+        bulk_insert(self.session, Session.__table__, sessions)
+
+    def bulk_delete(self, session_uuids):
+        if not session_uuids:
+            return
+        table = Session.__table__
+        self.session.execute(
+            table.delete().where(any_uuid(table.c.uuid, session_uuids))
+        )
+
+    def bulk_update(self, session_uuids, **values):
+        if not session_uuids:
+            return
+        table = Session.__table__
+        bulk_update(self.session, table, any_uuid(table.c.uuid, session_uuids), values)
@@ -1,7 +1,8 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from ...exceptions import UnknownTenantException
+from ..helpers import any_uuid, bulk_insert
 from ..models import Tenant
 
 
@@ -38,3 +39,13 @@ class TenantDAO:
     def delete(self, tenant):
         self.session.delete(tenant)
         self.session.flush()
+
+    def bulk_create(self, tenant_uuids):
+        rows = [{'uuid': uuid} for uuid in tenant_uuids]
+        bulk_insert(self.session, Tenant.__table__, rows)
+
+    def bulk_delete(self, tenant_uuids):
+        if not tenant_uuids:
+            return
+        table = Tenant.__table__
+        self.session.execute(table.delete().where(any_uuid(table.c.uuid, tenant_uuids)))
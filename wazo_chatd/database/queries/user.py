@@ -1,10 +1,23 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from sqlalchemy import text
+from sqlalchemy.orm import selectinload
 
 from ...exceptions import UnknownUserException
-from ..models import User
+from ..helpers import any_uuid, bulk_insert, bulk_update
+from ..models import Line, User
+
+
+def presence_options():
+    # One query per relationship, whatever the number of users
+    lines = selectinload(User.lines)
+    return (
+        selectinload(User.sessions),
+        selectinload(User.refresh_tokens),
+        lines.joinedload(Line.endpoint),
+        lines.selectinload(Line.channels),
+    )
 
 
 class UserDAO:
@@ -24,22 +37,26 @@ class UserDAO:
         self.session.add(user)
         self.session.flush()
 
-    def get(self, tenant_uuids, user_uuid):
+    def get(self, tenant_uuids, user_uuid, load_presence=False):
         query = self.session.query(User).filter(
-            User.tenant_uuid.in_(tenant_uuids), User.uuid == user_uuid
+            any_uuid(User.tenant_uuid, tenant_uuids), User.uuid == user_uuid
         )
+        if load_presence:
+            query = query.options(*presence_options())
 
         user = query.first()
         if not user:
             raise UnknownUserException(user_uuid)
         return user
 
-    def list_(self, tenant_uuids, uuids=None, **filter_parameters):
+    def list_(self, tenant_uuids, uuids=None, load_presence=False, **filter_parameters):
         query = self._get_users_query(
             tenant_uuids,
             uuids=uuids,
             **filter_parameters,
         )
+        if load_presence:
+            query = query.options(*presence_options())
         return query.all()
 
     def count(self, tenant_uuids, **filter_parameters):
@@ -61,7 +78,22 @@ class UserDAO:
         if not tenant_uuids:
             return query.filter(text('false'))
 
-        return query.filter(User.tenant_uuid.in_(tenant_uuids))
+        return query.filter(any_uuid(User.tenant_uuid, tenant_uuids))
+
+    def bulk_create(self, users):
+        bulk_insert(self.session, User.__table__, users)
+
+    def bulk_delete(self, user_uuids):
+        if not user_uuids:
+            return
+        table = User.__table__
+        self.session.execute(table.delete().where(any_uuid(table.c.uuid, user_uuids)))
+
+    def bulk_update(self, user_uuids, **values):
+        if not user_uuids:
+            return
+        table = User.__table__
+        bulk_update(self.session, table, any_uuid(table.c.uuid, user_uuids), values)
 
     def add_session(self, user, session):
         if session in user.sessions:
@@ -0,0 +1,63 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import sqlite3
+import unittest
+
+from collections import defaultdict
+
+from hamcrest import assert_that, calling, greater_than, has_entries, raises
+from sqlalchemy.exc import TimeoutError
+
+from ..pool import InstrumentedQueuePool
+
+
+class TestInstrumentedQueuePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = InstrumentedQueuePool(
+            lambda: sqlite3.connect(':memory:'),
+            pool_size=1,
+            max_overflow=1,
+            timeout=0.01,
+        )
+
+    def test_provide_status(self):
+        connection = self.pool.connect()
+        self.pool.connect().close()
+
+        status = defaultdict(dict)
+        self.pool.provide_status(status)
+
+        assert_that(
+            status['db_pool'],
+            has_entries(
+                size=1,
+                max_overflow=1,
+                checked_out=1,
+                utilization=0.5,
+                checkouts=2,
+                checkout_timeouts=0,
+                checkout_wait_max=greater_than(0),
+            ),
+        )
+        connection.close()
+
+    def test_checkout_timeout(self):
+        connections = [self.pool.connect(), self.pool.connect()]
+
+        assert_that(calling(self.pool.connect), raises(TimeoutError))
+
+        status = defaultdict(dict)
+        self.pool.provide_status(status)
+        assert_that(
+            status['db_pool'],
+            has_entries(
+                checked_out=2,
+                utilization=1.0,
+                checkouts=3,
+                checkout_timeouts=1,
+                checkout_wait_max=greater_than(0.01),
+            ),
+        )
+        for connection in connections:
+            connection.close()
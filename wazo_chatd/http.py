@@ -1,12 +1,13 @@
-# Copyright 2019-2021 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from flask_restful import Resource
 from xivo import mallow_helpers
 from xivo import rest_api_helpers
-from xivo.auth_verifier import AuthVerifier
 
-auth_verifier = AuthVerifier()
+from .token_cache import CachingAuthVerifier
+
+auth_verifier = CachingAuthVerifier()
 
 
 class ErrorCatchingResource(Resource):
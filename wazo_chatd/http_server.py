@@ -1,22 +1,30 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
 import os
+import signal
+import socket
+import time
 
 from datetime import timedelta
 
 from cheroot import wsgi
-from flask import Flask
+from flask import Flask, g
 from flask_cors import CORS
 from flask_restful import Api
 from sqlalchemy.exc import SQLAlchemyError
+from wazo_auth_client import Client as AuthClient
 from xivo import http_helpers
 
 from .http import auth_verifier
-from .database.helpers import Session
+from .database.helpers import Session, dispose_db
+from .token_cache import CachedAuthClient
 
 VERSION = 1.0
+# A worker exiting sooner is replaced after an increasing delay
+WORKER_MIN_UPTIME = 10
+WORKER_MAX_BACKOFF = 30
 
 logger = logging.getLogger(__name__)
 app = Flask('wazo-chatd')
@@ -46,9 +54,31 @@ def commit_database():
         Session.remove()
 
 
+class ReusePortWSGIServer(wsgi.WSGIServer):
+    """WSGIServer binding its address with SO_REUSEPORT
+
+    Every HTTP worker binds the same address, the kernel spreads the incoming
+    connections over their sockets.
+    """
+
+    def bind(self, family, type, proto=0):
+        sock = self.prepare_socket(
+            self.bind_addr, family, type, proto, self.nodelay, self.ssl_adapter
+        )
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock = self.socket = self.bind_socket(sock, self.bind_addr)
+        self.bind_addr = self.resolve_real_bind_addr(sock)
+        return sock
+
+
 class CoreRestApi:
-    def __init__(self, global_config):
+    def __init__(self, global_config, token_cache=None):
         self.config = global_config['rest_api']
+        self._workers = self.config['workers']
+        self._supervisor_pid = None
+        self._worker_pids = {}
+        self._is_worker = False
+        self._stopping = False
         http_helpers.add_logger(app, logger)
         app.before_request(http_helpers.log_before_request)
         app.after_request(http_helpers.log_request)
@@ -57,6 +87,10 @@ class CoreRestApi:
         app.config.update(global_config)
         app.permanent_session_lifetime = timedelta(minutes=5)
         auth_verifier.set_config(global_config['auth'])
+        self._token_cache = token_cache
+        if token_cache:
+            auth_verifier.set_token_cache(token_cache)
+            app.before_request(self._set_cached_auth_client)
         self._load_cors()
         self.server = None
 
@@ -66,11 +100,101 @@ class CoreRestApi:
         if enabled:
             CORS(app, **cors_config)
 
+    def _set_cached_auth_client(self):
+        # The client of xivo.tenant_flask_helpers, to get the token from the cache
+        auth_client = AuthClient(**app.config['auth'])
+        g.auth_client = CachedAuthClient(auth_client, self._token_cache)
+
+    def fork_workers(self):
+        """Fork the HTTP workers, returns True in the workers
+
+        Must be called before starting any thread. The master process keeps the
+        bus consumer and the background threads, the workers are forked and
+        replaced when they exit by a supervisor process without any thread.
+        """
+        if self._workers <= 1:
+            return False
+
+        pid = os.fork()
+        if pid:
+            self._supervisor_pid = pid
+            return False
+
+        if self._supervise_workers():
+            return True
+        os._exit(0)
+
     def run(self):
+        if self._supervisor_pid:
+            self._wait_supervisor()
+        else:
+            self._serve()
+
+    def _wait_supervisor(self):
+        while True:
+            try:
+                _, exit_status = os.waitpid(self._supervisor_pid, 0)
+            except KeyboardInterrupt:
+                self.stop()
+                continue
+            except ChildProcessError:
+                return
+            if not self._stopping:
+                logger.error('HTTP workers supervisor exited (status %s)', exit_status)
+            return
+
+    def _supervise_workers(self):
+        """Keep the HTTP workers running until stopped, returns True in the workers"""
+        for _ in range(self._workers):
+            if self._fork_worker():
+                return True
+        logger.info('Started %s HTTP workers', len(self._worker_pids))
+
+        failures = 0
+        while self._worker_pids:
+            try:
+                pid, exit_status = os.wait()
+            except KeyboardInterrupt:
+                self.stop()
+                continue
+            except ChildProcessError:
+                break
+            started_at = self._worker_pids.pop(pid, None)
+            if started_at is None or self._stopping:
+                continue
+
+            logger.error('HTTP worker %s exited (status %s)', pid, exit_status)
+            if time.monotonic() - started_at < WORKER_MIN_UPTIME:
+                failures += 1
+                self._backoff(min(WORKER_MAX_BACKOFF, 0.5 * 2 ** (failures - 1)))
+            else:
+                failures = 0
+            if not self._stopping and self._fork_worker():
+                return True
+        return False
+
+    def _backoff(self, delay):
+        # Short sleeps, the SIGTERM handler only sets the stopping flag
+        deadline = time.monotonic() + delay
+        while not self._stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    def _fork_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            self._is_worker = True
+            self._worker_pids.clear()
+            dispose_db()
+            return True
+        self._worker_pids[pid] = time.monotonic()
+        return False
+
+    def _serve(self):
         bind_addr = (self.config['listen'], self.config['port'])
 
         wsgi_app = wsgi.WSGIPathInfoDispatcher({'/': app})
-        self.server = wsgi.WSGIServer(bind_addr=bind_addr, wsgi_app=wsgi_app)
+        server_class = ReusePortWSGIServer if self._is_worker else wsgi.WSGIServer
+        self.server = server_class(bind_addr=bind_addr, wsgi_app=wsgi_app)
         if self.config['certificate'] and self.config['private_key']:
             logger.warning(
                 'Using service SSL configuration is deprecated. Please use NGINX instead.'
@@ -93,5 +217,14 @@ class CoreRestApi:
             self.server.stop()
 
     def stop(self):
+        self._stopping = True
+        pids = list(self._worker_pids)
+        if self._supervisor_pid:
+            pids.append(self._supervisor_pid)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
         if self.server:
             self.server.stop()
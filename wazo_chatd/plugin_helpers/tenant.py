@@ -1,11 +1,117 @@
-# Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import threading
+
+from collections import defaultdict
+
 from xivo.tenant_flask_helpers import Tenant, token
 
 
+class TenantHierarchy:
+    """Parent of every tenant, to find the visible tenants without wazo-auth
+
+    Loaded from the complete list of tenants by the presence initialization, then
+    kept up to date from the bus events. Until it is loaded, `descendants` returns
+    None and the visible tenants are asked to wazo-auth. The changes received
+    between `start_loading` and `load` are replayed by `load`, the list of tenants
+    may predate them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parents = None
+        self._children = defaultdict(set)
+        self._descendants = {}
+        self._loading = False
+        self._pending = []
+
+    def is_loaded(self):
+        return self._parents is not None
+
+    def start_loading(self):
+        """Keep the changes received until `load`, called before listing tenants"""
+        with self._lock:
+            self._loading = True
+            self._pending.clear()
+
+    def load(self, tenants):
+        if not all(tenant.get('parent_uuid') for tenant in tenants):
+            # An incomplete hierarchy would hide tenants
+            self.unload()
+            return
+
+        with self._lock:
+            self._parents = {}
+            self._children.clear()
+            for tenant in tenants:
+                self._add(str(tenant['uuid']), str(tenant['parent_uuid']))
+            for change, *args in self._pending:
+                change(*args)
+            self._loading = False
+            self._pending.clear()
+
+    def unload(self):
+        with self._lock:
+            self._loading = False
+            self._pending.clear()
+            self._parents = None
+            self._children.clear()
+            self._descendants.clear()
+
+    def add(self, tenant_uuid, parent_uuid):
+        with self._lock:
+            if self._loading:
+                self._pending.append((self._add, str(tenant_uuid), str(parent_uuid)))
+            elif self._parents is not None:
+                self._add(str(tenant_uuid), str(parent_uuid))
+
+    def remove(self, tenant_uuid):
+        with self._lock:
+            if self._loading:
+                self._pending.append((self._remove, str(tenant_uuid)))
+            elif self._parents is not None:
+                self._remove(str(tenant_uuid))
+
+    def descendants(self, tenant_uuid):
+        """The tenant and all its sub-tenants, None if the tenant is unknown"""
+        tenant_uuid = str(tenant_uuid)
+        with self._lock:
+            if self._parents is None or tenant_uuid not in self._parents:
+                return None
+            if tenant_uuid not in self._descendants:
+                self._descendants[tenant_uuid] = self._walk(tenant_uuid)
+            return self._descendants[tenant_uuid]
+
+    def _add(self, tenant_uuid, parent_uuid):
+        self._parents[tenant_uuid] = parent_uuid
+        # The top tenant is its own parent
+        if parent_uuid != tenant_uuid:
+            self._children[parent_uuid].add(tenant_uuid)
+        self._descendants.clear()
+
+    def _remove(self, tenant_uuid):
+        if tenant_uuid not in self._parents:
+            return
+        parent_uuid = self._parents.pop(tenant_uuid)
+        self._children[parent_uuid].discard(tenant_uuid)
+        self._descendants.clear()
+
+    def _walk(self, tenant_uuid):
+        descendants = [tenant_uuid]
+        for uuid in descendants:
+            descendants.extend(self._children.get(uuid, ()))
+        return descendants
+
+
+tenant_hierarchy = TenantHierarchy()
+
+
 def get_tenant_uuids(recurse=False):
     tenant_uuid = Tenant.autodetect().uuid
     if not recurse:
         return [tenant_uuid]
-    return [tenant.uuid for tenant in token.visible_tenants(tenant_uuid)]
+    tenant_uuids = tenant_hierarchy.descendants(tenant_uuid)
+    if tenant_uuids is None:
+        tenant_uuids = [tenant.uuid for tenant in token.visible_tenants(tenant_uuid)]
+    return tenant_uuids
@@ -0,0 +1,146 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from unittest.mock import Mock, patch
+
+from hamcrest import assert_that, contains_inanyorder, equal_to, none
+
+from ..tenant import TenantHierarchy, get_tenant_uuids
+
+TOP = 'top-tenant'
+RESELLER = 'reseller-tenant'
+CUSTOMER = 'customer-tenant'
+OTHER = 'other-tenant'
+
+
+class TestTenantHierarchy(unittest.TestCase):
+    def setUp(self):
+        self.hierarchy = TenantHierarchy()
+        self.hierarchy.load(
+            [
+                {'uuid': TOP, 'parent_uuid': TOP},
+                {'uuid': RESELLER, 'parent_uuid': TOP},
+                {'uuid': CUSTOMER, 'parent_uuid': RESELLER},
+                {'uuid': OTHER, 'parent_uuid': TOP},
+            ]
+        )
+
+    def test_descendants(self):
+        assert_that(
+            self.hierarchy.descendants(TOP),
+            contains_inanyorder(TOP, RESELLER, CUSTOMER, OTHER),
+        )
+        assert_that(
+            self.hierarchy.descendants(RESELLER),
+            contains_inanyorder(RESELLER, CUSTOMER),
+        )
+        assert_that(self.hierarchy.descendants(CUSTOMER), equal_to([CUSTOMER]))
+
+    def test_unknown_tenant(self):
+        assert_that(self.hierarchy.descendants('unknown'), none())
+
+    def test_not_loaded(self):
+        hierarchy = TenantHierarchy()
+        hierarchy.add(RESELLER, TOP)
+
+        assert_that(hierarchy.descendants(TOP), none())
+        assert_that(hierarchy.descendants(RESELLER), none())
+
+    def test_load_replays_changes_received_while_loading(self):
+        hierarchy = TenantHierarchy()
+        hierarchy.start_loading()
+        hierarchy.add('new-customer', RESELLER)
+        hierarchy.remove(OTHER)
+
+        hierarchy.load(
+            [
+                {'uuid': TOP, 'parent_uuid': TOP},
+                {'uuid': RESELLER, 'parent_uuid': TOP},
+                {'uuid': OTHER, 'parent_uuid': TOP},
+            ]
+        )
+
+        assert_that(
+            hierarchy.descendants(TOP),
+            contains_inanyorder(TOP, RESELLER, 'new-customer'),
+        )
+
+    def test_load_ignores_changes_received_before_loading(self):
+        hierarchy = TenantHierarchy()
+        hierarchy.add('new-customer', RESELLER)
+        hierarchy.start_loading()
+        hierarchy.remove(OTHER)
+        hierarchy.unload()
+
+        hierarchy.start_loading()
+        hierarchy.load(
+            [{'uuid': TOP, 'parent_uuid': TOP}, {'uuid': OTHER, 'parent_uuid': TOP}]
+        )
+
+        assert_that(hierarchy.descendants(TOP), contains_inanyorder(TOP, OTHER))
+
+    def test_load_without_parents(self):
+        self.hierarchy.load([{'uuid': TOP, 'parent_uuid': TOP}, {'uuid': OTHER}])
+
+        assert_that(self.hierarchy.is_loaded(), equal_to(False))
+        assert_that(self.hierarchy.descendants(TOP), none())
+
+    def test_add(self):
+        self.hierarchy.descendants(RESELLER)
+
+        self.hierarchy.add('new-customer', RESELLER)
+
+        assert_that(
+            self.hierarchy.descendants(RESELLER),
+            contains_inanyorder(RESELLER, CUSTOMER, 'new-customer'),
+        )
+
+    def test_remove(self):
+        self.hierarchy.descendants(TOP)
+
+        self.hierarchy.remove(OTHER)
+
+        assert_that(
+            self.hierarchy.descendants(TOP),
+            contains_inanyorder(TOP, RESELLER, CUSTOMER),
+        )
+        assert_that(self.hierarchy.descendants(OTHER), none())
+
+
+@patch('wazo_chatd.plugin_helpers.tenant.token')
+@patch('wazo_chatd.plugin_helpers.tenant.Tenant')
+class TestGetTenantUuids(unittest.TestCase):
+    def setUp(self):
+        self.hierarchy = TenantHierarchy()
+        patcher = patch(
+            'wazo_chatd.plugin_helpers.tenant.tenant_hierarchy', self.hierarchy
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_recurse_from_hierarchy(self, Tenant, token):
+        Tenant.autodetect.return_value = Mock(uuid=TOP)
+        self.hierarchy.load(
+            [{'uuid': TOP, 'parent_uuid': TOP}, {'uuid': OTHER, 'parent_uuid': TOP}]
+        )
+
+        result = get_tenant_uuids(recurse=True)
+
+        assert_that(result, contains_inanyorder(TOP, OTHER))
+        token.visible_tenants.assert_not_called()
+
+    def test_recurse_from_wazo_auth_when_not_loaded(self, Tenant, token):
+        Tenant.autodetect.return_value = Mock(uuid=TOP)
+        token.visible_tenants.return_value = [Mock(uuid=TOP), Mock(uuid=OTHER)]
+
+        result = get_tenant_uuids(recurse=True)
+
+        assert_that(result, contains_inanyorder(TOP, OTHER))
+        token.visible_tenants.assert_called_once_with(TOP)
+
+    def test_no_recurse(self, Tenant, token):
+        Tenant.autodetect.return_value = Mock(uuid=TOP)
+
+        assert_that(get_tenant_uuids(), equal_to([TOP]))
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
+import threading
 
 from wazo_chatd.exceptions import UnknownUserException
 from wazo_chatd.database.helpers import session_scope
@@ -23,34 +24,136 @@ from .initiator import (
 logger = logging.getLogger(__name__)
 
 
+# The events that are not about a single known user
+FALLBACK_KEY = 'presences'
+
+
+class EndpointOwners:
+    """User owning each endpoint, to key the events of an endpoint on its user
+
+    The events of a user are then handled in order, whether they come from
+    wazo-auth, wazo-confd or Asterisk. The line events update it as they are
+    dispatched, in the order of the bus, and the initiator loads the lines it
+    fetched. Until it is loaded, every presence event gets the fallback key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._loaded = False
+
+    def load(self, owners):
+        with self._lock:
+            for endpoint_name, user_uuid in owners.items():
+                # The line events dispatched meanwhile are more recent
+                self._owners.setdefault(endpoint_name, str(user_uuid))
+            self._loaded = True
+
+    def user_key(self, field):
+        def key(event):
+            return self._user_key(event[field])
+
+        return key
+
+    def line_associated_key(self, event):
+        user_uuid = str(event['user']['uuid'])
+        endpoint_name = _line_endpoint(event['line'])
+        if endpoint_name:
+            with self._lock:
+                self._owners[endpoint_name] = user_uuid
+        return self._user_key(user_uuid)
+
+    def line_dissociated_key(self, event):
+        user_uuid = str(event['user']['uuid'])
+        endpoint_name = _line_endpoint(event['line'])
+        with self._lock:
+            if self._owners.get(endpoint_name) == user_uuid:
+                del self._owners[endpoint_name]
+        return self._user_key(user_uuid)
+
+    def device_key(self, event):
+        return self._endpoint_key(event['Device'])
+
+    def channel_key(self, event):
+        return self._endpoint_key(extract_endpoint_from_channel(event['Channel']))
+
+    def _user_key(self, user_uuid):
+        return str(user_uuid) if self._loaded else FALLBACK_KEY
+
+    def _endpoint_key(self, endpoint_name):
+        if not self._loaded:
+            return FALLBACK_KEY
+        with self._lock:
+            return self._owners.get(endpoint_name, FALLBACK_KEY)
+
+
+def _line_endpoint(line):
+    return extract_endpoint_from_line(line) if line.get('name') else None
+
+
+def _fallback_key(event):
+    return FALLBACK_KEY
+
+
 class BusEventHandler:
-    def __init__(self, dao, notifier):
+    def __init__(self, dao, notifier, endpoint_owners=None):
         self._dao = dao
         self._notifier = notifier
+        self._endpoint_owners = endpoint_owners or EndpointOwners()
 
-    def subscribe(self, bus_consumer):
+    def subscribe(self, bus_dispatcher):
+        owners = self._endpoint_owners
+        # A tenant deletion removes the users of many keys
         events = [
-            ('auth_tenant_added', self._tenant_created),
-            ('auth_tenant_deleted', self._tenant_deleted),
-            ('user_created', self._user_created),
-            ('user_deleted', self._user_deleted),
-            ('auth_session_created', self._session_created),
-            ('auth_session_deleted', self._session_deleted),
-            ('auth_refresh_token_created', self._refresh_token_created),
-            ('auth_refresh_token_deleted', self._refresh_token_deleted),
-            ('user_line_associated', self._user_line_associated),
-            ('user_line_dissociated', self._user_line_dissociated),
-            ('users_services_dnd_updated', self._user_dnd_updated),
-            ('DeviceStateChange', self._device_state_change),
-            ('Hangup', self._channel_deleted),
-            ('Newchannel', self._channel_created),
-            ('Newstate', self._channel_updated),
-            ('Hold', self._channel_hold),
-            ('Unhold', self._channel_unhold),
+            ('auth_tenant_added', self._tenant_created, _fallback_key),
+            ('auth_tenant_deleted', self._tenant_deleted, _fallback_key),
+            ('user_created', self._user_created, owners.user_key('uuid')),
+            ('user_deleted', self._user_deleted, owners.user_key('uuid')),
+            (
+                'auth_session_created',
+                self._session_created,
+                owners.user_key('user_uuid'),
+            ),
+            (
+                'auth_session_deleted',
+                self._session_deleted,
+                owners.user_key('user_uuid'),
+            ),
+            (
+                'auth_refresh_token_created',
+                self._refresh_token_created,
+                owners.user_key('user_uuid'),
+            ),
+            (
+                'auth_refresh_token_deleted',
+                self._refresh_token_deleted,
+                owners.user_key('user_uuid'),
+            ),
+            (
+                'user_line_associated',
+                self._user_line_associated,
+                owners.line_associated_key,
+            ),
+            (
+                'user_line_dissociated',
+                self._user_line_dissociated,
+                owners.line_dissociated_key,
+            ),
+            (
+                'users_services_dnd_updated',
+                self._user_dnd_updated,
+                owners.user_key('user_uuid'),
+            ),
+            ('DeviceStateChange', self._device_state_change, owners.device_key),
+            ('Hangup', self._channel_deleted, owners.channel_key),
+            ('Newchannel', self._channel_created, owners.channel_key),
+            ('Newstate', self._channel_updated, owners.channel_key),
+            ('Hold', self._channel_hold, owners.channel_key),
+            ('Unhold', self._channel_unhold, owners.channel_key),
         ]
 
-        for event, handler in events:
-            bus_consumer.subscribe(event, handler)
+        for event, handler, key in events:
+            bus_dispatcher.subscribe(event, handler, key=key)
 
     def _user_created(self, event):
         user_uuid = event['uuid']
@@ -68,6 +171,7 @@ class BusEventHandler:
             user = self._dao.user.get([tenant_uuid], user_uuid)
             logger.debug('Delete user "%s"', user_uuid)
             self._dao.user.delete(user)
+        self._notifier.deleted(user_uuid)
 
     def _tenant_created(self, event):
         tenant_uuid = event['uuid']
@@ -302,3 +406,214 @@ class BusEventHandler:
             self._dao.channel.update(channel)
 
             self._notifier.updated(channel.line.user)
+
+
+class _NoNotification:
+    def updated(self, user):
+        pass
+
+    def deleted(self, user_uuid):
+        pass
+
+
+class StoreBusEventHandler(BusEventHandler):
+    """Apply bus events to the presence store and persist them write-behind
+
+    Until the store is loaded by the initiator, events are handled directly in the
+    database, as `BusEventHandler` does.
+    """
+
+    def __init__(self, dao, notifier, store, persister, endpoint_owners=None):
+        super().__init__(dao, notifier, endpoint_owners)
+        self._store = store
+        self._persister = persister
+        self._database = BusEventHandler(dao, _NoNotification())
+
+    def _apply(self, event, handler_name, update_store=None, notify=True):
+        with self._store.lock:
+            if not self._store.is_loaded():
+                return getattr(super(), handler_name)(event)
+
+            user = update_store() if update_store else None
+            self._persister.submit(getattr(self._database, handler_name), event)
+            if user and notify:
+                self._notifier.updated(user)
+
+    def _user_created(self, event):
+        self._apply(
+            event,
+            '_user_created',
+            lambda: self._store.add_user(event['uuid'], event['tenant_uuid']),
+            notify=False,
+        )
+
+    def _user_deleted(self, event):
+        self._apply(
+            event,
+            '_user_deleted',
+            lambda: self._store.remove_user(event['uuid']),
+            notify=False,
+        )
+        self._notifier.deleted(event['uuid'])
+
+    def _tenant_created(self, event):
+        self._apply(event, '_tenant_created')
+
+    def _tenant_deleted(self, event):
+        self._apply(
+            event,
+            '_tenant_deleted',
+            lambda: self._store.remove_tenant(event['uuid']),
+        )
+
+    def _session_created(self, event):
+        self._apply(
+            event,
+            '_session_created',
+            lambda: self._store.add_session(
+                event['user_uuid'], event['uuid'], event['mobile']
+            ),
+        )
+
+    def _session_deleted(self, event):
+        self._apply(
+            event,
+            '_session_deleted',
+            lambda: self._store.remove_session(event['user_uuid'], event['uuid']),
+        )
+
+    def _refresh_token_created(self, event):
+        self._apply(
+            event,
+            '_refresh_token_created',
+            lambda: self._store.add_refresh_token(
+                event['user_uuid'], event['client_id'], event['mobile']
+            ),
+        )
+
+    def _refresh_token_deleted(self, event):
+        self._apply(
+            event,
+            '_refresh_token_deleted',
+            lambda: self._store.remove_refresh_token(
+                event['user_uuid'], event['client_id']
+            ),
+        )
+
+    def _user_line_associated(self, event):
+        self._apply(
+            event,
+            '_user_line_associated',
+            lambda: self._store.associate_line(
+                event['user']['uuid'],
+                event['line']['id'],
+                extract_endpoint_from_line(event['line']),
+            ),
+        )
+
+    def _user_line_dissociated(self, event):
+        self._apply(
+            event,
+            '_user_line_dissociated',
+            lambda: self._store.dissociate_line(
+                event['user']['uuid'], event['line']['id']
+            ),
+        )
+
+    def _user_dnd_updated(self, event):
+        self._apply(
+            event,
+            '_user_dnd_updated',
+            lambda: self._store.update_user(
+                event['user_uuid'], do_not_disturb=event['enabled']
+            ),
+        )
+
+    def _device_state_change(self, event):
+        state = DEVICE_STATE_MAP.get(event['State'], 'unavailable')
+        self._apply(
+            event,
+            '_device_state_change',
+            lambda: self._store.update_endpoint_state(event['Device'], state),
+        )
+
+    def _channel_created(self, event):
+        channel_name = event['Channel']
+        state = CHANNEL_STATE_MAP.get(event['ChannelStateDesc'], 'undefined')
+        endpoint_name = extract_endpoint_from_channel(channel_name)
+        self._apply(
+            event,
+            '_channel_created',
+            lambda: self._store.add_channel(endpoint_name, channel_name, state),
+        )
+
+    def _channel_deleted(self, event):
+        self._apply(
+            event,
+            '_channel_deleted',
+            lambda: self._store.remove_channel(event['Channel']),
+        )
+
+    def _channel_updated(self, event):
+        state = CHANNEL_STATE_MAP.get(event['ChannelStateDesc'], 'undefined')
+        self._apply(
+            event,
+            '_channel_updated',
+            lambda: self._store.update_channel_state(event['Channel'], state),
+        )
+
+    def _channel_hold(self, event):
+        self._apply(
+            event,
+            '_channel_hold',
+            lambda: self._store.update_channel_state(event['Channel'], 'holding'),
+        )
+
+    def _channel_unhold(self, event):
+        state = CHANNEL_STATE_MAP.get(event['ChannelStateDesc'], 'undefined')
+        self._apply(
+            event,
+            '_channel_unhold',
+            lambda: self._store.update_channel_state(event['Channel'], state),
+        )
+
+
+class TenantHierarchyEventHandler:
+    """Keep the tenant hierarchy up to date from the tenant bus events
+
+    The parent of a new tenant is asked to wazo-auth when the event does not
+    include it. If that fails, the hierarchy is unloaded and the visible tenants
+    are asked to wazo-auth again.
+    """
+
+    def __init__(self, tenant_hierarchy, auth):
+        self._tenant_hierarchy = tenant_hierarchy
+        self._auth = auth
+
+    def subscribe(self, bus_dispatcher):
+        # Same key as the tenant events of BusEventHandler
+        bus_dispatcher.subscribe(
+            'auth_tenant_added', self._tenant_created, key=_fallback_key
+        )
+        bus_dispatcher.subscribe(
+            'auth_tenant_deleted', self._tenant_deleted, key=_fallback_key
+        )
+
+    def _tenant_created(self, event):
+        tenant_uuid = event['uuid']
+        parent_uuid = event.get('parent_uuid')
+        if not parent_uuid:
+            try:
+                parent_uuid = self._auth.tenants.get(tenant_uuid)['parent_uuid']
+            except Exception:
+                logger.warning(
+                    'Unknown parent of tenant "%s", unloading the tenant hierarchy',
+                    tenant_uuid,
+                    exc_info=True,
+                )
+                self._tenant_hierarchy.unload()
+                return
+        self._tenant_hierarchy.add(tenant_uuid, parent_uuid)
+
+    def _tenant_deleted(self, event):
+        self._tenant_hierarchy.remove(event['uuid'])
@@ -0,0 +1,138 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingPresence:
+    __slots__ = ('tenant_uuid', 'payload', 'deadline', 'expiry')
+
+    def __init__(self, tenant_uuid, payload, deadline, expiry):
+        self.tenant_uuid = tenant_uuid
+        self.payload = payload
+        self.deadline = deadline
+        self.expiry = expiry
+
+
+class PresenceCoalescer:
+    """Merge the bursts of presence updates of each user into a single event
+
+    The event of a user is published once no update happened during `window`
+    seconds, and at most `max_latency` seconds after the first update of the
+    burst. It always carries the last submitted payload.
+    """
+
+    def __init__(self, publish, window, max_latency):
+        self._publish = publish
+        self._window = window
+        self._max_latency = max(window, max_latency)
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._deadlines = []
+        self._flushed = 0
+        self._suppressed = 0
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            raise Exception('Presence coalescer already started')
+
+        self._thread = threading.Thread(target=self._run, name='presence_coalescer')
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        logger.debug('joining presence coalescer thread...')
+        self._thread.join()
+
+    def is_started(self):
+        return self._thread is not None
+
+    def submit(self, user_uuid, tenant_uuid, payload):
+        user_uuid = str(user_uuid)
+        now = time.monotonic()
+        with self._condition:
+            pending = self._pending.get(user_uuid)
+            if pending:
+                # Deadlines only move forward, the heap entry is refreshed when popped
+                pending.payload = payload
+                pending.deadline = min(now + self._window, pending.expiry)
+                self._suppressed += 1
+                return
+
+            deadline = now + self._window
+            self._pending[user_uuid] = _PendingPresence(
+                tenant_uuid, payload, deadline, now + self._max_latency
+            )
+            heapq.heappush(self._deadlines, (deadline, user_uuid))
+            self._condition.notify()
+
+    def discard(self, user_uuid):
+        with self._condition:
+            # Its heap entry is skipped when popped
+            self._pending.pop(str(user_uuid), None)
+
+    def provide_status(self, status):
+        with self._condition:
+            status['presence_notifications']['flushed'] = self._flushed
+            status['presence_notifications']['suppressed'] = self._suppressed
+            status['presence_notifications']['pending'] = len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    due = self._pop_all()
+                else:
+                    due, timeout = self._pop_due(time.monotonic())
+                    if not due:
+                        self._condition.wait(timeout)
+                        continue
+
+            self._publish_all(due)
+            if self._stopped:
+                return
+
+    def _pop_due(self, now):
+        due = []
+        while self._deadlines:
+            deadline, user_uuid = self._deadlines[0]
+            if deadline > now:
+                return due, deadline - now
+
+            heapq.heappop(self._deadlines)
+            pending = self._pending.get(user_uuid)
+            if not pending:
+                continue
+            if pending.deadline > deadline:
+                heapq.heappush(self._deadlines, (pending.deadline, user_uuid))
+                continue
+
+            del self._pending[user_uuid]
+            due.append(pending)
+        return due, None
+
+    def _pop_all(self):
+        due = list(self._pending.values())
+        self._pending.clear()
+        self._deadlines.clear()
+        return due
+
+    def _publish_all(self, due):
+        for pending in due:
+            try:
+                self._publish(pending.tenant_uuid, pending.payload)
+            except Exception:
+                logger.exception('Presence notification failed')
+        with self._condition:
+            self._flushed += len(due)
@@ -1,4 +1,4 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from flask import request
@@ -6,10 +6,14 @@ from flask import request
 from xivo.auth_verifier import required_acl
 
 from wazo_chatd.http import AuthResource
-from wazo_chatd.plugin_helpers.http import update_model_instance
 from wazo_chatd.plugin_helpers.tenant import get_tenant_uuids
 
-from .schemas import ListRequestSchema, UserPresenceSchema
+from .schemas import (
+    ListRequestSchema,
+    UserPresenceSchema,
+    dump_user_presence,
+    dump_user_presences,
+)
 from .validator import status_validator
 
 
@@ -27,7 +31,7 @@ class PresenceListResource(AuthResource):
         total = self._service.count(tenant_uuids)
         filtered = self._service.count(tenant_uuids, **parameters)
         return {
-            'items': UserPresenceSchema().dump(presences, many=True),
+            'items': dump_user_presences(presences),
             'filtered': filtered,
             'total': total,
         }
@@ -42,7 +46,7 @@ class PresenceItemResource(AuthResource):
     def get(self, user_uuid):
         tenant_uuids = get_tenant_uuids(recurse=True)
         presence = self._service.get(tenant_uuids, user_uuid)
-        return UserPresenceSchema().dump(presence), 200
+        return dump_user_presence(presence), 200
 
     @required_acl('chatd.users.{user_uuid}.presences.update')
     @status_validator.presence_initialization
@@ -50,6 +54,5 @@ class PresenceItemResource(AuthResource):
         tenant_uuids = get_tenant_uuids(recurse=True)
         presence = self._service.get(tenant_uuids, user_uuid)
         presence_args = UserPresenceSchema().load(request.get_json())
-        update_model_instance(presence, presence_args)
-        self._service.update(presence)
+        self._service.update(presence, presence_args)
         return '', 204
@@ -1,28 +1,15 @@
-# Copyright 2019-2021 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 from xivo.status import Status
 
-from wazo_chatd.database.models import (
-    Channel,
-    Endpoint,
-    Line,
-    RefreshToken,
-    Session,
-    Tenant,
-    User,
-)
+from wazo_chatd.database.models import Channel, Endpoint
 from wazo_chatd.database.helpers import session_scope
-from wazo_chatd.exceptions import (
-    UnknownEndpointException,
-    UnknownLineException,
-    UnknownRefreshTokenException,
-    UnknownSessionException,
-    UnknownTenantException,
-    UnknownUserException,
-)
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +37,7 @@ CHANNEL_STATE_MAP = {
     'Pre-ring': 'undefined',
     'Unknown': 'undefined',
 }
+CONFD_PAGING_ATTEMPTS = 3
 
 
 def extract_endpoint_from_channel(channel_name):
@@ -72,18 +60,59 @@ def extract_endpoint_from_line(line):
         return line['name']
 
 
+def compact_user(user):
+    # Keep only what the initialization uses, confd users are large
+    return {
+        'uuid': user['uuid'],
+        'tenant_uuid': user['tenant_uuid'],
+        'lines': [
+            {
+                'id': line['id'],
+                'name': line['name'],
+                'endpoint_sip': line.get('endpoint_sip'),
+                'endpoint_sccp': line.get('endpoint_sccp'),
+                'endpoint_custom': line.get('endpoint_custom'),
+            }
+            for line in user['lines']
+        ],
+        'services': {'dnd': {'enabled': user['services']['dnd']['enabled']}},
+    }
+
+
 class Initiator:
-    def __init__(self, dao, auth, amid, confd):
+    def __init__(
+        self,
+        dao,
+        auth,
+        amid,
+        confd,
+        store=None,
+        persister=None,
+        confd_page_size=None,
+        sync_mode='diff',
+        tenant_hierarchy=None,
+        endpoint_owners=None,
+    ):
         self._dao = dao
         self._auth = auth
         self._amid = amid
         self._confd = confd
+        self._store = store
+        self._persister = persister
+        self._confd_page_size = confd_page_size
+        self._sync_mode = sync_mode
+        self._tenant_hierarchy = tenant_hierarchy
+        self._endpoint_owners = endpoint_owners
+        self._fetch_durations = {}
         self._is_initialized = False
 
     def provide_status(self, status):
         status['presence_initialization']['status'] = (
             Status.ok if self.is_initialized() else Status.fail
         )
+        status['presence_initialization']['fetch_durations'] = dict(
+            self._fetch_durations
+        )
 
     def is_initialized(self):
         return self._is_initialized
@@ -94,43 +123,132 @@ class Initiator:
         self._amid.set_token(token)
         self._confd.set_token(token)
 
-        endpoint_events = self._amid.action('DeviceStateList')
-        tenants = self._auth.tenants.list()['items']
-        users = self._confd.users.list(recurse=True)['items']
-        sessions = self._auth.sessions.list(recurse=True)['items']
-        refresh_tokens = self._auth.refresh_tokens.list(recurse=True)['items']
-        channel_events = self._amid.action('CoreShowChannels')
-
-        self.initiate_endpoints(endpoint_events)
-        self.initiate_tenants(tenants)
-        self.initiate_users(users)
-        self.initiate_sessions(sessions)
-        self.initiate_refresh_tokens(refresh_tokens)
-        self.initiate_channels(channel_events)
+        if self._tenant_hierarchy is not None:
+            # The tenant events received while fetching are replayed once loaded
+            self._tenant_hierarchy.start_loading()
+        try:
+            snapshot = self.fetch()
+            self.initiate_endpoints(snapshot['endpoints'])
+            self.initiate_tenants(snapshot['tenants'])
+        except Exception:
+            if self._tenant_hierarchy is not None:
+                self._tenant_hierarchy.unload()
+            raise
+        self.initiate_users(snapshot['users'])
+        self.initiate_sessions(snapshot['sessions'])
+        self.initiate_refresh_tokens(snapshot['refresh_tokens'])
+        self.initiate_channels(snapshot['channels'])
+        if self._store is not None:
+            self.initiate_store()
         self._is_initialized = True
         logger.debug('Initialized completed')
 
-    def initiate_tenants(self, tenants):
-        tenants = set(tenant['uuid'] for tenant in tenants)
-        tenants_cached = set(str(tenant.uuid) for tenant in self._dao.tenant.list_())
+    def fetch(self):
+        sources = {
+            'endpoints': lambda: self._amid.action('DeviceStateList'),
+            'tenants': lambda: self._auth.tenants.list()['items'],
+            'users': self._fetch_users,
+            'sessions': lambda: self._auth.sessions.list(recurse=True)['items'],
+            'refresh_tokens': lambda: self._auth.refresh_tokens.list(recurse=True)[
+                'items'
+            ],
+            'channels': lambda: self._amid.action('CoreShowChannels'),
+        }
+        with ThreadPoolExecutor(
+            max_workers=len(sources), thread_name_prefix='presence_fetch'
+        ) as executor:
+            futures = {
+                name: executor.submit(self._timed_fetch, name, fetch)
+                for name, fetch in sources.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    def _timed_fetch(self, name, fetch):
+        start = time.monotonic()
+        result = fetch()
+        duration = time.monotonic() - start
+        self._fetch_durations[name] = round(duration, 3)
+        logger.info('Fetched %s %s in %.3f seconds', len(result), name, duration)
+        return result
+
+    def _fetch_users(self):
+        if not self._confd_page_size:
+            return self._fetch_all_users()
+
+        for _ in range(CONFD_PAGING_ATTEMPTS):
+            users = self._fetch_users_by_page()
+            if users is not None:
+                return users
+            logger.info('Users changed while fetching them by page, fetching again')
+        # A missing user would be deleted with its lines and sessions
+        logger.warning('Users keep changing, fetching them in one request')
+        return self._fetch_all_users()
+
+    def _fetch_all_users(self):
+        users = self._confd.users.list(recurse=True)['items']
+        return [compact_user(user) for user in users]
+
+    def _fetch_users_by_page(self):
+        """Return None when the list of users shifted between two pages
+
+        Each page starts with the last user of the previous page. When a user
+        before it was removed meanwhile, the list shifted and a user was skipped.
+        """
+        users = {}
+        offset = 0
+        last_uuid = None
+        while True:
+            if offset:
+                response = self._confd.users.list(
+                    recurse=True,
+                    order='id',
+                    limit=self._confd_page_size + 1,
+                    offset=offset - 1,
+                )
+                page = response['items']
+                if not page or page[0]['uuid'] != last_uuid:
+                    return None
+                page = page[1:]
+            else:
+                response = self._confd.users.list(
+                    recurse=True, order='id', limit=self._confd_page_size, offset=0
+                )
+                page = response['items']
+
+            for user in page:
+                users[user['uuid']] = compact_user(user)
+            if page:
+                last_uuid = page[-1]['uuid']
+            offset += len(page)
+            if len(page) < self._confd_page_size or offset >= response['total']:
+                return list(users.values())
+
+    def initiate_store(self):
+        # Holding the store lock blocks the bus handlers until every pending write
+        # has reached the database and the store reflects it
+        with self._store.lock:
+            self._persister.flush()
+            with session_scope():
+                logger.debug('Load presence store')
+                users = self._dao.user.list_(tenant_uuids=None, load_presence=True)
+                endpoints = self._dao.endpoint.list_()
+                self._store.load(users, endpoints)
 
-        tenants_missing = tenants - tenants_cached
+    def initiate_tenants(self, tenants):
+        if self._tenant_hierarchy is not None:
+            self._tenant_hierarchy.load(tenants)
+        tenants = set(str(tenant['uuid']) for tenant in tenants)
         with session_scope():
-            for uuid in tenants_missing:
-                logger.debug('Create tenant "%s"', uuid)
-                tenant = Tenant(uuid=uuid)
-                self._dao.tenant.create(tenant)
+            tenants_cached = set(
+                str(tenant.uuid) for tenant in self._dao.tenant.list_()
+            )
+            tenants_expired = tenants_cached - tenants
+            tenants_missing = tenants - tenants_cached
 
-        tenants_expired = tenants_cached - tenants
-        with session_scope():
-            for uuid in tenants_expired:
-                try:
-                    tenant = self._dao.tenant.get(uuid)
-                except UnknownTenantException as e:
-                    logger.warning(e)
-                    continue
-                logger.debug('Delete tenant "%s"', uuid)
-                self._dao.tenant.delete(tenant)
+            logger.debug('Delete %s tenants', len(tenants_expired))
+            self._dao.tenant.bulk_delete(tenants_expired)
+            logger.debug('Create %s tenants', len(tenants_missing))
+            self._dao.tenant.bulk_create(tenants_missing)
 
     def initiate_users(self, users):
         self._add_and_remove_users(users)
@@ -138,243 +256,223 @@ class Initiator:
         self._add_missing_endpoints(users)  # disconnected SCCP endpoints are missing
         self._associate_line_endpoint(users)
         self._update_services_users(users)
+        if self._endpoint_owners is not None:
+            self._endpoint_owners.load(self._endpoint_users(users))
 
     def _add_and_remove_users(self, users):
-        users = set((user['uuid'], user['tenant_uuid']) for user in users)
-        users_cached = set(
-            (str(u.uuid), str(u.tenant_uuid))
-            for u in self._dao.user.list_(tenant_uuids=None)
-        )
-
-        users_missing = users - users_cached
+        users = set((str(user['uuid']), str(user['tenant_uuid'])) for user in users)
         with session_scope():
-            for uuid, tenant_uuid in users_missing:
-                # Avoid race condition between init tenant and init user
-                tenant = self._dao.tenant.find_or_create(tenant_uuid)
-
-                logger.debug('Create user "%s"', uuid)
-                user = User(uuid=uuid, tenant=tenant, state='unavailable')
-                self._dao.user.create(user)
-
-        users_expired = users_cached - users
-        with session_scope():
-            for uuid, tenant_uuid in users_expired:
-                try:
-                    user = self._dao.user.get([tenant_uuid], uuid)
-                except UnknownUserException as e:
-                    logger.warning(e)
-                    continue
-                logger.debug('Delete user "%s"', uuid)
-                self._dao.user.delete(user)
+            users_cached = set(
+                (str(u.uuid), str(u.tenant_uuid))
+                for u in self._dao.user.list_(tenant_uuids=None)
+            )
+
+            users_expired = users_cached - users
+            logger.debug('Delete %s users', len(users_expired))
+            self._dao.user.bulk_delete([uuid for uuid, _ in users_expired])
+
+            users_missing = users - users_cached
+            # Avoid race condition between init tenant and init user
+            self._dao.tenant.bulk_create(set(tenant for _, tenant in users_missing))
+            logger.debug('Create %s users', len(users_missing))
+            self._dao.user.bulk_create(
+                [
+                    {'uuid': uuid, 'tenant_uuid': tenant_uuid, 'state': 'unavailable'}
+                    for uuid, tenant_uuid in users_missing
+                ]
+            )
 
     def _add_and_remove_lines(self, users):
-        lines = set(
-            (line['id'], user['uuid'], user['tenant_uuid'])
-            for user in users
-            for line in user['lines']
-        )
-        lines_cached = set(
-            (line.id, str(line.user_uuid), str(line.tenant_uuid))
-            for line in self._dao.line.list_()
-        )
-
-        lines_missing = lines - lines_cached
-        with session_scope():
-            for id_, user_uuid, tenant_uuid in lines_missing:
-                try:
-                    user = self._dao.user.get([tenant_uuid], user_uuid)
-                except UnknownUserException as e:
-                    logger.warning(e)
-                    continue
-                if self._dao.line.find(id_):
+        lines = {}
+        for user in users:
+            for line in user['lines']:
+                if line['id'] in lines:
                     logger.warning(
-                        'Line "%s" already created. Line multi-users not supported', id_
+                        'Line "%s" already created. Line multi-users not supported',
+                        line['id'],
                     )
                     continue
-                line = Line(id=id_)
-                logger.debug('Create line "%s"', id_)
-                self._dao.user.add_line(user, line)
-
-        lines_expired = lines_cached - lines
+                lines[line['id']] = str(user['uuid'])
         with session_scope():
-            for id_, user_uuid, tenant_uuid in lines_expired:
-                try:
-                    user = self._dao.user.get([tenant_uuid], user_uuid)
-                    line = self._dao.line.get(id_)
-                except UnknownUserException:
-                    logger.debug('Line "%s" already deleted', id_)
-                    continue
-                logger.debug('Delete line "%s"', id_)
-                self._dao.user.remove_session(user, line)
+            lines_cached = {
+                line.id: str(line.user_uuid) for line in self._dao.line.list_()
+            }
+
+            lines_expired = [
+                id_
+                for id_, user_uuid in lines_cached.items()
+                if lines.get(id_) != user_uuid
+            ]
+            logger.debug('Delete %s lines', len(lines_expired))
+            self._dao.line.bulk_delete(lines_expired)
+
+            lines_missing = [
+                {'id': id_, 'user_uuid': user_uuid}
+                for id_, user_uuid in lines.items()
+                if lines_cached.get(id_) != user_uuid
+            ]
+            logger.debug('Create %s lines', len(lines_missing))
+            self._dao.line.bulk_create(lines_missing)
 
     def _add_missing_endpoints(self, users):
-        lines = set(
-            (line['id'], extract_endpoint_from_line(line))
-            for user in users
-            for line in user['lines']
-        )
         with session_scope():
-            for line_id, endpoint_name in lines:
-                if not endpoint_name:
-                    logger.warning('Line "%s" doesn\'t have name', line_id)
-                    continue
-
-                endpoint = self._dao.endpoint.find_by(name=endpoint_name)
-                if endpoint:
-                    continue
-
-                logger.debug('Create endpoint "%s"', endpoint_name)
-                self._dao.endpoint.create(Endpoint(name=endpoint_name))
+            endpoint_names = set(self._line_endpoints(users).values())
+            logger.debug('Create missing endpoints among %s', len(endpoint_names))
+            self._dao.endpoint.bulk_create([{'name': name} for name in endpoint_names])
 
     def _associate_line_endpoint(self, users):
-        lines = set(
-            (line['id'], extract_endpoint_from_line(line))
-            for user in users
-            for line in user['lines']
-        )
         with session_scope():
-            for line_id, endpoint_name in lines:
-                try:
-                    line = self._dao.line.get(line_id)
-                    endpoint = self._dao.endpoint.get_by(name=endpoint_name)
-                except (UnknownLineException, UnknownEndpointException):
-                    logger.debug(
-                        'Unable to associate line "%s" with endpoint "%s"',
-                        line_id,
-                        endpoint_name,
-                    )
+            line_endpoints = self._line_endpoints(users)
+            logger.debug('Associate %s lines with their endpoint', len(line_endpoints))
+            self._dao.line.bulk_associate_endpoints(line_endpoints)
+
+    def _line_endpoints(self, users):
+        line_endpoints = {}
+        for user in users:
+            for line in user['lines']:
+                endpoint_name = extract_endpoint_from_line(line)
+                if not endpoint_name:
+                    logger.warning('Line "%s" doesn\'t have name', line['id'])
                     continue
-                logger.debug(
-                    'Associate line "%s" with endpoint "%s"', line.id, endpoint.name
-                )
-                self._dao.line.associate_endpoint(line, endpoint)
+                line_endpoints[line['id']] = endpoint_name
+        return line_endpoints
+
+    def _endpoint_users(self, users):
+        endpoint_users = {}
+        for user in users:
+            for line in user['lines']:
+                endpoint_name = extract_endpoint_from_line(line)
+                if endpoint_name:
+                    endpoint_users[endpoint_name] = str(user['uuid'])
+        return endpoint_users
 
     def _update_services_users(self, users):
-        with session_scope() as session:
-            for confd_user in users:
-                try:
-                    user = self._dao.user.get(
-                        [confd_user['tenant_uuid']], confd_user['uuid']
-                    )
-                except UnknownUserException as e:
-                    logger.warning(e)
-                    continue
-                do_not_disturb_status = confd_user['services']['dnd']['enabled']
+        do_not_disturb = {True: [], False: []}
+        for user in users:
+            enabled = user['services']['dnd']['enabled']
+            do_not_disturb[enabled].append(user['uuid'])
+
+        with session_scope():
+            for enabled, user_uuids in do_not_disturb.items():
                 logger.debug(
-                    'Updating user "%s" DND status to "%s"',
-                    user.uuid,
-                    do_not_disturb_status,
+                    'Updating %s users DND status to "%s"', len(user_uuids), enabled
                 )
-                user.do_not_disturb = do_not_disturb_status
-                session.flush()
+                self._dao.user.bulk_update(user_uuids, do_not_disturb=enabled)
 
     def initiate_sessions(self, sessions):
-        self._add_and_remove_sessions(sessions)
-        self._update_sessions(sessions)
-
-    def _add_and_remove_sessions(self, sessions):
-        sessions = set(
-            (session['uuid'], session['user_uuid'], session['tenant_uuid'])
-            for session in sessions
-        )
-        sessions_cached = set(
-            (str(session.uuid), str(session.user_uuid), str(session.tenant_uuid))
-            for session in self._dao.session.list_()
-        )
-
-        sessions_missing = sessions - sessions_cached
-        with session_scope():
-            for uuid, user_uuid, tenant_uuid in sessions_missing:
-                try:
-                    user = self._dao.user.get([tenant_uuid], user_uuid)
-                except UnknownUserException:
-                    logger.debug('Session "%s" has no valid user "%s"', uuid, user_uuid)
-                    continue
-
-                logger.debug('Create session "%s" for user "%s"', uuid, user_uuid)
-                session = Session(uuid=uuid, user_uuid=user_uuid)
-                self._dao.user.add_session(user, session)
-
-        sessions_expired = sessions_cached - sessions
         with session_scope():
-            for uuid, user_uuid, tenant_uuid in sessions_expired:
-                try:
-                    user = self._dao.user.get([tenant_uuid], user_uuid)
-                    session = self._dao.session.get(uuid)
-                except (UnknownUserException, UnknownSessionException) as e:
-                    logger.warning(e)
-                    continue
-
-                logger.debug('Delete session "%s" for user "%s"', uuid, user_uuid)
-                self._dao.user.remove_session(user, session)
+            user_uuids = self._list_user_uuids()
+            sessions = {
+                str(session['uuid']): session
+                for session in sessions
+                if str(session['user_uuid']) in user_uuids
+            }
+            sessions_cached = {
+                str(session.uuid): str(session.user_uuid)
+                for session in self._dao.session.list_()
+            }
+
+            sessions_expired = [
+                uuid
+                for uuid, user_uuid in sessions_cached.items()
+                if uuid not in sessions or str(sessions[uuid]['user_uuid']) != user_uuid
+            ]
+            logger.debug('Delete %s sessions', len(sessions_expired))
+            self._dao.session.bulk_delete(sessions_expired)
+
+            sessions_missing = [
+                {
+                    'uuid': uuid,
+                    'user_uuid': str(session['user_uuid']),
+                    'mobile': _is_mobile(session),
+                }
+                for uuid, session in sessions.items()
+                if sessions_cached.get(uuid) != str(session['user_uuid'])
+            ]
+            logger.debug('Create %s sessions', len(sessions_missing))
+            self._dao.session.bulk_create(sessions_missing)
 
-    def _update_sessions(self, sessions):
-        with session_scope():
-            for session in sessions:
-                cached_session = self._dao.session.find(session['uuid'])
-                if cached_session and session['mobile'] != cached_session.mobile:
-                    cached_session.mobile = session['mobile']
-                    self._dao.session.update(cached_session)
+            for mobile, uuids in _group_by_mobile(sessions).items():
+                self._dao.session.bulk_update(uuids, mobile=mobile)
 
     def initiate_refresh_tokens(self, tokens):
-        self._add_and_remove_refresh_tokens(tokens)
-        self._update_refresh_tokens(tokens)
-
-    def _add_and_remove_refresh_tokens(self, tokens):
-        tokens = set(
-            (token['client_id'], token['user_uuid'], token['tenant_uuid'])
-            for token in tokens
-        )
-        tokens_cached = set(
-            (token.client_id, str(token.user_uuid), str(token.tenant_uuid))
-            for token in self._dao.refresh_token.list_()
-        )
-
-        tokens_missing = tokens - tokens_cached
         with session_scope():
-            for client_id, user_uuid, tenant_uuid in tokens_missing:
-                try:
-                    user = self._dao.user.get([tenant_uuid], user_uuid)
-                except UnknownUserException:
-                    logger.debug(
-                        'Refresh token "%s" has no valid user "%s"',
-                        client_id,
-                        user_uuid,
-                    )
-                    continue
+            user_uuids = self._list_user_uuids()
+            tokens = {
+                (token['client_id'], str(token['user_uuid'])): token
+                for token in tokens
+                if str(token['user_uuid']) in user_uuids
+            }
+            tokens_cached = set(
+                (token.client_id, str(token.user_uuid))
+                for token in self._dao.refresh_token.list_()
+            )
+
+            tokens_expired = tokens_cached - set(tokens)
+            logger.debug('Delete %s refresh tokens', len(tokens_expired))
+            self._dao.refresh_token.bulk_delete(tokens_expired)
+
+            tokens_missing = [
+                {
+                    'client_id': client_id,
+                    'user_uuid': user_uuid,
+                    'mobile': _is_mobile(token),
+                }
+                for (client_id, user_uuid), token in tokens.items()
+                if (client_id, user_uuid) not in tokens_cached
+            ]
+            logger.debug('Create %s refresh tokens', len(tokens_missing))
+            self._dao.refresh_token.bulk_create(tokens_missing)
 
-                logger.debug(
-                    'Create refresh token "%s" for user "%s"', client_id, user_uuid
-                )
-                token = RefreshToken(client_id=client_id, user_uuid=user_uuid)
-                self._dao.user.add_refresh_token(user, token)
+            for mobile, keys in _group_by_mobile(tokens).items():
+                self._dao.refresh_token.bulk_update(keys, mobile=mobile)
 
-        tokens_expired = tokens_cached - tokens
-        with session_scope():
-            for client_id, user_uuid, tenant_uuid in tokens_expired:
-                try:
-                    user = self._dao.user.get([tenant_uuid], user_uuid)
-                    token = self._dao.refresh_token.get(user_uuid, client_id)
-                except (UnknownUserException, UnknownRefreshTokenException) as e:
-                    logger.warning(e)
-                    continue
+    def _list_user_uuids(self):
+        return set(str(user.uuid) for user in self._dao.user.list_(tenant_uuids=None))
 
-                logger.debug(
-                    'Delete refresh token "%s" for user "%s"', client_id, user_uuid
-                )
-                self._dao.user.remove_refresh_token(user, token)
+    def initiate_endpoints(self, events):
+        if self._sync_mode == 'full':
+            return self._reset_endpoints(events)
 
-    def _update_refresh_tokens(self, tokens):
-        with session_scope():
-            for token in tokens:
-                cached_token = self._dao.refresh_token.find(
-                    token['user_uuid'], token['client_id']
-                )
-                if cached_token and token['mobile'] != cached_token.mobile:
-                    cached_token.mobile = token['mobile']
-                    self._dao.refresh_token.update(cached_token)
+        endpoints = {}
+        for event in events:
+            if event.get('Event') != 'DeviceStateChange':
+                continue
+            state = DEVICE_STATE_MAP.get(event['State'], 'unavailable')
+            endpoints[event['Device']] = state
 
-    def initiate_endpoints(self, events):
+        with session_scope():
+            endpoints_cached = {
+                endpoint.name: endpoint.state for endpoint in self._dao.endpoint.list_()
+            }
+            line_endpoints = set(line.endpoint_name for line in self._dao.line.list_())
+
+            # Endpoints of disconnected SCCP devices are not listed but still used
+            endpoints_expired = set(endpoints_cached) - set(endpoints)
+            endpoints_unused = endpoints_expired - line_endpoints
+            logger.debug('Delete %s endpoints', len(endpoints_unused))
+            self._dao.endpoint.bulk_delete(endpoints_unused)
+
+            for name in endpoints_expired & line_endpoints:
+                endpoints[name] = 'unavailable'
+
+            endpoints_missing = [
+                {'name': name, 'state': state}
+                for name, state in endpoints.items()
+                if name not in endpoints_cached
+            ]
+            logger.debug('Create %s endpoints', len(endpoints_missing))
+            self._dao.endpoint.bulk_create(endpoints_missing)
+
+            endpoints_changed = [
+                {'name': name, 'state': state}
+                for name, state in endpoints.items()
+                if name in endpoints_cached and endpoints_cached[name] != state
+            ]
+            logger.debug('Update %s endpoints', len(endpoints_changed))
+            self._dao.endpoint.bulk_update(endpoints_changed)
+
+    def _reset_endpoints(self, events):
         with session_scope():
             logger.debug('Delete all endpoints')
             self._dao.endpoint.delete_all()
@@ -394,6 +492,70 @@ class Initiator:
                 self._dao.endpoint.create(Endpoint(**endpoint_args))
 
     def initiate_channels(self, events):
+        if self._sync_mode == 'full':
+            return self._reset_channels(events)
+
+        with session_scope():
+            lines = {
+                line.endpoint_name: line.id
+                for line in self._dao.line.list_()
+                if line.endpoint_name
+            }
+            channels = {}
+            for event in events:
+                if event.get('Event') != 'CoreShowChannel':
+                    continue
+
+                channel_name = event['Channel']
+                endpoint_name = extract_endpoint_from_channel(channel_name)
+                line_id = lines.get(endpoint_name)
+                if not line_id:
+                    logger.debug(
+                        'Unknown line with endpoint "%s" for channel "%s"',
+                        endpoint_name,
+                        channel_name,
+                    )
+                    continue
+
+                state = CHANNEL_STATE_MAP.get(event['ChannelStateDesc'], 'undefined')
+                if event['ChanVariable'].get('XIVO_ON_HOLD') == '1':
+                    state = 'holding'
+                channels[channel_name] = {
+                    'name': channel_name,
+                    'state': state,
+                    'line_id': line_id,
+                }
+
+            channels_cached = {
+                channel.name: {
+                    'name': channel.name,
+                    'state': channel.state,
+                    'line_id': channel.line_id,
+                }
+                for channel in self._dao.channel.list_()
+            }
+
+            channels_expired = set(channels_cached) - set(channels)
+            logger.debug('Delete %s channels', len(channels_expired))
+            self._dao.channel.bulk_delete(channels_expired)
+
+            channels_missing = [
+                channel
+                for name, channel in channels.items()
+                if name not in channels_cached
+            ]
+            logger.debug('Create %s channels', len(channels_missing))
+            self._dao.channel.bulk_create(channels_missing)
+
+            channels_changed = [
+                channel
+                for name, channel in channels.items()
+                if name in channels_cached and channels_cached[name] != channel
+            ]
+            logger.debug('Update %s channels', len(channels_changed))
+            self._dao.channel.bulk_update(channels_changed)
+
+    def _reset_channels(self, events):
         with session_scope():
             logger.debug('Delete all channels')
             self._dao.channel.delete_all()
@@ -427,3 +589,14 @@ class Initiator:
                 )
                 channel = Channel(**channel_args)
                 self._dao.line.add_channel(line, channel)
+
+
+def _is_mobile(session):
+    return session.get('mobile', False)
+
+
+def _group_by_mobile(items):
+    groups = {True: [], False: []}
+    for key, item in items.items():
+        groups[_is_mobile(item)].append(key)
+    return groups
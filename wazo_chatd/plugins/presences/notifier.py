@@ -1,16 +1,85 @@
 # Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import json
+import threading
+
+from functools import partial
+
 from xivo_bus.resources.chatd.events import PresenceUpdatedEvent
 
-from .schemas import UserPresenceSchema
+from .schemas import dump_user_presence
 
 
-class PresenceNotifier:
+class PresencePublisher:
+    """Publish the presence events, skipping the ones identical to the previous
+
+    A fingerprint of the last payload published is kept for each user, until the
+    user is deleted. It is forgotten when the bus publish queue drops the event or
+    fails to publish it, so that the next identical payload is published.
+    """
+
     def __init__(self, bus):
         self._bus = bus
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+        self._published = 0
+        self._duplicates = 0
+
+    def publish(self, tenant_uuid, payload):
+        fingerprint = _fingerprint(payload)
+        user_uuid = str(payload['uuid'])
+        with self._lock:
+            if self._fingerprints.get(user_uuid) == fingerprint:
+                self._duplicates += 1
+                return
+            self._fingerprints[user_uuid] = fingerprint
+            self._published += 1
+
+        event = PresenceUpdatedEvent(payload, tenant_uuid)
+        self._bus.publish(event, on_error=partial(self._forget, user_uuid, fingerprint))
+
+    def _forget(self, user_uuid, fingerprint):
+        with self._lock:
+            # A newer payload may have been published since
+            if self._fingerprints.get(user_uuid) == fingerprint:
+                del self._fingerprints[user_uuid]
+            self._published -= 1
+
+    def deleted(self, user_uuid):
+        with self._lock:
+            self._fingerprints.pop(str(user_uuid), None)
+
+    def provide_status(self, status):
+        with self._lock:
+            total = self._published + self._duplicates
+            status['presence_notifications']['published'] = self._published
+            status['presence_notifications']['duplicates'] = self._duplicates
+            status['presence_notifications']['duplicate_rate'] = (
+                self._duplicates / total if total else 0.0
+            )
+
+
+def _fingerprint(payload):
+    document = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.blake2b(document.encode(), digest_size=16).digest()
+
+
+class PresenceNotifier:
+    def __init__(self, publisher, coalescer=None):
+        self._publisher = publisher
+        self._coalescer = coalescer
 
     def updated(self, user):
-        payload = UserPresenceSchema().dump(user)
-        event = PresenceUpdatedEvent(payload, user.tenant_uuid)
-        self._bus.publish(event)
+        payload = dump_user_presence(user)
+        # The coalescer only runs in the master process, not in the HTTP workers
+        if self._coalescer and self._coalescer.is_started():
+            self._coalescer.submit(user.uuid, user.tenant_uuid, payload)
+        else:
+            self._publisher.publish(user.tenant_uuid, payload)
+
+    def deleted(self, user_uuid):
+        if self._coalescer:
+            self._coalescer.discard(user_uuid)
+        self._publisher.deleted(user_uuid)
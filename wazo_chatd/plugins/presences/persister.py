@@ -0,0 +1,60 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class PresencePersister:
+    """Apply database writes asynchronously, in submission order
+
+    Operations are callables managing their own database session. They are executed
+    one at a time by a dedicated thread so that the callers (bus consumer, REST API)
+    never wait on PostgreSQL.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            raise Exception('Presence persister already started')
+
+        self._thread = threading.Thread(target=self._run, name='presence_persister')
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        logger.debug('joining presence persister thread...')
+        self._thread.join()
+
+    def submit(self, operation, *args, **kwargs):
+        self._queue.put((operation, args, kwargs))
+
+    def flush(self):
+        done = threading.Event()
+        self.submit(done.set)
+        done.wait()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            operation, args, kwargs = item
+            try:
+                operation(*args, **kwargs)
+            except Exception:
+                logger.exception('Presence persistence failed: %s', operation)
@@ -1,18 +1,30 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
 
+from functools import partial
+
 from wazo_amid_client import Client as AmidClient
 from wazo_auth_client import Client as AuthClient
 from wazo_confd_client import Client as ConfdClient
 
-from .bus_consume import BusEventHandler
+from wazo_chatd.plugin_helpers.tenant import tenant_hierarchy
+
+from .bus_consume import (
+    BusEventHandler,
+    EndpointOwners,
+    StoreBusEventHandler,
+    TenantHierarchyEventHandler,
+)
+from .coalescer import PresenceCoalescer
 from .http import PresenceListResource, PresenceItemResource
-from .notifier import PresenceNotifier
+from .notifier import PresenceNotifier, PresencePublisher
+from .persister import PresencePersister
 from .services import PresenceService
 from .initiator import Initiator
 from .initiator_thread import InitiatorThread
+from .store import PresenceStore
 from .validator import status_validator
 
 logger = logging.getLogger(__name__)
@@ -23,28 +35,89 @@ class Plugin:
         api = dependencies['api']
         config = dependencies['config']
         dao = dependencies['dao']
-        bus_consumer = dependencies['bus_consumer']
+        bus_dispatcher = dependencies['bus_dispatcher']
         bus_publisher = dependencies['bus_publisher']
         status_aggregator = dependencies['status_aggregator']
-        status_validator.set_config(status_aggregator, config)
+        shared_status = dependencies['shared_status']
 
-        notifier = PresenceNotifier(bus_publisher)
-        service = PresenceService(dao, notifier)
+        thread_manager = dependencies['thread_manager']
         initialization = config['initialization']
 
+        store = persister = None
+        if config['presence_store']['enabled']:
+            if config['rest_api']['workers'] > 1:
+                logger.warning(
+                    'Presence store is not shared by HTTP workers, ignoring it'
+                )
+            elif initialization['enabled']:
+                store = PresenceStore()
+                persister = PresencePersister()
+            else:
+                logger.warning('Presence store requires initialization, ignoring it')
+
+        publisher = PresencePublisher(bus_publisher)
+        status_aggregator.add_provider(publisher.provide_status)
+
+        coalescer = None
+        notifications = config['presence_notifications']
+        if notifications['coalesce_window']:
+            coalescer = PresenceCoalescer(
+                publisher.publish,
+                notifications['coalesce_window'],
+                notifications['max_latency'],
+            )
+            status_aggregator.add_provider(coalescer.provide_status)
+
+        notifier = PresenceNotifier(publisher, coalescer)
+        service = PresenceService(dao, notifier, store, persister)
+
         auth = AuthClient(**config['auth'])
         amid = AmidClient(**config['amid'])
         confd = ConfdClient(**config['confd'])
-        initiator = Initiator(dao, auth, amid, confd)
+        endpoint_owners = EndpointOwners()
+        initiator = Initiator(
+            dao,
+            auth,
+            amid,
+            confd,
+            store,
+            persister,
+            confd_page_size=initialization['confd_page_size'],
+            sync_mode=initialization['sync_mode'],
+            tenant_hierarchy=tenant_hierarchy,
+            endpoint_owners=endpoint_owners,
+        )
         status_aggregator.add_provider(initiator.provide_status)
+        if shared_status:
+            # The HTTP workers only know the readiness of the master initiator
+            is_initialized = partial(shared_status.is_ok, 'presence_initialization')
+        else:
+            is_initialized = initiator.is_initialized
+        status_validator.set_config(config, is_initialized)
 
         if initialization['enabled']:
-            thread_manager = dependencies['thread_manager']
             initiator_thread = InitiatorThread(initiator)
             thread_manager.manage(initiator_thread)
+            # Only loaded by the initiator, in the process consuming the bus
+            dependencies['token_changed_subscribe'](auth.set_token)
+            TenantHierarchyEventHandler(tenant_hierarchy, auth).subscribe(
+                bus_dispatcher
+            )
+
+        if persister:
+            # Stopped after the initiator, which may be waiting on pending writes
+            thread_manager.manage(persister)
+
+        if coalescer:
+            thread_manager.manage(coalescer)
 
-        bus_event_handler = BusEventHandler(dao, notifier)
-        bus_event_handler.subscribe(bus_consumer)
+        if store:
+            bus_event_handler = StoreBusEventHandler(
+                dao, notifier, store, persister, endpoint_owners
+            )
+        else:
+            bus_event_handler = BusEventHandler(dao, notifier, endpoint_owners)
+        bus_event_handler.subscribe(bus_dispatcher)
 
         api.add_resource(
             PresenceListResource, '/users/presences', resource_class_args=[service]
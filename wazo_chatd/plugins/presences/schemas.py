@@ -1,6 +1,9 @@
-# Copyright 2019-2021 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import functools
+import uuid
+
 from marshmallow import post_dump, pre_load
 
 from xivo.mallow import fields
@@ -9,6 +12,9 @@ from xivo.mallow_helpers import Schema
 
 
 class LinePresenceSchema(Schema):
+    class Meta(Schema.Meta):
+        ordered = True
+
     id = fields.Integer(dump_only=True)
     state = fields.String(dump_only=True)
 
@@ -30,6 +36,9 @@ class LinePresenceSchema(Schema):
 
 
 class UserPresenceSchema(Schema):
+    class Meta(Schema.Meta):
+        ordered = True
+
     uuid = fields.UUID(dump_only=True)
     tenant_uuid = fields.UUID(dump_only=True)
 
@@ -45,8 +54,14 @@ class UserPresenceSchema(Schema):
 
     lines = fields.Nested('LinePresenceSchema', many=True, dump_only=True)
 
-    @post_dump
-    def _set_line_state(self, user, **kwargs):
+    @post_dump(pass_original=True)
+    def _set_computed_fields(self, user, raw_user, **kwargs):
+        # A single hook keeps the keys in a stable order
+        user = self._set_line_state(user)
+        user = self._set_mobile(user, raw_user)
+        return self._set_connected(user, raw_user)
+
+    def _set_line_state(self, user):
         line_states = [line['state'] for line in user['lines']]
 
         if 'ringing' in line_states:
@@ -65,8 +80,7 @@ class UserPresenceSchema(Schema):
         user['line_state'] = merged_state
         return user
 
-    @post_dump(pass_original=True)
-    def _set_mobile(self, user, raw_user, **kwargs):
+    def _set_mobile(self, user, raw_user):
         for token in raw_user.refresh_tokens:
             if token.mobile is True:
                 user['mobile'] = True
@@ -80,12 +94,68 @@ class UserPresenceSchema(Schema):
         user['mobile'] = False
         return user
 
-    @post_dump(pass_original=True)
-    def _set_connected(self, user, raw_user, **kwargs):
+    def _set_connected(self, user, raw_user):
         user['connected'] = True if raw_user.sessions else False
         return user
 
 
+# Fast path producing the same document as UserPresenceSchema().dump(), in the
+# same key order. Keep both in sync, test_schemas compares their outputs
+_CHANNEL_STATES = ('ringing', 'progressing', 'holding', 'talking')
+_LINE_STATES = _CHANNEL_STATES + ('available',)
+
+
+def dump_user_presence(user):
+    lines = [{'id': line.id, 'state': _line_state(line)} for line in user.lines]
+    line_states = {line['state'] for line in lines}
+    sessions = user.sessions
+    last_activity = user.last_activity
+    do_not_disturb = user.do_not_disturb
+    return {
+        'uuid': _dump_uuid(user.uuid),
+        'tenant_uuid': _dump_uuid(user.tenant_uuid),
+        'state': _dump_string(user.state),
+        'status': _dump_string(user.status),
+        'last_activity': last_activity.isoformat() if last_activity else None,
+        'do_not_disturb': None if do_not_disturb is None else bool(do_not_disturb),
+        'lines': lines,
+        'line_state': next(
+            (state for state in _LINE_STATES if state in line_states), 'unavailable'
+        ),
+        'mobile': any(token.mobile is True for token in user.refresh_tokens)
+        or any(session.mobile is True for session in sessions),
+        'connected': True if sessions else False,
+    }
+
+
+def dump_user_presences(users):
+    return [dump_user_presence(user) for user in users]
+
+
+def _line_state(line):
+    channels_state = set(line.channels_state)
+    for state in _CHANNEL_STATES:
+        if state in channels_state:
+            return state
+    return line.endpoint_state or 'unavailable'
+
+
+def _dump_uuid(value):
+    if value is None or isinstance(value, uuid.UUID):
+        return None if value is None else str(value)
+    return _normalize_uuid(value)
+
+
+# The store keeps the UUIDs as strings, parsing them dominated the dump
+@functools.lru_cache(maxsize=65536)
+def _normalize_uuid(value):
+    return str(uuid.UUID(value))
+
+
+def _dump_string(value):
+    return None if value is None else str(value)
+
+
 class ListRequestSchema(Schema):
 
     recurse = fields.Boolean(missing=False)
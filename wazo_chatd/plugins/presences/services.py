@@ -1,25 +1,78 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import datetime
 
+from wazo_chatd.database.helpers import session_scope
+from wazo_chatd.exceptions import UnknownUserException
+from wazo_chatd.plugin_helpers.http import update_model_instance
+
 
 class PresenceService:
-    def __init__(self, dao, notifier):
+    def __init__(self, dao, notifier, store=None, persister=None):
         self._dao = dao
         self._notifier = notifier
+        self._store = store
+        self._persister = persister
+
+    def _use_store(self):
+        return self._store is not None and self._store.is_loaded()
 
     def list_(self, tenant_uuids, **filter_parameters):
-        return self._dao.user.list_(tenant_uuids, **filter_parameters)
+        if self._use_store():
+            # The bus events keep modifying the users once the lock is released
+            with self._store.lock:
+                users = self._store.list_users(tenant_uuids, **filter_parameters)
+                return [user.copy() for user in users]
+        return self._dao.user.list_(
+            tenant_uuids, load_presence=True, **filter_parameters
+        )
 
     def count(self, tenant_uuids, **filter_parameters):
+        if self._use_store():
+            with self._store.lock:
+                return self._store.count_users(tenant_uuids, **filter_parameters)
         return self._dao.user.count(tenant_uuids, **filter_parameters)
 
     def get(self, tenant_uuids, user_uuid):
-        return self._dao.user.get(tenant_uuids, user_uuid)
+        if self._use_store():
+            with self._store.lock:
+                user = self._store.get_user(tenant_uuids, user_uuid)
+                if not user:
+                    raise UnknownUserException(user_uuid)
+                return user.copy()
+        return self._dao.user.get(tenant_uuids, user_uuid, load_presence=True)
 
-    def update(self, user):
+    def update(self, user, presence):
+        if self._use_store():
+            user_uuid = user.uuid
+            with self._store.lock:
+                # The user may be a copy, the presence is applied to the stored one
+                user = self._store.get_user(None, user_uuid)
+                if not user:
+                    raise UnknownUserException(user_uuid)
+                update_model_instance(user, presence)
+                user.last_activity = datetime.datetime.utcnow()
+                self._persister.submit(
+                    self._update_user,
+                    user.tenant_uuid,
+                    user.uuid,
+                    state=user.state,
+                    status=user.status,
+                    last_activity=user.last_activity,
+                )
+                self._notifier.updated(user)
+                return user.copy()
+
+        update_model_instance(user, presence)
         user.last_activity = datetime.datetime.utcnow()
         self._dao.user.update(user)
         self._notifier.updated(user)
         return user
+
+    def _update_user(self, tenant_uuid, user_uuid, **attributes):
+        with session_scope():
+            user = self._dao.user.get([tenant_uuid], user_uuid)
+            for name, value in attributes.items():
+                setattr(user, name, value)
+            self._dao.user.update(user)
@@ -0,0 +1,370 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StoreEndpoint:
+    __slots__ = ('name', 'state')
+
+    def __init__(self, name, state='unavailable'):
+        self.name = name
+        self.state = state
+
+
+class StoreChannel:
+    __slots__ = ('name', 'state', 'line')
+
+    def __init__(self, name, state, line):
+        self.name = name
+        self.state = state
+        self.line = line
+
+
+class StoreLine:
+    __slots__ = ('id', 'user', 'endpoint', 'channels')
+
+    def __init__(self, id_, user, endpoint=None):
+        self.id = id_
+        self.user = user
+        self.endpoint = endpoint
+        self.channels = {}
+
+    @property
+    def endpoint_name(self):
+        return self.endpoint.name if self.endpoint else None
+
+    @property
+    def endpoint_state(self):
+        return self.endpoint.state if self.endpoint else None
+
+    @property
+    def channels_state(self):
+        return [channel.state for channel in list(self.channels.values())]
+
+
+class StoreSession:
+    __slots__ = ('uuid', 'mobile')
+
+    def __init__(self, uuid, mobile):
+        self.uuid = uuid
+        self.mobile = mobile
+
+
+class StoreRefreshToken:
+    __slots__ = ('client_id', 'mobile')
+
+    def __init__(self, client_id, mobile):
+        self.client_id = client_id
+        self.mobile = mobile
+
+
+class StoreUser:
+    __slots__ = (
+        'uuid',
+        'tenant_uuid',
+        'state',
+        'status',
+        'do_not_disturb',
+        'last_activity',
+        '_lines',
+        '_sessions',
+        '_refresh_tokens',
+    )
+
+    def __init__(
+        self,
+        uuid,
+        tenant_uuid,
+        state='unavailable',
+        status=None,
+        do_not_disturb=False,
+        last_activity=None,
+    ):
+        self.uuid = uuid
+        self.tenant_uuid = tenant_uuid
+        self.state = state
+        self.status = status
+        self.do_not_disturb = do_not_disturb
+        self.last_activity = last_activity
+        self._lines = {}
+        self._sessions = {}
+        self._refresh_tokens = {}
+
+    @property
+    def lines(self):
+        return list(self._lines.values())
+
+    @property
+    def sessions(self):
+        return list(self._sessions.values())
+
+    @property
+    def refresh_tokens(self):
+        return list(self._refresh_tokens.values())
+
+    def copy(self):
+        """Detached copy of the user, to read it once the store lock is released"""
+        user = StoreUser(
+            self.uuid,
+            self.tenant_uuid,
+            state=self.state,
+            status=self.status,
+            do_not_disturb=self.do_not_disturb,
+            last_activity=self.last_activity,
+        )
+        for line_id, line in self._lines.items():
+            endpoint = line.endpoint
+            if endpoint:
+                endpoint = StoreEndpoint(endpoint.name, endpoint.state)
+            user._lines[line_id] = copy = StoreLine(line_id, user, endpoint)
+            copy.channels = {
+                name: StoreChannel(name, channel.state, copy)
+                for name, channel in line.channels.items()
+            }
+        # Sessions and refresh tokens are never modified, only added or removed
+        user._sessions = dict(self._sessions)
+        user._refresh_tokens = dict(self._refresh_tokens)
+        return user
+
+
+class PresenceStore:
+    """Authoritative in-memory view of the presences
+
+    Every mutation is O(1) thanks to the secondary indexes on lines, endpoints and
+    channels. Callers must hold `lock` while reading or mutating the store. The
+    methods handling an event return the user whose presence changed, or None.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._loaded = False
+        self._users = {}
+        self._lines = {}
+        self._lines_by_endpoint = {}
+        self._endpoints = {}
+        self._channels = {}
+
+    def is_loaded(self):
+        return self._loaded
+
+    def load(self, users, endpoints):
+        with self.lock:
+            self._clear()
+            for endpoint in endpoints:
+                self._endpoints[endpoint.name] = StoreEndpoint(
+                    endpoint.name, endpoint.state
+                )
+
+            for user in users:
+                store_user = self._add_user(
+                    str(user.uuid),
+                    str(user.tenant_uuid),
+                    state=user.state,
+                    status=user.status,
+                    do_not_disturb=user.do_not_disturb,
+                    last_activity=user.last_activity,
+                )
+                for session in user.sessions:
+                    self._add_session(store_user, str(session.uuid), session.mobile)
+                for token in user.refresh_tokens:
+                    self._add_refresh_token(store_user, token.client_id, token.mobile)
+                for line in user.lines:
+                    store_line = self._associate_line(
+                        store_user, line.id, line.endpoint_name
+                    )
+                    for channel in line.channels:
+                        self._add_channel(store_line, channel.name, channel.state)
+
+            self._loaded = True
+        logger.debug(
+            'Presence store loaded: %s users, %s lines, %s channels',
+            len(self._users),
+            len(self._lines),
+            len(self._channels),
+        )
+
+    def _clear(self):
+        self._users.clear()
+        self._lines.clear()
+        self._lines_by_endpoint.clear()
+        self._endpoints.clear()
+        self._channels.clear()
+
+    def get_user(self, tenant_uuids, user_uuid):
+        user = self._users.get(str(user_uuid))
+        if not user:
+            return None
+        if tenant_uuids is not None and user.tenant_uuid not in _to_str(tenant_uuids):
+            return None
+        return user
+
+    def list_users(self, tenant_uuids, uuids=None):
+        if tenant_uuids is not None:
+            tenant_uuids = _to_str(tenant_uuids)
+
+        if uuids:
+            users = (self._users.get(uuid) for uuid in _to_str(uuids))
+            users = [user for user in users if user]
+        else:
+            users = self._users.values()
+
+        if tenant_uuids is None:
+            return list(users)
+        return [user for user in users if user.tenant_uuid in tenant_uuids]
+
+    def count_users(self, tenant_uuids, uuids=None):
+        return len(self.list_users(tenant_uuids, uuids=uuids))
+
+    def add_user(self, user_uuid, tenant_uuid):
+        return self._add_user(str(user_uuid), str(tenant_uuid))
+
+    def _add_user(self, user_uuid, tenant_uuid, **kwargs):
+        user = StoreUser(user_uuid, tenant_uuid, **kwargs)
+        self._users[user_uuid] = user
+        return user
+
+    def update_user(self, user_uuid, **kwargs):
+        user = self._users.get(str(user_uuid))
+        if not user:
+            return None
+        for name, value in kwargs.items():
+            setattr(user, name, value)
+        return user
+
+    def remove_user(self, user_uuid):
+        user = self._users.pop(str(user_uuid), None)
+        if not user:
+            return None
+        for line in user.lines:
+            self._remove_line(line)
+        return user
+
+    def remove_tenant(self, tenant_uuid):
+        tenant_uuid = str(tenant_uuid)
+        users = [
+            user for user in self._users.values() if user.tenant_uuid == tenant_uuid
+        ]
+        for user in users:
+            self.remove_user(user.uuid)
+
+    def add_session(self, user_uuid, session_uuid, mobile):
+        user = self._users.get(str(user_uuid))
+        if not user:
+            return None
+        self._add_session(user, str(session_uuid), mobile)
+        return user
+
+    def _add_session(self, user, session_uuid, mobile):
+        user._sessions[session_uuid] = StoreSession(session_uuid, mobile)
+
+    def remove_session(self, user_uuid, session_uuid):
+        user = self._users.get(str(user_uuid))
+        if not user or not user._sessions.pop(str(session_uuid), None):
+            return None
+        return user
+
+    def add_refresh_token(self, user_uuid, client_id, mobile):
+        user = self._users.get(str(user_uuid))
+        if not user:
+            return None
+        self._add_refresh_token(user, client_id, mobile)
+        return user
+
+    def _add_refresh_token(self, user, client_id, mobile):
+        user._refresh_tokens[client_id] = StoreRefreshToken(client_id, mobile)
+
+    def remove_refresh_token(self, user_uuid, client_id):
+        user = self._users.get(str(user_uuid))
+        if not user or not user._refresh_tokens.pop(client_id, None):
+            return None
+        return user
+
+    def associate_line(self, user_uuid, line_id, endpoint_name=None):
+        user = self._users.get(str(user_uuid))
+        if not user:
+            return None
+        self._associate_line(user, line_id, endpoint_name)
+        return user
+
+    def _associate_line(self, user, line_id, endpoint_name):
+        line = self._lines.get(line_id)
+        if not line:
+            line = self._lines[line_id] = StoreLine(line_id, user)
+        elif line.user is not user:
+            line.user._lines.pop(line_id, None)
+            line.user = user
+        user._lines[line_id] = line
+
+        if endpoint_name and line.endpoint_name != endpoint_name:
+            if self._lines_by_endpoint.get(line.endpoint_name) is line:
+                del self._lines_by_endpoint[line.endpoint_name]
+            line.endpoint = self._find_or_create_endpoint(endpoint_name)
+            self._lines_by_endpoint[endpoint_name] = line
+        return line
+
+    def dissociate_line(self, user_uuid, line_id):
+        user = self._users.get(str(user_uuid))
+        if not user:
+            return None
+        line = user._lines.get(line_id)
+        if not line:
+            return None
+        self._remove_line(line)
+        return user
+
+    def _remove_line(self, line):
+        line.user._lines.pop(line.id, None)
+        self._lines.pop(line.id, None)
+        if self._lines_by_endpoint.get(line.endpoint_name) is line:
+            del self._lines_by_endpoint[line.endpoint_name]
+        for name in line.channels:
+            self._channels.pop(name, None)
+
+    def _find_or_create_endpoint(self, endpoint_name):
+        endpoint = self._endpoints.get(endpoint_name)
+        if not endpoint:
+            endpoint = self._endpoints[endpoint_name] = StoreEndpoint(endpoint_name)
+        return endpoint
+
+    def update_endpoint_state(self, endpoint_name, state):
+        endpoint = self._find_or_create_endpoint(endpoint_name)
+        if endpoint.state == state:
+            return None
+
+        endpoint.state = state
+        line = self._lines_by_endpoint.get(endpoint_name)
+        return line.user if line else None
+
+    def add_channel(self, endpoint_name, channel_name, state):
+        line = self._lines_by_endpoint.get(endpoint_name)
+        if not line:
+            return None
+        self._add_channel(line, channel_name, state)
+        return line.user
+
+    def _add_channel(self, line, channel_name, state):
+        channel = StoreChannel(channel_name, state, line)
+        line.channels[channel_name] = channel
+        self._channels[channel_name] = channel
+
+    def update_channel_state(self, channel_name, state):
+        channel = self._channels.get(channel_name)
+        if not channel:
+            return None
+        channel.state = state
+        return channel.line.user
+
+    def remove_channel(self, channel_name):
+        channel = self._channels.pop(channel_name, None)
+        if not channel:
+            return None
+        channel.line.channels.pop(channel_name, None)
+        return channel.line.user
+
+
+def _to_str(uuids):
+    return {str(uuid) for uuid in uuids}
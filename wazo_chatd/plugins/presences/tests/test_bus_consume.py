@@ -0,0 +1,180 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+import time
+import unittest
+import uuid
+
+from unittest.mock import Mock
+
+from hamcrest import assert_that, contains, contains_inanyorder, equal_to, none
+
+from wazo_chatd.bus import BusEventDispatcher
+from wazo_chatd.plugin_helpers.tenant import TenantHierarchy
+
+from ..bus_consume import (
+    FALLBACK_KEY,
+    BusEventHandler,
+    EndpointOwners,
+    TenantHierarchyEventHandler,
+)
+
+USER_UUID_1 = str(uuid.uuid4())
+LINE = {'id': 1, 'name': 'abcd', 'endpoint_sip': {'uuid': 'sip'}}
+
+
+class FakeConsumer:
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, event_name, handler):
+        self._handlers[event_name] = handler
+
+    def consume(self, event_name, event):
+        self._handlers[event_name](event)
+
+
+class TestEndpointOwners(unittest.TestCase):
+    def setUp(self):
+        self.owners = EndpointOwners()
+
+    def test_fallback_until_loaded(self):
+        user_key = self.owners.user_key('user_uuid')
+
+        assert_that(user_key({'user_uuid': USER_UUID_1}), equal_to(FALLBACK_KEY))
+        assert_that(
+            self.owners.device_key({'Device': 'PJSIP/abcd'}), equal_to(FALLBACK_KEY)
+        )
+
+    def test_endpoint_events_keyed_on_their_user(self):
+        self.owners.load({'PJSIP/abcd': USER_UUID_1})
+
+        assert_that(
+            self.owners.device_key({'Device': 'PJSIP/abcd'}), equal_to(USER_UUID_1)
+        )
+        assert_that(
+            self.owners.channel_key({'Channel': 'PJSIP/abcd-00000001'}),
+            equal_to(USER_UUID_1),
+        )
+        assert_that(
+            self.owners.device_key({'Device': 'PJSIP/unknown'}),
+            equal_to(FALLBACK_KEY),
+        )
+
+    def test_line_events(self):
+        self.owners.load({})
+        event = {'user': {'uuid': USER_UUID_1}, 'line': LINE}
+
+        key = self.owners.line_associated_key(event)
+
+        assert_that(key, equal_to(USER_UUID_1))
+        assert_that(
+            self.owners.device_key({'Device': 'PJSIP/abcd'}), equal_to(USER_UUID_1)
+        )
+
+        key = self.owners.line_dissociated_key(event)
+
+        assert_that(key, equal_to(USER_UUID_1))
+        assert_that(
+            self.owners.device_key({'Device': 'PJSIP/abcd'}), equal_to(FALLBACK_KEY)
+        )
+
+    def test_load_keeps_dispatched_line_events(self):
+        other_user_uuid = str(uuid.uuid4())
+        self.owners.line_associated_key({'user': {'uuid': USER_UUID_1}, 'line': LINE})
+
+        self.owners.load({'PJSIP/abcd': other_user_uuid})
+
+        assert_that(
+            self.owners.device_key({'Device': 'PJSIP/abcd'}), equal_to(USER_UUID_1)
+        )
+
+
+class TestBusEventHandler(unittest.TestCase):
+    def test_events_of_users_concurrent_and_in_order(self):
+        user_1, user_2 = _users_of_different_partitions(workers=2)
+        owners = EndpointOwners()
+        owners.load({'PJSIP/one': user_1, 'PJSIP/two': user_2})
+        handler = BusEventHandler(Mock(), Mock(), owners)
+        handled, release = [], threading.Event()
+        self.addCleanup(release.set)
+
+        def device_state_change(event):
+            if event['State'] == 'RINGING':
+                release.wait()
+            handled.append(event['Device'])
+
+        handler._device_state_change = device_state_change
+        handler._user_dnd_updated = lambda event: handled.append(event['user_uuid'])
+        consumer = FakeConsumer()
+        dispatcher = BusEventDispatcher(consumer, workers=2)
+        handler.subscribe(dispatcher)
+
+        with dispatcher:
+            consumer.consume(
+                'DeviceStateChange', {'Device': 'PJSIP/one', 'State': 'RINGING'}
+            )
+            consumer.consume('users_services_dnd_updated', {'user_uuid': user_1})
+            consumer.consume(
+                'DeviceStateChange', {'Device': 'PJSIP/two', 'State': 'INUSE'}
+            )
+            _wait_for(lambda: handled)
+            assert_that(handled, contains('PJSIP/two'))
+            release.set()
+
+        assert_that(handled, contains('PJSIP/two', 'PJSIP/one', user_1))
+
+
+def _users_of_different_partitions(workers):
+    user_1 = str(uuid.uuid4())
+    while True:
+        user_2 = str(uuid.uuid4())
+        if hash(user_1) % workers != hash(user_2) % workers:
+            return user_1, user_2
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class TestTenantHierarchyEventHandler(unittest.TestCase):
+    def setUp(self):
+        self.auth = Mock()
+        self.hierarchy = TenantHierarchy()
+        self.hierarchy.load([{'uuid': 'top', 'parent_uuid': 'top'}])
+        self.handler = TenantHierarchyEventHandler(self.hierarchy, self.auth)
+
+    def test_tenant_created(self):
+        self.handler._tenant_created({'uuid': 'new', 'parent_uuid': 'top'})
+
+        assert_that(
+            self.hierarchy.descendants('top'), contains_inanyorder('top', 'new')
+        )
+        self.auth.tenants.get.assert_not_called()
+
+    def test_tenant_created_without_parent(self):
+        self.auth.tenants.get.return_value = {'uuid': 'new', 'parent_uuid': 'top'}
+
+        self.handler._tenant_created({'uuid': 'new', 'name': 'new'})
+
+        assert_that(
+            self.hierarchy.descendants('top'), contains_inanyorder('top', 'new')
+        )
+        self.auth.tenants.get.assert_called_once_with('new')
+
+    def test_tenant_created_unknown_parent(self):
+        self.auth.tenants.get.side_effect = Exception('wazo-auth unreachable')
+
+        self.handler._tenant_created({'uuid': 'new', 'name': 'new'})
+
+        assert_that(self.hierarchy.descendants('top'), none())
+
+    def test_tenant_deleted(self):
+        self.handler._tenant_created({'uuid': 'new', 'parent_uuid': 'top'})
+
+        self.handler._tenant_deleted({'uuid': 'new', 'name': 'new'})
+
+        assert_that(self.hierarchy.descendants('top'), contains_inanyorder('top'))
@@ -0,0 +1,97 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import uuid
+import unittest
+
+from collections import defaultdict
+from unittest.mock import Mock, call, patch
+
+from hamcrest import assert_that, contains, empty, equal_to, has_entries
+
+from ..coalescer import PresenceCoalescer
+
+TENANT_UUID = str(uuid.uuid4())
+USER_UUID_1 = str(uuid.uuid4())
+USER_UUID_2 = str(uuid.uuid4())
+
+
+@patch('wazo_chatd.plugins.presences.coalescer.time.monotonic')
+class TestPresenceCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.publish = Mock()
+        self.coalescer = PresenceCoalescer(self.publish, window=0.1, max_latency=1)
+
+    def publish_due(self, now):
+        due, timeout = self.coalescer._pop_due(now)
+        self.coalescer._publish_all(due)
+        return timeout
+
+    def test_burst_is_merged(self, monotonic):
+        for now, state in ((0, 'ringing'), (0.05, 'talking'), (0.1, 'holding')):
+            monotonic.return_value = now
+            self.coalescer.submit(USER_UUID_1, TENANT_UUID, {'state': state})
+
+        timeout = self.publish_due(0.15)
+        assert_that(timeout, equal_to(0.2 - 0.15))
+        self.publish.assert_not_called()
+
+        self.publish_due(0.2)
+        self.publish.assert_called_once_with(TENANT_UUID, {'state': 'holding'})
+
+    def test_max_latency(self, monotonic):
+        for i in range(13):
+            monotonic.return_value = now = i * 0.09
+            self.publish_due(now)
+            self.coalescer.submit(USER_UUID_1, TENANT_UUID, {'update': i})
+
+        self.publish.assert_called_once_with(TENANT_UUID, {'update': 11})
+
+    def test_users_are_independent(self, monotonic):
+        monotonic.return_value = 0
+        self.coalescer.submit(USER_UUID_1, TENANT_UUID, {'user': 1})
+        monotonic.return_value = 0.05
+        self.coalescer.submit(USER_UUID_2, TENANT_UUID, {'user': 2})
+
+        self.publish_due(0.12)
+        self.publish_due(0.2)
+
+        assert_that(
+            self.publish.call_args_list,
+            contains(call(TENANT_UUID, {'user': 1}), call(TENANT_UUID, {'user': 2})),
+        )
+
+    def test_discard(self, monotonic):
+        monotonic.return_value = 0
+        self.coalescer.submit(USER_UUID_1, TENANT_UUID, {'user': 1})
+        self.coalescer.submit(USER_UUID_2, TENANT_UUID, {'user': 2})
+
+        self.coalescer.discard(USER_UUID_1)
+        self.publish_due(0.2)
+
+        self.publish.assert_called_once_with(TENANT_UUID, {'user': 2})
+
+    def test_stop_publishes_pending(self, monotonic):
+        monotonic.return_value = 0
+        self.coalescer.submit(USER_UUID_1, TENANT_UUID, {'user': 1})
+
+        self.coalescer._publish_all(self.coalescer._pop_all())
+
+        self.publish.assert_called_once_with(TENANT_UUID, {'user': 1})
+        assert_that(self.coalescer._deadlines, empty())
+
+    def test_provide_status(self, monotonic):
+        monotonic.return_value = 0
+        self.coalescer.submit(USER_UUID_1, TENANT_UUID, {})
+        self.coalescer.submit(USER_UUID_1, TENANT_UUID, {})
+        self.coalescer.submit(USER_UUID_2, TENANT_UUID, {})
+        self.publish_due(0.1)
+        self.coalescer.submit(USER_UUID_1, TENANT_UUID, {})
+
+        status = defaultdict(dict)
+        self.coalescer.provide_status(status)
+
+        assert_that(
+            status['presence_notifications'],
+            has_entries(flushed=2, suppressed=1, pending=1),
+        )
@@ -0,0 +1,242 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from unittest.mock import MagicMock, Mock, call, patch
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_inanyorder,
+    empty,
+    has_entries,
+    has_key,
+    raises,
+)
+
+from ..initiator import Initiator, compact_user
+
+
+def confd_user(uuid):
+    return {
+        'uuid': uuid,
+        'tenant_uuid': 'tenant',
+        'firstname': 'ignored',
+        'lines': [{'id': 1, 'name': 'abcd', 'endpoint_sip': {'id': 2}}],
+        'services': {'dnd': {'enabled': False}, 'incallfilter': {'enabled': True}},
+    }
+
+
+class TestInitiatorFetch(unittest.TestCase):
+    def setUp(self):
+        self.auth = Mock()
+        self.amid = Mock()
+        self.confd = Mock()
+
+    def test_fetch_all_sources(self):
+        self.auth.tenants.list.return_value = {'items': ['tenant']}
+        self.auth.sessions.list.return_value = {'items': ['session']}
+        self.auth.refresh_tokens.list.return_value = {'items': ['token']}
+        self.amid.action.side_effect = lambda action: [action]
+        self.confd.users.list.return_value = {'items': [], 'total': 0}
+        initiator = Initiator(Mock(), self.auth, self.amid, self.confd)
+
+        result = initiator.fetch()
+
+        assert_that(
+            result,
+            has_entries(
+                endpoints=['DeviceStateList'],
+                tenants=['tenant'],
+                users=[],
+                sessions=['session'],
+                refresh_tokens=['token'],
+                channels=['CoreShowChannels'],
+            ),
+        )
+        status = {'presence_initialization': {}}
+        initiator.provide_status(status)
+        assert_that(
+            status['presence_initialization']['fetch_durations'], has_key('users')
+        )
+
+    def test_fetch_users_by_page(self):
+        self.confd.users.list.side_effect = [
+            {'items': [confd_user('1'), confd_user('2')], 'total': 3},
+            {'items': [confd_user('2'), confd_user('3')], 'total': 3},
+        ]
+        initiator = Initiator(
+            Mock(), self.auth, self.amid, self.confd, confd_page_size=2
+        )
+
+        result = initiator._fetch_users()
+
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_entries(uuid='1'), has_entries(uuid='2'), has_entries(uuid='3')
+            ),
+        )
+        assert_that(result[0], has_entries(services={'dnd': {'enabled': False}}))
+        self.confd.users.list.assert_has_calls(
+            [
+                call(recurse=True, order='id', limit=2, offset=0),
+                call(recurse=True, order='id', limit=3, offset=1),
+            ]
+        )
+
+    def test_fetch_users_shifted_between_pages(self):
+        # User 1 is deleted after the first page: user 3 moves to the first page
+        self.confd.users.list.side_effect = [
+            {'items': [confd_user('1'), confd_user('2')], 'total': 4},
+            {'items': [confd_user('3'), confd_user('4')], 'total': 3},
+            {'items': [confd_user('2'), confd_user('3')], 'total': 3},
+            {'items': [confd_user('3'), confd_user('4')], 'total': 3},
+        ]
+        initiator = Initiator(
+            Mock(), self.auth, self.amid, self.confd, confd_page_size=2
+        )
+
+        result = initiator._fetch_users()
+
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_entries(uuid='2'), has_entries(uuid='3'), has_entries(uuid='4')
+            ),
+        )
+
+    def test_fetch_users_always_shifting(self):
+        shifted = [
+            {'items': [confd_user('1'), confd_user('2')], 'total': 4},
+            {'items': [confd_user('4')], 'total': 3},
+        ]
+        self.confd.users.list.side_effect = shifted * 3 + [
+            {'items': [confd_user('2'), confd_user('4')], 'total': 2}
+        ]
+        initiator = Initiator(
+            Mock(), self.auth, self.amid, self.confd, confd_page_size=2
+        )
+
+        result = initiator._fetch_users()
+
+        assert_that(
+            result, contains_inanyorder(has_entries(uuid='2'), has_entries(uuid='4'))
+        )
+        self.confd.users.list.assert_called_with(recurse=True)
+
+
+@patch('wazo_chatd.plugins.presences.initiator.session_scope', MagicMock())
+class TestInitiatorDiffSync(unittest.TestCase):
+    def setUp(self):
+        self.dao = Mock()
+        self.initiator = Initiator(self.dao, Mock(), Mock(), Mock())
+
+    def test_initiate_endpoints(self):
+        self.dao.endpoint.list_.return_value = [
+            Mock(name='unchanged', state='available'),
+            Mock(name='changed', state='available'),
+            Mock(name='expired', state='available'),
+            Mock(name='expired-sccp', state='available'),
+        ]
+        for endpoint, name in zip(
+            self.dao.endpoint.list_.return_value,
+            ('unchanged', 'changed', 'expired', 'expired-sccp'),
+        ):
+            endpoint.name = name
+        self.dao.line.list_.return_value = [Mock(endpoint_name='expired-sccp')]
+        events = [
+            {'Event': 'DeviceStateChange', 'Device': 'unchanged', 'State': 'INUSE'},
+            {'Event': 'DeviceStateChange', 'Device': 'changed', 'State': 'BUSY'},
+            {'Event': 'DeviceStateChange', 'Device': 'new', 'State': 'INUSE'},
+            {'Event': 'DeviceStateListComplete'},
+        ]
+
+        self.initiator.initiate_endpoints(events)
+
+        self.dao.endpoint.bulk_delete.assert_called_once_with({'expired'})
+        self.dao.endpoint.bulk_create.assert_called_once_with(
+            [{'name': 'new', 'state': 'available'}]
+        )
+        (updated,), _ = self.dao.endpoint.bulk_update.call_args
+        assert_that(
+            updated,
+            contains_inanyorder(
+                {'name': 'changed', 'state': 'unavailable'},
+                {'name': 'expired-sccp', 'state': 'unavailable'},
+            ),
+        )
+        self.dao.endpoint.delete_all.assert_not_called()
+
+    def test_initiate_tenants_loads_tenant_hierarchy(self):
+        tenant_hierarchy = Mock()
+        initiator = Initiator(
+            self.dao, Mock(), Mock(), Mock(), tenant_hierarchy=tenant_hierarchy
+        )
+        self.dao.tenant.list_.return_value = []
+        tenants = [{'uuid': 'top', 'parent_uuid': 'top'}]
+
+        initiator.initiate_tenants(tenants)
+
+        tenant_hierarchy.load.assert_called_once_with(tenants)
+        self.dao.tenant.bulk_create.assert_called_once_with({'top'})
+
+    def test_initiate_failure_unloads_tenant_hierarchy(self):
+        tenant_hierarchy = Mock()
+        confd = Mock()
+        confd.users.list.side_effect = Exception('wazo-confd unreachable')
+        initiator = Initiator(
+            self.dao, MagicMock(), Mock(), confd, tenant_hierarchy=tenant_hierarchy
+        )
+
+        assert_that(calling(initiator.initiate), raises(Exception))
+
+        tenant_hierarchy.assert_has_calls([call.start_loading(), call.unload()])
+        tenant_hierarchy.load.assert_not_called()
+
+    def test_initiate_users_loads_endpoint_owners(self):
+        endpoint_owners = Mock()
+        initiator = Initiator(
+            self.dao, Mock(), Mock(), Mock(), endpoint_owners=endpoint_owners
+        )
+        self.dao.user.list_.return_value = []
+        self.dao.line.list_.return_value = []
+        users = [compact_user(confd_user('user'))]
+
+        initiator.initiate_users(users)
+
+        endpoint_owners.load.assert_called_once_with({'PJSIP/abcd': 'user'})
+
+    def test_initiate_channels(self):
+        self.dao.line.list_.return_value = [Mock(id=1, endpoint_name='PJSIP/abc')]
+        self.dao.channel.list_.return_value = [
+            Mock(state='talking', line_id=1),
+            Mock(state='ringing', line_id=1),
+            Mock(state='talking', line_id=1),
+        ]
+        for channel, name in zip(
+            self.dao.channel.list_.return_value,
+            ('PJSIP/abc-1', 'PJSIP/abc-2', 'PJSIP/abc-3'),
+        ):
+            channel.name = name
+        events = [
+            {
+                'Event': 'CoreShowChannel',
+                'Channel': name,
+                'ChannelStateDesc': 'Up',
+                'ChanVariable': {},
+            }
+            for name in ('PJSIP/abc-1', 'PJSIP/abc-2', 'PJSIP/abc-4', 'PJSIP/xyz-1')
+        ]
+
+        self.initiator.initiate_channels(events)
+
+        self.dao.channel.bulk_delete.assert_called_once_with({'PJSIP/abc-3'})
+        self.dao.channel.bulk_create.assert_called_once_with(
+            [{'name': 'PJSIP/abc-4', 'state': 'talking', 'line_id': 1}]
+        )
+        self.dao.channel.bulk_update.assert_called_once_with(
+            [{'name': 'PJSIP/abc-2', 'state': 'talking', 'line_id': 1}]
+        )
+        assert_that(self.dao.channel.delete_all.mock_calls, empty())
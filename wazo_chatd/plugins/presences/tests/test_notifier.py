@@ -0,0 +1,100 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import uuid
+import unittest
+
+from collections import defaultdict
+from unittest.mock import Mock, patch
+
+from hamcrest import assert_that, equal_to, has_entries, has_length
+
+from ..notifier import PresenceNotifier, PresencePublisher
+
+TENANT_UUID = str(uuid.uuid4())
+USER_UUID_1 = str(uuid.uuid4())
+USER_UUID_2 = str(uuid.uuid4())
+
+
+@patch('wazo_chatd.plugins.presences.notifier.PresenceUpdatedEvent', Mock())
+class TestPresencePublisher(unittest.TestCase):
+    def setUp(self):
+        self.bus = Mock()
+        self.publisher = PresencePublisher(self.bus)
+
+    def test_duplicates_are_skipped(self):
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_1, 'state': 'away'})
+        self.publisher.publish(TENANT_UUID, {'state': 'away', 'uuid': USER_UUID_1})
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_2, 'state': 'away'})
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_1, 'state': 'available'})
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_1, 'state': 'away'})
+
+        assert_that(self.bus.publish.call_count, equal_to(4))
+
+        status = defaultdict(dict)
+        self.publisher.provide_status(status)
+        assert_that(
+            status['presence_notifications'],
+            has_entries(published=4, duplicates=1, duplicate_rate=0.2),
+        )
+
+    def test_failed_publish_is_not_remembered(self):
+        payload = {'uuid': USER_UUID_1, 'state': 'away'}
+
+        self.publisher.publish(TENANT_UUID, payload)
+        self.bus.publish.call_args[1]['on_error']()
+        self.publisher.publish(TENANT_UUID, payload)
+
+        assert_that(self.bus.publish.call_count, equal_to(2))
+
+    def test_failed_publish_keeps_newer_payload(self):
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_1, 'state': 'away'})
+        on_error = self.bus.publish.call_args[1]['on_error']
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_1, 'state': 'busy'})
+        on_error()
+        self.publisher.publish(TENANT_UUID, {'uuid': USER_UUID_1, 'state': 'busy'})
+
+        assert_that(self.bus.publish.call_count, equal_to(2))
+
+    def test_deleted_user_is_forgotten(self):
+        payload = {'uuid': USER_UUID_1, 'state': 'away'}
+
+        self.publisher.publish(TENANT_UUID, payload)
+        self.publisher.deleted(USER_UUID_1)
+        self.publisher.publish(TENANT_UUID, payload)
+
+        assert_that(self.bus.publish.call_count, equal_to(2))
+        assert_that(self.publisher._fingerprints, has_length(1))
+
+
+@patch('wazo_chatd.plugins.presences.notifier.dump_user_presence')
+class TestPresenceNotifier(unittest.TestCase):
+    def setUp(self):
+        self.publisher = Mock()
+        self.coalescer = Mock()
+        self.notifier = PresenceNotifier(self.publisher, self.coalescer)
+        self.user = Mock(uuid=USER_UUID_1, tenant_uuid=TENANT_UUID)
+
+    def test_updated_submits_to_started_coalescer(self, dump):
+        self.coalescer.is_started.return_value = True
+
+        self.notifier.updated(self.user)
+
+        self.coalescer.submit.assert_called_once_with(
+            USER_UUID_1, TENANT_UUID, dump.return_value
+        )
+        self.publisher.publish.assert_not_called()
+
+    def test_updated_publishes_when_coalescer_not_started(self, dump):
+        self.coalescer.is_started.return_value = False
+
+        self.notifier.updated(self.user)
+
+        self.publisher.publish.assert_called_once_with(TENANT_UUID, dump.return_value)
+        self.coalescer.submit.assert_not_called()
+
+    def test_deleted(self, dump):
+        self.notifier.deleted(USER_UUID_1)
+
+        self.coalescer.discard.assert_called_once_with(USER_UUID_1)
+        self.publisher.deleted.assert_called_once_with(USER_UUID_1)
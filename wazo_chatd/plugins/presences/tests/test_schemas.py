@@ -1,6 +1,8 @@
 # Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import datetime
+import json
 import uuid
 import unittest
 
@@ -12,11 +14,28 @@ from hamcrest import (
     calling,
     contains,
     empty,
+    equal_to,
     has_entries,
     raises,
 )
 
-from ..schemas import UserPresenceSchema, LinePresenceSchema, ListRequestSchema
+from wazo_chatd.database.models import (
+    Channel,
+    Endpoint,
+    Line,
+    RefreshToken,
+    Session,
+    User,
+)
+
+from ..schemas import (
+    UserPresenceSchema,
+    LinePresenceSchema,
+    ListRequestSchema,
+    dump_user_presence,
+    dump_user_presences,
+)
+from ..store import PresenceStore
 
 UUID = uuid.uuid4()
 
@@ -260,3 +279,77 @@ class TestListRequestSchema(unittest.TestCase):
             calling(self.schema().load).with_args(self.request_args),
             raises(ValidationError),
         )
+
+
+class TestDumpUserPresence(unittest.TestCase):
+    def assert_same_document(self, user):
+        expected = json.dumps(UserPresenceSchema().dump(user))
+        assert_that(json.dumps(dump_user_presence(user)), equal_to(expected))
+
+    def test_model_user(self):
+        user = User(
+            uuid=UUID,
+            tenant_uuid=str(UUID),
+            state='away',
+            status='lunch',
+            do_not_disturb=True,
+            last_activity=datetime.datetime(
+                2022, 6, 1, 12, 30, 15, 42, tzinfo=datetime.timezone.utc
+            ),
+            sessions=[Session(uuid=uuid.uuid4(), mobile=False)],
+            refresh_tokens=[RefreshToken(client_id='mobile', mobile=True)],
+            lines=[
+                Line(id=1, endpoint=Endpoint(name='PJSIP/1', state='available')),
+                Line(
+                    id=2,
+                    endpoint=Endpoint(name='PJSIP/2', state='available'),
+                    channels=[
+                        Channel(name='PJSIP/2-1', state='talking'),
+                        Channel(name='PJSIP/2-2', state='holding'),
+                    ],
+                ),
+                Line(id=3),
+            ],
+        )
+
+        self.assert_same_document(user)
+
+    def test_model_user_without_relationships(self):
+        user = User(uuid=UUID, tenant_uuid=UUID, state='unavailable')
+
+        self.assert_same_document(user)
+
+    def test_store_users(self):
+        store = PresenceStore()
+        user_1 = store.add_user(uuid.uuid4(), UUID)
+        store.add_session(user_1.uuid, uuid.uuid4(), mobile=True)
+        store.associate_line(user_1.uuid, 1, 'PJSIP/1')
+        store.add_channel('PJSIP/1', 'PJSIP/1-1', 'ringing')
+        store.add_channel('PJSIP/1', 'PJSIP/1-2', 'progressing')
+        user_2 = store.add_user(uuid.uuid4(), UUID)
+        store.associate_line(user_2.uuid, 2, 'PJSIP/2')
+        store.update_endpoint_state('PJSIP/2', 'available')
+        store.add_refresh_token(user_2.uuid, 'desktop', mobile=False)
+        users = store.list_users(None)
+
+        expected = json.dumps(UserPresenceSchema().dump(users, many=True))
+        assert_that(json.dumps(dump_user_presences(users)), equal_to(expected))
+
+    def test_key_order(self):
+        user = User(uuid=UUID, tenant_uuid=UUID, state='available')
+
+        assert_that(
+            list(dump_user_presence(user)),
+            contains(
+                'uuid',
+                'tenant_uuid',
+                'state',
+                'status',
+                'last_activity',
+                'do_not_disturb',
+                'lines',
+                'line_state',
+                'mobile',
+                'connected',
+            ),
+        )
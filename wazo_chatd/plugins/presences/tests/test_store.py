@@ -0,0 +1,179 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import uuid
+import unittest
+
+from unittest.mock import Mock
+
+from hamcrest import (
+    assert_that,
+    contains,
+    contains_inanyorder,
+    empty,
+    equal_to,
+    has_properties,
+    none,
+)
+
+from ..store import PresenceStore
+
+TENANT_UUID = str(uuid.uuid4())
+USER_UUID = str(uuid.uuid4())
+ENDPOINT_NAME = 'PJSIP/abcd'
+CHANNEL_NAME = f'{ENDPOINT_NAME}-00000001'
+
+
+class TestPresenceStore(unittest.TestCase):
+    def setUp(self):
+        self.store = PresenceStore()
+        self.store.load([], [])
+        self.store.add_user(USER_UUID, TENANT_UUID)
+
+    def test_load(self):
+        line = Mock(id=1, endpoint_name=ENDPOINT_NAME)
+        line.channels = [Mock(state='ringing')]
+        user = Mock(
+            uuid=uuid.UUID(USER_UUID),
+            tenant_uuid=uuid.UUID(TENANT_UUID),
+            state='available',
+            status='status',
+            do_not_disturb=True,
+            last_activity=None,
+            sessions=[Mock(uuid=uuid.uuid4(), mobile=True)],
+            refresh_tokens=[],
+            lines=[line],
+        )
+        endpoint = Mock(state='available')
+        endpoint.name = ENDPOINT_NAME
+
+        self.store.load([user], [endpoint])
+
+        result = self.store.get_user([TENANT_UUID], USER_UUID)
+        assert_that(
+            result,
+            has_properties(
+                uuid=USER_UUID,
+                state='available',
+                do_not_disturb=True,
+                sessions=contains(has_properties(mobile=True)),
+                lines=contains(
+                    has_properties(
+                        id=1, endpoint_state='available', channels_state=['ringing']
+                    )
+                ),
+            ),
+        )
+
+    def test_get_user_filtered_by_tenant(self):
+        result = self.store.get_user([str(uuid.uuid4())], USER_UUID)
+        assert_that(result, none())
+
+        result = self.store.get_user([uuid.UUID(TENANT_UUID)], uuid.UUID(USER_UUID))
+        assert_that(result, has_properties(uuid=USER_UUID))
+
+    def test_list_users(self):
+        other_uuid = str(uuid.uuid4())
+        self.store.add_user(other_uuid, str(uuid.uuid4()))
+
+        result = self.store.list_users(None)
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_properties(uuid=USER_UUID), has_properties(uuid=other_uuid)
+            ),
+        )
+
+        result = self.store.list_users([TENANT_UUID])
+        assert_that(result, contains(has_properties(uuid=USER_UUID)))
+
+        result = self.store.list_users(None, uuids=[uuid.UUID(other_uuid)])
+        assert_that(result, contains(has_properties(uuid=other_uuid)))
+
+    def test_channel_lifecycle(self):
+        self.store.associate_line(USER_UUID, 1, ENDPOINT_NAME)
+
+        user = self.store.add_channel(ENDPOINT_NAME, CHANNEL_NAME, 'ringing')
+        assert_that(user.lines[0].channels_state, contains('ringing'))
+
+        user = self.store.update_channel_state(CHANNEL_NAME, 'talking')
+        assert_that(user.lines[0].channels_state, contains('talking'))
+
+        user = self.store.remove_channel(CHANNEL_NAME)
+        assert_that(user.lines[0].channels_state, empty())
+
+    def test_add_channel_unknown_endpoint(self):
+        result = self.store.add_channel(ENDPOINT_NAME, CHANNEL_NAME, 'ringing')
+        assert_that(result, none())
+
+    def test_update_endpoint_state(self):
+        self.store.associate_line(USER_UUID, 1, ENDPOINT_NAME)
+
+        user = self.store.update_endpoint_state(ENDPOINT_NAME, 'available')
+        assert_that(user.lines[0].endpoint_state, equal_to('available'))
+
+        result = self.store.update_endpoint_state(ENDPOINT_NAME, 'available')
+        assert_that(result, none())
+
+    def test_update_endpoint_state_before_line_association(self):
+        self.store.update_endpoint_state(ENDPOINT_NAME, 'available')
+
+        user = self.store.associate_line(USER_UUID, 1, ENDPOINT_NAME)
+
+        assert_that(user.lines[0].endpoint_state, equal_to('available'))
+
+    def test_associate_line_already_associated(self):
+        other_uuid = str(uuid.uuid4())
+        self.store.add_user(other_uuid, TENANT_UUID)
+        self.store.associate_line(USER_UUID, 1, ENDPOINT_NAME)
+
+        self.store.associate_line(other_uuid, 1, ENDPOINT_NAME)
+
+        assert_that(self.store.get_user(None, USER_UUID).lines, empty())
+        assert_that(
+            self.store.get_user(None, other_uuid).lines, contains(has_properties(id=1))
+        )
+
+    def test_remove_user_removes_channels(self):
+        self.store.associate_line(USER_UUID, 1, ENDPOINT_NAME)
+        self.store.add_channel(ENDPOINT_NAME, CHANNEL_NAME, 'ringing')
+
+        self.store.remove_user(USER_UUID)
+
+        assert_that(self.store.update_channel_state(CHANNEL_NAME, 'talking'), none())
+        assert_that(self.store.add_channel(ENDPOINT_NAME, CHANNEL_NAME, 'up'), none())
+
+    def test_sessions_and_refresh_tokens(self):
+        session_uuid = str(uuid.uuid4())
+        user = self.store.add_session(USER_UUID, session_uuid, False)
+        user = self.store.add_session(USER_UUID, session_uuid, True)
+        assert_that(user.sessions, contains(has_properties(mobile=True)))
+
+        user = self.store.add_refresh_token(USER_UUID, 'client', True)
+        assert_that(user.refresh_tokens, contains(has_properties(client_id='client')))
+
+        assert_that(self.store.remove_session(USER_UUID, session_uuid), equal_to(user))
+        assert_that(self.store.remove_session(USER_UUID, session_uuid), none())
+        assert_that(
+            self.store.remove_refresh_token(USER_UUID, 'client'), equal_to(user)
+        )
+
+    def test_remove_tenant(self):
+        self.store.remove_tenant(TENANT_UUID)
+
+        assert_that(self.store.list_users(None), empty())
+
+    def test_copy_user(self):
+        self.store.associate_line(USER_UUID, 1, ENDPOINT_NAME)
+        self.store.add_channel(ENDPOINT_NAME, CHANNEL_NAME, 'up')
+        copy = self.store.get_user(None, USER_UUID).copy()
+
+        self.store.update_user(USER_UUID, state='away')
+        self.store.update_channel_state(CHANNEL_NAME, 'holding')
+        self.store.dissociate_line(USER_UUID, 1)
+
+        assert_that(copy, has_properties(uuid=USER_UUID, state='unavailable'))
+        assert_that(
+            copy.lines,
+            contains(has_properties(id=1, channels_state=contains('up'))),
+        )
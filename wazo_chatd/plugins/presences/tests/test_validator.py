@@ -0,0 +1,40 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from unittest.mock import Mock
+
+from hamcrest import assert_that, calling, equal_to, raises
+
+from ..validator import NotInitializedException, StatusValidator
+
+
+class TestStatusValidator(unittest.TestCase):
+    def setUp(self):
+        self.validator = StatusValidator()
+        self.is_initialized = Mock(return_value=False)
+        self.func = self.validator.presence_initialization(Mock(return_value='ok'))
+
+    def test_not_initialized(self):
+        self.validator.set_config(
+            {'initialization': {'enabled': True}}, self.is_initialized
+        )
+
+        assert_that(calling(self.func), raises(NotInitializedException))
+
+    def test_initialized(self):
+        self.is_initialized.return_value = True
+        self.validator.set_config(
+            {'initialization': {'enabled': True}}, self.is_initialized
+        )
+
+        assert_that(self.func(), equal_to('ok'))
+
+    def test_initialization_disabled(self):
+        self.validator.set_config(
+            {'initialization': {'enabled': False}}, self.is_initialized
+        )
+
+        assert_that(self.func(), equal_to('ok'))
+        self.is_initialized.assert_not_called()
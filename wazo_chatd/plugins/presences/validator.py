@@ -1,10 +1,9 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from functools import wraps
 
 from xivo.rest_api_helpers import APIException
-from xivo.status import Status
 
 
 class NotInitializedException(APIException):
@@ -14,24 +13,24 @@ class NotInitializedException(APIException):
 
 
 class StatusValidator:
+    """Refuse the presence requests until the presences are initialized
+
+    Only the readiness flag is read on each request, not the whole status.
+    """
+
     def __init__(self):
-        self._status_aggregator = None
-        self._config = None
+        self._enabled = False
+        self._is_initialized = None
 
-    def set_config(self, status_aggregator, config):
-        self._status_aggregator = status_aggregator
-        self._config = config
+    def set_config(self, config, is_initialized):
+        self._enabled = config['initialization']['enabled']
+        self._is_initialized = is_initialized
 
     def presence_initialization(self, func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            enabled = self._config['initialization']['enabled']
-            if enabled:
-                status = self._status_aggregator.status()['presence_initialization'][
-                    'status'
-                ]
-                if status != Status.ok:
-                    raise NotInitializedException()
+            if self._enabled and not self._is_initialized():
+                raise NotInitializedException()
             return func(*args, **kwargs)
 
         return wrapper
@@ -0,0 +1,26 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from xivo_bus.resources.common.event import MultiUserEvent
+
+
+class RoomCreatedEvent(MultiUserEvent):
+    __slots__ = ('room_uuid',)
+    service = 'chatd'
+    name = 'chatd_room_created'
+    routing_key_fmt = 'chatd.rooms.{room_uuid}.created'
+
+    def __init__(self, room, tenant_uuid, user_uuids):
+        super().__init__(room, tenant_uuid, user_uuids)
+        self.room_uuid = str(room['uuid'])
+
+
+class RoomMessageCreatedEvent(MultiUserEvent):
+    __slots__ = ('room_uuid',)
+    service = 'chatd'
+    name = 'chatd_room_message_created'
+    routing_key_fmt = 'chatd.rooms.{room_uuid}.messages.created'
+
+    def __init__(self, message, room_uuid, tenant_uuid, user_uuids):
+        super().__init__(message, tenant_uuid, user_uuids)
+        self.room_uuid = str(room_uuid)
@@ -1,4 +1,4 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from marshmallow import ValidationError
@@ -17,9 +17,25 @@ from .schemas import (
     MessageListRequestSchema,
     MessageSchema,
     RoomSchema,
+    encode_cursor,
 )
 
 
+def page_cursors(messages, limit=None, offset=None, cursor=None, order=None, **ignored):
+    # Cursors are positions in time, they cannot seek in a ranking
+    if not messages or order == 'rank':
+        return {'next': None, 'prev': None}
+
+    backward = bool(cursor and cursor['before'])
+    full = bool(limit) and len(messages) >= limit
+    has_next = full or backward
+    has_prev = full if backward else bool(cursor or offset)
+    return {
+        'next': encode_cursor(messages[-1]) if has_next else None,
+        'prev': encode_cursor(messages[0], before=True) if has_prev else None,
+    }
+
+
 class UserRoomListResource(AuthResource):
     def __init__(self, service):
         self._service = service
@@ -79,17 +95,17 @@ class UserMessageListResource(AuthResource):
     @required_acl('chatd.users.me.rooms.messages.read')
     def get(self):
         filter_parameters = MessageListRequestSchema().load(request.args)
-        messages = self._service.list_user_messages(
+        messages, filtered = self._service.list_user_messages_with_count(
             token.tenant_uuid, token.user_uuid, **filter_parameters
         )
-        filtered = self._service.count_user_messages(
-            token.tenant_uuid, token.user_uuid, **filter_parameters
+        total = self._service.count_all_user_messages(
+            token.tenant_uuid, token.user_uuid
         )
-        total = self._service.count_user_messages(token.tenant_uuid, token.user_uuid)
         return {
             'items': MessageSchema().dump(messages, many=True),
             'filtered': filtered,
             'total': total,
+            **page_cursors(messages, **filter_parameters),
         }
 
 
@@ -112,11 +128,13 @@ class UserRoomMessageListResource(AuthResource):
     def get(self, room_uuid):
         filter_parameters = ListRequestSchema().load(request.args)
         room = self._service.get([token.tenant_uuid], room_uuid)
-        messages = self._service.list_messages(room, **filter_parameters)
-        filtered = self._service.count_messages(room, **filter_parameters)
-        total = self._service.count_messages(room)
+        messages, filtered = self._service.list_messages_with_count(
+            room, **filter_parameters
+        )
+        total = room.message_count
         return {
             'items': MessageSchema().dump(messages, many=True),
             'filtered': filtered,
             'total': total,
+            **page_cursors(messages, **filter_parameters),
         }
@@ -6,23 +6,47 @@ from xivo_bus.resources.chatd.events import (
     UserRoomMessageCreatedEvent,
 )
 
+from .events import RoomCreatedEvent, RoomMessageCreatedEvent
 from .schemas import RoomSchema, MessageSchema
 
 
 class RoomNotifier:
-    def __init__(self, bus):
+    """Publish the room events
+
+    In "user" mode, one event is published per member of the room. In "room" mode,
+    a single event is published for the whole room, routed to every member by its
+    headers. "both" publishes both kinds, for the time the clients migrate.
+    """
+
+    def __init__(self, bus, mode='user'):
         self._bus = bus
+        self._user_events = mode in ('user', 'both')
+        self._room_events = mode in ('room', 'both')
 
     def created(self, room):
         room_json = RoomSchema().dump(room)
-        for user in room_json['users']:
-            event = UserRoomCreatedEvent(room_json, room.tenant_uuid, user['uuid'])
+        if self._room_events:
+            user_uuids = [user['uuid'] for user in room_json['users']]
+            event = RoomCreatedEvent(room_json, room.tenant_uuid, user_uuids)
             self._bus.publish(event)
 
+        if self._user_events:
+            for user in room_json['users']:
+                event = UserRoomCreatedEvent(room_json, room.tenant_uuid, user['uuid'])
+                self._bus.publish(event)
+
     def message_created(self, room, message):
         message_json = MessageSchema().dump(message)
-        for user in room.users:
-            event = UserRoomMessageCreatedEvent(
-                message_json, room.uuid, room.tenant_uuid, user.uuid
+        if self._room_events:
+            user_uuids = [user.uuid for user in room.users]
+            event = RoomMessageCreatedEvent(
+                message_json, room.uuid, room.tenant_uuid, user_uuids
             )
             self._bus.publish(event)
+
+        if self._user_events:
+            for user in room.users:
+                event = UserRoomMessageCreatedEvent(
+                    message_json, room.uuid, room.tenant_uuid, user.uuid
+                )
+                self._bus.publish(event)
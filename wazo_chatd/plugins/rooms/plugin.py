@@ -1,4 +1,4 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from .http import (
@@ -17,7 +17,7 @@ class Plugin:
         dao = dependencies['dao']
         bus_publisher = dependencies['bus_publisher']
 
-        notifier = RoomNotifier(bus_publisher)
+        notifier = RoomNotifier(bus_publisher, config['room_events']['mode'])
         service = RoomService(config['uuid'], dao, notifier)
 
         api.add_resource(
@@ -1,6 +1,13 @@
 # Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import base64
+import binascii
+import json
+import uuid
+
+from datetime import datetime
+
 from marshmallow import validates_schema
 from xivo.mallow import fields, validate
 from xivo.mallow_helpers import Schema, ListSchema as _ListSchema, ValidationError
@@ -29,28 +36,71 @@ class MessageSchema(Schema):
     tenant_uuid = fields.UUID(dump_only=True)
     wazo_uuid = fields.UUID(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
+    highlight = fields.String(dump_only=True)
+
+    room = fields.Method('_dump_room', dump_only=True)
+
+    def _dump_room(self, message):
+        # Only the uuid of the room is dumped, no need to load it
+        return {'uuid': str(message.room_uuid)}
+
+
+def encode_cursor(message, before=False):
+    position = [message.created_at.isoformat(), str(message.uuid), before]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
 
-    room = fields.Nested('RoomSchema', dump_only=True, only=['uuid'])
+class Cursor(fields.Field):
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(value.encode()))
+            created_at, uuid_, before = position
+            return {
+                'created_at': datetime.fromisoformat(created_at),
+                'uuid': uuid.UUID(uuid_),
+                'before': bool(before),
+            }
+        except (binascii.Error, TypeError, ValueError):
+            raise ValidationError('Invalid cursor')
+
+
+def validate_rank_order(data):
+    if data.get('order') != 'rank':
+        return
+    if not data.get('search'):
+        raise ValidationError('Ordering by rank requires a search')
+    if data.get('cursor'):
+        raise ValidationError('Ordering by rank does not support cursors')
 
 
 class ListRequestSchema(_ListSchema):
     default_sort_column = 'created_at'
-    sort_columns = ['created_at']
+    sort_columns = ['created_at', 'rank']
     searchable_columns = []
     default_direction = 'desc'
     from_date = fields.DateTime()
+    cursor = Cursor()
+
+    @validates_schema
+    def rank_order(self, data, **kwargs):
+        validate_rank_order(data)
 
 
 class MessageListRequestSchema(_ListSchema):
     default_sort_column = 'created_at'
-    sort_columns = ['created_at']
+    sort_columns = ['created_at', 'rank']
     searchable_columns = []
     default_direction = 'desc'
 
     search = fields.String()
     distinct = fields.String(validate=validate.OneOf(['room_uuid']))
+    cursor = Cursor()
 
     @validates_schema
     def search_or_distinct(self, data, **kwargs):
         if not data.get('search') and not data.get('distinct'):
             raise ValidationError('Missing search or distinct')
+
+    @validates_schema
+    def rank_order(self, data, **kwargs):
+        validate_rank_order(data)
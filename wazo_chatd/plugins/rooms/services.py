@@ -1,4 +1,4 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 
@@ -42,6 +42,9 @@ class RoomService:
     def list_messages(self, room, **filter_parameters):
         return self._dao.room.list_messages(room, **filter_parameters)
 
+    def list_messages_with_count(self, room, **filter_parameters):
+        return self._dao.room.list_messages_with_count(room, **filter_parameters)
+
     def count_messages(self, room, **filter_parameters):
         return self._dao.room.count_messages(room, **filter_parameters)
 
@@ -50,6 +53,16 @@ class RoomService:
             tenant_uuid, user_uuid, **filter_parameters
         )
 
+    def list_user_messages_with_count(
+        self, tenant_uuid, user_uuid, **filter_parameters
+    ):
+        return self._dao.room.list_user_messages_with_count(
+            tenant_uuid, user_uuid, **filter_parameters
+        )
+
+    def count_all_user_messages(self, tenant_uuid, user_uuid):
+        return self._dao.room.count_all_user_messages(tenant_uuid, user_uuid)
+
     def count_user_messages(self, tenant_uuid, user_uuid, **filter_parameters):
         return self._dao.room.count_user_messages(
             tenant_uuid, user_uuid, **filter_parameters
@@ -0,0 +1,83 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import uuid
+import unittest
+
+from unittest.mock import Mock, call, patch, sentinel as s
+
+from hamcrest import assert_that, contains, empty, equal_to
+
+from wazo_chatd.database.models import Room, RoomMessage, RoomUser
+
+from ..notifier import RoomNotifier
+
+USER_UUID_1 = uuid.uuid4()
+USER_UUID_2 = uuid.uuid4()
+
+
+@patch('wazo_chatd.plugins.rooms.notifier.MessageSchema')
+@patch('wazo_chatd.plugins.rooms.notifier.UserRoomMessageCreatedEvent')
+@patch('wazo_chatd.plugins.rooms.notifier.RoomMessageCreatedEvent')
+class TestRoomNotifierMessageCreated(unittest.TestCase):
+    def setUp(self):
+        self.bus = Mock()
+        self.room = Room(
+            uuid=s.room_uuid,
+            tenant_uuid=s.tenant_uuid,
+            users=[RoomUser(uuid=USER_UUID_1), RoomUser(uuid=USER_UUID_2)],
+        )
+        self.message = RoomMessage()
+
+    def test_user_mode(self, room_event, user_event, schema):
+        schema.return_value.dump.return_value = s.message_json
+
+        RoomNotifier(self.bus, 'user').message_created(self.room, self.message)
+
+        room_event.assert_not_called()
+        assert_that(
+            user_event.call_args_list,
+            contains(
+                call(s.message_json, s.room_uuid, s.tenant_uuid, USER_UUID_1),
+                call(s.message_json, s.room_uuid, s.tenant_uuid, USER_UUID_2),
+            ),
+        )
+        assert_that(self.bus.publish.call_count, equal_to(2))
+
+    def test_room_mode(self, room_event, user_event, schema):
+        schema.return_value.dump.return_value = s.message_json
+
+        RoomNotifier(self.bus, 'room').message_created(self.room, self.message)
+
+        room_event.assert_called_once_with(
+            s.message_json, s.room_uuid, s.tenant_uuid, [USER_UUID_1, USER_UUID_2]
+        )
+        assert_that(user_event.call_args_list, empty())
+        self.bus.publish.assert_called_once_with(room_event.return_value)
+
+    def test_both_mode(self, room_event, user_event, schema):
+        RoomNotifier(self.bus, 'both').message_created(self.room, self.message)
+
+        schema.return_value.dump.assert_called_once_with(self.message)
+        room_event.assert_called_once()
+        assert_that(user_event.call_count, equal_to(2))
+        assert_that(self.bus.publish.call_count, equal_to(3))
+
+
+@patch('wazo_chatd.plugins.rooms.notifier.UserRoomCreatedEvent')
+@patch('wazo_chatd.plugins.rooms.notifier.RoomCreatedEvent')
+class TestRoomNotifierCreated(unittest.TestCase):
+    def test_room_mode(self, room_event, user_event):
+        bus = Mock()
+        room = Room(
+            uuid=uuid.uuid4(),
+            tenant_uuid=s.tenant_uuid,
+            users=[RoomUser(uuid=USER_UUID_1), RoomUser(uuid=USER_UUID_2)],
+        )
+
+        RoomNotifier(bus, 'room').created(room)
+
+        room_json, tenant_uuid, user_uuids = room_event.call_args[0]
+        assert_that(user_uuids, contains(str(USER_UUID_1), str(USER_UUID_2)))
+        user_event.assert_not_called()
+        bus.publish.assert_called_once_with(room_event.return_value)
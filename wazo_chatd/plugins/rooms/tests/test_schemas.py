@@ -1,12 +1,23 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import unittest
+import uuid
+
+from datetime import datetime, timezone
+from unittest.mock import Mock
 
 from hamcrest import assert_that, calling, has_entries, not_, raises
 from xivo.mallow_helpers import ValidationError
 
-from ..schemas import ListRequestSchema, MessageListRequestSchema
+from wazo_chatd.database.models import RoomMessage
+
+from ..schemas import (
+    ListRequestSchema,
+    MessageListRequestSchema,
+    MessageSchema,
+    encode_cursor,
+)
 
 
 class TestListRequestSchema(unittest.TestCase):
@@ -21,6 +32,46 @@ class TestListRequestSchema(unittest.TestCase):
         result = self.schema().load({})
         assert_that(result, has_entries(order='created_at'))
 
+    def test_load_cursor(self):
+        message = Mock(created_at=datetime.now(timezone.utc), uuid=uuid.uuid4())
+
+        result = self.schema().load({'cursor': encode_cursor(message, before=True)})
+
+        assert_that(
+            result,
+            has_entries(
+                cursor=has_entries(
+                    created_at=message.created_at, uuid=message.uuid, before=True
+                )
+            ),
+        )
+
+    def test_load_cursor_invalid(self):
+        for cursor in ('invalid', 'W10=', 'WyJ4IiwgInkiLCB0cnVlXQ=='):
+            assert_that(
+                calling(self.schema().load).with_args({'cursor': cursor}),
+                raises(ValidationError),
+            )
+
+    def test_load_order_rank(self):
+        result = self.schema().load({'order': 'rank', 'search': 'found'})
+        assert_that(result, has_entries(order='rank', search='found'))
+
+    def test_load_order_rank_without_search(self):
+        assert_that(
+            calling(self.schema().load).with_args({'order': 'rank'}),
+            raises(ValidationError, pattern='requires a search'),
+        )
+
+    def test_load_order_rank_with_cursor(self):
+        message = Mock(created_at=datetime.now(timezone.utc), uuid=uuid.uuid4())
+        body = {'order': 'rank', 'search': 'found', 'cursor': encode_cursor(message)}
+
+        assert_that(
+            calling(self.schema().load).with_args(body),
+            raises(ValidationError, pattern='cursors'),
+        )
+
 
 class TestMessageListRequestSchema(unittest.TestCase):
 
@@ -35,3 +86,13 @@ class TestMessageListRequestSchema(unittest.TestCase):
             calling(self.schema().load).with_args({'search': 'ok'}),
             not_(raises(ValidationError, pattern='search or distinct')),
         )
+
+
+class TestMessageSchema(unittest.TestCase):
+    def test_dump_room_without_loading_it(self):
+        room_uuid = uuid.uuid4()
+        message = RoomMessage(uuid=uuid.uuid4(), room_uuid=room_uuid, content='hi')
+
+        result = MessageSchema().dump(message)
+
+        assert_that(result, has_entries(room={'uuid': str(room_uuid)}))
@@ -1,21 +1,22 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo.status import Status
 
 from .resource import StatusResource
+from .snapshot import StatusSnapshot
 
 
 class Plugin:
     def load(self, dependencies):
         api = dependencies['api']
+        config = dependencies['config']
         status_aggregator = dependencies['status_aggregator']
 
         status_aggregator.add_provider(provide_status)
+        snapshot = StatusSnapshot(status_aggregator, config['status_cache']['max_age'])
 
-        api.add_resource(
-            StatusResource, '/status', resource_class_args=[status_aggregator]
-        )
+        api.add_resource(StatusResource, '/status', resource_class_args=[snapshot])
 
 
 def provide_status(status):
@@ -1,4 +1,4 @@
-# Copyright 2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2019-2022 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo.auth_verifier import required_acl
@@ -7,9 +7,9 @@ from wazo_chatd.http import AuthResource
 
 
 class StatusResource(AuthResource):
-    def __init__(self, status_aggregator):
-        self.status_aggregator = status_aggregator
+    def __init__(self, status_snapshot):
+        self.status_snapshot = status_snapshot
 
     @required_acl('chatd.status.read')
     def get(self):
-        return self.status_aggregator.status(), 200
+        return self.status_snapshot.status(), 200
@@ -0,0 +1,27 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+import time
+
+
+class StatusSnapshot:
+    """The status of the aggregator, computed at most once every `max_age` seconds
+
+    Concurrent requests for an outdated snapshot wait for a single computation.
+    """
+
+    def __init__(self, status_aggregator, max_age=1.0):
+        self._status_aggregator = status_aggregator
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._status = None
+        self._computed_at = None
+
+    def status(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._computed_at is None or now - self._computed_at >= self._max_age:
+                self._status = self._status_aggregator.status()
+                self._computed_at = now
+            return self._status
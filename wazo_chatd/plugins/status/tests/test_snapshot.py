@@ -0,0 +1,37 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from unittest.mock import Mock, patch
+
+from hamcrest import assert_that, equal_to
+
+from ..snapshot import StatusSnapshot
+
+
+@patch('wazo_chatd.plugins.status.snapshot.time.monotonic')
+class TestStatusSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.status_aggregator = Mock()
+        self.status_aggregator.status.side_effect = [{'run': 1}, {'run': 2}]
+        self.snapshot = StatusSnapshot(self.status_aggregator, max_age=1.0)
+
+    def test_cached_until_max_age(self, monotonic):
+        monotonic.return_value = 100
+        assert_that(self.snapshot.status(), equal_to({'run': 1}))
+
+        monotonic.return_value = 100.9
+        assert_that(self.snapshot.status(), equal_to({'run': 1}))
+
+        monotonic.return_value = 101
+        assert_that(self.snapshot.status(), equal_to({'run': 2}))
+
+    def test_no_cache(self, monotonic):
+        monotonic.return_value = 100
+        snapshot = StatusSnapshot(self.status_aggregator, max_age=0)
+
+        snapshot.status()
+        snapshot.status()
+
+        assert_that(self.status_aggregator.status.call_count, equal_to(2))
@@ -0,0 +1,67 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import ctypes
+import logging
+import multiprocessing
+import threading
+
+from xivo.status import Status
+
+logger = logging.getLogger(__name__)
+
+MASTER_SECTIONS = ('bus_consumer', 'presence_initialization')
+
+
+class SharedStatus:
+    """Readiness of the master process components, shared with the HTTP workers
+
+    The flags live in shared memory, allocated before forking the workers. The
+    master refreshes them from its status providers every `interval` seconds and
+    the workers report them in place of their own idle bus consumer and
+    initiator.
+    """
+
+    def __init__(self, status_aggregator, sections=MASTER_SECTIONS, interval=1.0):
+        self._status_aggregator = status_aggregator
+        self._sections = tuple(sections)
+        self._ready = multiprocessing.RawArray(ctypes.c_bool, len(self._sections))
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            raise Exception('Shared status already started')
+
+        self._thread = threading.Thread(target=self._run, name='shared_status')
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stopped.set()
+        logger.debug('joining shared status thread...')
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Failed to refresh the shared status')
+            if self._stopped.wait(self._interval):
+                return
+
+    def refresh(self):
+        status = self._status_aggregator.status()
+        for i, section in enumerate(self._sections):
+            self._ready[i] = status.get(section, {}).get('status') == Status.ok
+
+    def is_ok(self, section):
+        return self._ready[self._sections.index(section)]
+
+    def provide_status(self, status):
+        for i, section in enumerate(self._sections):
+            if section in status:
+                status[section]['status'] = Status.ok if self._ready[i] else Status.fail
@@ -0,0 +1,199 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+import time
+import unittest
+
+from collections import defaultdict
+from unittest.mock import Mock, call
+
+from hamcrest import assert_that, contains, equal_to, has_entries
+
+from ..bus import BusEventDispatcher, BusPublishQueue
+
+
+class TestBusPublishQueue(unittest.TestCase):
+    def setUp(self):
+        self.publisher = Mock()
+
+    def test_publish_not_started(self):
+        publish_queue = BusPublishQueue(self.publisher)
+
+        publish_queue.publish('event', headers={'name': 'event'})
+
+        self.publisher.publish.assert_called_once_with(
+            'event', headers={'name': 'event'}
+        )
+
+    def test_publish_in_order(self):
+        publish_queue = BusPublishQueue(self.publisher, batch_size=2)
+
+        with publish_queue:
+            for i in range(5):
+                publish_queue.publish(i)
+
+        assert_that(
+            self.publisher.publish.call_args_list,
+            contains(*(call(i) for i in range(5))),
+        )
+
+    def test_publish_failure(self):
+        self.publisher.publish.side_effect = [Exception, None]
+        publish_queue = BusPublishQueue(self.publisher)
+
+        with publish_queue:
+            publish_queue.publish('failed')
+            publish_queue.publish('published')
+
+        status = defaultdict(dict)
+        publish_queue.provide_status(status)
+        assert_that(status['bus_publisher'], has_entries(published=1, failed=1))
+
+    def test_on_error(self):
+        self.publisher.publish.side_effect = [Exception, None]
+        on_error = Mock()
+        publish_queue = BusPublishQueue(self.publisher)
+
+        with publish_queue:
+            publish_queue.publish('failed', on_error=on_error)
+            publish_queue.publish('published', on_error=on_error)
+
+        on_error.assert_called_once_with()
+        self.publisher.publish.assert_called_with('published')
+
+    def test_overflow(self):
+        for overflow, expected in (
+            ('drop_newest', ['blocking', 'queued']),
+            ('drop_oldest', ['blocking', 'dropping']),
+            ('block', ['blocking', 'queued']),
+        ):
+            with self.subTest(overflow=overflow):
+                published, blocked, release = [], threading.Event(), threading.Event()
+
+                def publish(event):
+                    blocked.set()
+                    release.wait()
+                    published.append(event)
+
+                publish_queue = BusPublishQueue(
+                    Mock(publish=publish),
+                    queue_size=1,
+                    overflow=overflow,
+                    block_timeout=0.01,
+                )
+                publish_queue.start()
+                publish_queue.publish('blocking')
+                blocked.wait()
+
+                publish_queue.publish('queued')
+                publish_queue.publish('dropping')
+
+                status = defaultdict(dict)
+                publish_queue.provide_status(status)
+                release.set()
+                publish_queue.stop()
+
+                assert_that(published, equal_to(expected))
+                assert_that(
+                    status['bus_publisher'],
+                    has_entries(queue_depth=1, queue_size=1, dropped=1),
+                )
+
+    def test_drop_oldest_while_stopping(self):
+        published, blocked, release = [], threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+
+        def publish(event):
+            blocked.set()
+            release.wait()
+            published.append(event)
+
+        publish_queue = BusPublishQueue(
+            Mock(publish=publish), queue_size=1, overflow='drop_oldest'
+        )
+        publish_queue.start()
+        publish_queue.publish('blocking')
+        blocked.wait()
+
+        stopping = threading.Thread(target=publish_queue.stop, daemon=True)
+        stopping.start()
+        while not publish_queue._queue.full():
+            time.sleep(0.001)
+        publish_queue.publish('late')
+        release.set()
+        stopping.join(timeout=5)
+
+        assert_that(stopping.is_alive(), equal_to(False))
+        assert_that(published, equal_to(['blocking']))
+        status = defaultdict(dict)
+        publish_queue.provide_status(status)
+        assert_that(status['bus_publisher'], has_entries(dropped=1))
+
+
+class FakeConsumer:
+    def __init__(self):
+        self.handlers = {}
+
+    def subscribe(self, event_name, handler):
+        self.handlers[event_name] = handler
+
+    def consume(self, event_name, event):
+        self.handlers[event_name](event)
+
+
+class TestBusEventDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.consumer = FakeConsumer()
+
+    def test_handle_not_started(self):
+        dispatcher = BusEventDispatcher(self.consumer)
+        handler = Mock()
+        dispatcher.subscribe('event', handler)
+
+        self.consumer.consume('event', {'id': 1})
+
+        handler.assert_called_once_with({'id': 1})
+
+    def test_events_of_a_key_in_order(self):
+        dispatcher = BusEventDispatcher(self.consumer, workers=4)
+        handled = defaultdict(list)
+
+        def handler(event):
+            handled[event['key']].append(event['id'])
+
+        dispatcher.subscribe('event', handler, key=lambda event: event['key'])
+        with dispatcher:
+            for i in range(100):
+                self.consumer.consume('event', {'key': i % 7, 'id': i})
+
+        for key in range(7):
+            assert_that(handled[key], equal_to(list(range(key, 100, 7))))
+
+    def test_a_slow_key_does_not_block_the_others(self):
+        dispatcher = BusEventDispatcher(self.consumer, workers=2)
+        release = threading.Event()
+        handled = threading.Event()
+        dispatcher.subscribe('slow', lambda event: release.wait(), key=lambda _: 0)
+        dispatcher.subscribe('fast', lambda event: handled.set(), key=lambda _: 1)
+
+        with dispatcher:
+            self.consumer.consume('slow', {})
+            self.consumer.consume('fast', {})
+            assert_that(handled.wait(timeout=5), equal_to(True))
+            release.set()
+
+    def test_handler_failure(self):
+        dispatcher = BusEventDispatcher(self.consumer, workers=1)
+        dispatcher.subscribe('event', Mock(side_effect=[Exception, None]))
+
+        with dispatcher:
+            self.consumer.consume('event', {})
+            self.consumer.consume('event', {})
+
+        status = defaultdict(dict)
+        dispatcher.provide_status(status)
+        assert_that(
+            status['bus_dispatcher'],
+            has_entries(workers=1, queue_depth=0, lag=0.0, handled=2, failed=1),
+        )
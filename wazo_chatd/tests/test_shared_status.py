@@ -0,0 +1,61 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from collections import defaultdict
+from unittest.mock import Mock
+
+from hamcrest import assert_that, equal_to, has_entries, has_key, not_
+from xivo.status import Status
+
+from ..shared_status import SharedStatus
+
+
+class TestSharedStatus(unittest.TestCase):
+    def setUp(self):
+        self.status_aggregator = Mock()
+        self.shared_status = SharedStatus(self.status_aggregator)
+
+    def test_workers_report_master_status(self):
+        self.status_aggregator.status.return_value = {
+            'bus_consumer': {'status': Status.ok},
+            'presence_initialization': {'status': Status.fail},
+        }
+        self.shared_status.refresh()
+
+        status = defaultdict(dict)
+        status['bus_consumer']['status'] = Status.fail
+        status['presence_initialization']['status'] = Status.fail
+        self.shared_status.provide_status(status)
+
+        assert_that(
+            status,
+            has_entries(
+                bus_consumer={'status': Status.ok},
+                presence_initialization={'status': Status.fail},
+            ),
+        )
+
+    def test_missing_sections_are_not_added(self):
+        self.status_aggregator.status.return_value = {
+            'bus_consumer': {'status': Status.ok},
+        }
+        self.shared_status.refresh()
+
+        status = defaultdict(dict)
+        status['bus_consumer']['status'] = Status.fail
+        self.shared_status.provide_status(status)
+
+        assert_that(status['bus_consumer']['status'], equal_to(Status.ok))
+        assert_that(status, not_(has_key('presence_initialization')))
+
+    def test_is_ok(self):
+        self.status_aggregator.status.return_value = {
+            'bus_consumer': {'status': Status.fail},
+            'presence_initialization': {'status': Status.ok},
+        }
+        self.shared_status.refresh()
+
+        assert_that(self.shared_status.is_ok('presence_initialization'))
+        assert_that(self.shared_status.is_ok('bus_consumer'), equal_to(False))
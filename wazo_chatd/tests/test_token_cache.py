@@ -0,0 +1,115 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+import requests
+
+from hamcrest import assert_that, calling, equal_to, has_entries, none, raises
+
+from ..token_cache import CachedTokenCommand, TokenCache
+
+ACL = 'chatd.users.me.presences.read'
+TOKEN_ID = 'my-token'
+SESSION_UUID = 'my-session'
+
+
+def make_token(expires_in=3600):
+    expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
+    return {
+        'token': TOKEN_ID,
+        'session_uuid': SESSION_UUID,
+        'utc_expires_at': expires_at.isoformat(),
+        'metadata': {'tenant_uuid': 'my-tenant'},
+    }
+
+
+def http_error(status_code):
+    return requests.HTTPError(response=Mock(status_code=status_code))
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TokenCache(ttl=30, max_size=2)
+
+    def test_hit_only_for_a_verified_check(self):
+        token = make_token()
+        self.cache.add(TOKEN_ID, token, ACL)
+
+        assert_that(self.cache.get(TOKEN_ID, ACL), equal_to(token))
+        assert_that(self.cache.get(TOKEN_ID), equal_to(token))
+        assert_that(self.cache.get(TOKEN_ID, 'other.acl'), none())
+        assert_that(self.cache.get(TOKEN_ID, ACL, tenant='other'), none())
+        assert_that(self.cache.get('other-token', ACL), none())
+
+        status = defaultdict(dict)
+        self.cache.provide_status(status)
+        assert_that(status['token_cache'], has_entries(size=1, hits=2, misses=3))
+
+    def test_expired_after_ttl(self):
+        with patch('wazo_chatd.token_cache.time.monotonic', return_value=1000):
+            self.cache.add(TOKEN_ID, make_token(), ACL)
+        with patch('wazo_chatd.token_cache.time.monotonic', return_value=1031):
+            assert_that(self.cache.get(TOKEN_ID, ACL), none())
+
+    def test_expired_with_the_token(self):
+        with patch('wazo_chatd.token_cache.time.monotonic', return_value=1000):
+            self.cache.add(TOKEN_ID, make_token(expires_in=10), ACL)
+        with patch('wazo_chatd.token_cache.time.monotonic', return_value=1011):
+            assert_that(self.cache.get(TOKEN_ID, ACL), none())
+
+    def test_expired_token_not_cached(self):
+        self.cache.add(TOKEN_ID, make_token(expires_in=-10), ACL)
+
+        assert_that(self.cache.get(TOKEN_ID, ACL), none())
+
+    def test_invalidated_by_session_deleted(self):
+        self.cache.add(TOKEN_ID, make_token(), ACL)
+
+        self.cache.on_session_deleted({'uuid': SESSION_UUID, 'user_uuid': 'user'})
+
+        assert_that(self.cache.get(TOKEN_ID, ACL), none())
+
+    def test_least_recently_used_evicted(self):
+        self.cache.add('token-1', make_token(), ACL)
+        self.cache.add('token-2', make_token(), ACL)
+        self.cache.get('token-1', ACL)
+
+        self.cache.add('token-3', make_token(), ACL)
+
+        assert_that(self.cache.get('token-1', ACL), has_entries(token=TOKEN_ID))
+        assert_that(self.cache.get('token-2', ACL), none())
+
+
+class TestCachedTokenCommand(unittest.TestCase):
+    def setUp(self):
+        self.token_command = Mock()
+        self.token_command.get.return_value = self.token = make_token()
+        self.command = CachedTokenCommand(self.token_command, TokenCache())
+
+    def test_is_valid_asks_wazo_auth_once(self):
+        assert_that(self.command.is_valid(TOKEN_ID, ACL))
+        assert_that(self.command.is_valid(TOKEN_ID, ACL))
+        assert_that(self.command.get(TOKEN_ID), equal_to(self.token))
+
+        self.token_command.get.assert_called_once_with(TOKEN_ID, ACL, None)
+        self.token_command.is_valid.assert_not_called()
+
+    def test_is_valid_refused(self):
+        self.token_command.get.side_effect = http_error(403)
+
+        assert_that(self.command.is_valid(TOKEN_ID, ACL), equal_to(False))
+        assert_that(self.command.is_valid(TOKEN_ID, ACL), equal_to(False))
+        assert_that(self.token_command.get.call_count, equal_to(2))
+
+    def test_is_valid_unreachable(self):
+        self.token_command.get.side_effect = http_error(503)
+
+        assert_that(
+            calling(self.command.is_valid).with_args(TOKEN_ID, ACL),
+            raises(requests.HTTPError),
+        )
@@ -0,0 +1,189 @@
+# Copyright 2022 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import hashlib
+import logging
+import threading
+import time
+
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+import requests
+
+from xivo.auth_verifier import AuthVerifier
+
+logger = logging.getLogger(__name__)
+
+INVALID_TOKEN_STATUS_CODES = (401, 403, 404)
+
+
+class _CachedToken:
+    __slots__ = ('token', 'verified', 'expires_at')
+
+    def __init__(self, token, expires_at):
+        self.token = token
+        # (required_acl, tenant) pairs already accepted by wazo-auth
+        self.verified = set()
+        self.expires_at = expires_at
+
+    @property
+    def session_uuid(self):
+        return self.token.get('session_uuid')
+
+
+class TokenCache:
+    """Bounded cache of the tokens verified by wazo-auth
+
+    The tokens are keyed on their hash and kept at most `ttl` seconds, never
+    past their own expiration. Only the accepted ACL and tenant checks are
+    cached, a refused token is always asked again to wazo-auth.
+    """
+
+    def __init__(self, ttl=30, max_size=10000):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._tokens = OrderedDict()
+        self._sessions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_config(cls, token_cache_config):
+        return cls(
+            ttl=token_cache_config['ttl'], max_size=token_cache_config['max_size']
+        )
+
+    def get(self, token_id, required_acl=None, tenant=None):
+        """Return the cached token if wazo-auth already accepted this check"""
+        key = _hash(token_id)
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached and cached.expires_at <= time.monotonic():
+                self._remove(key)
+                cached = None
+            if not cached or not self._is_verified(cached, required_acl, tenant):
+                self._misses += 1
+                return None
+            self._tokens.move_to_end(key)
+            self._hits += 1
+            return cached.token
+
+    def add(self, token_id, token, required_acl=None, tenant=None):
+        key = _hash(token_id)
+        with self._lock:
+            cached = self._tokens.get(key)
+            if not cached:
+                ttl = min(self._ttl, _remaining_seconds(token, self._ttl))
+                if ttl <= 0:
+                    return
+                cached = self._tokens[key] = _CachedToken(token, time.monotonic() + ttl)
+                if cached.session_uuid:
+                    self._sessions[cached.session_uuid].add(key)
+                while len(self._tokens) > self._max_size:
+                    self._remove(next(iter(self._tokens)))
+            cached.verified.add((required_acl, tenant))
+
+    def invalidate_session(self, session_uuid):
+        with self._lock:
+            for key in self._sessions.pop(session_uuid, ()):
+                self._tokens.pop(key, None)
+
+    def on_session_deleted(self, event):
+        self.invalidate_session(event['uuid'])
+
+    def provide_status(self, status):
+        with self._lock:
+            status['token_cache'].update(
+                size=len(self._tokens),
+                max_size=self._max_size,
+                hits=self._hits,
+                misses=self._misses,
+            )
+
+    def _is_verified(self, cached, required_acl, tenant):
+        if required_acl is None and tenant is None:
+            return True
+        return (required_acl, tenant) in cached.verified
+
+    def _remove(self, key):
+        cached = self._tokens.pop(key)
+        keys = self._sessions.get(cached.session_uuid)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._sessions[cached.session_uuid]
+
+
+class CachedTokenCommand:
+    """The token command of an auth client, answered from the cache when possible
+
+    On a cache miss, `is_valid` gets the token instead of only checking it:
+    the same request to wazo-auth returns what the cache needs.
+    """
+
+    def __init__(self, token_command, token_cache):
+        self._token_command = token_command
+        self._token_cache = token_cache
+
+    def __getattr__(self, name):
+        return getattr(self._token_command, name)
+
+    def is_valid(self, token, required_acl=None, tenant=None):
+        try:
+            self.get(token, required_acl, tenant)
+        except requests.HTTPError as e:
+            if e.response is not None and (
+                e.response.status_code in INVALID_TOKEN_STATUS_CODES
+            ):
+                return False
+            raise
+        return True
+
+    def get(self, token, required_acl=None, tenant=None):
+        cached = self._token_cache.get(token, required_acl, tenant)
+        if cached is not None:
+            return cached
+
+        result = self._token_command.get(token, required_acl, tenant)
+        self._token_cache.add(token, result, required_acl, tenant)
+        return result
+
+
+class CachedAuthClient:
+    def __init__(self, auth_client, token_cache):
+        self._auth_client = auth_client
+        self.token = CachedTokenCommand(auth_client.token, token_cache)
+
+    def __getattr__(self, name):
+        return getattr(self._auth_client, name)
+
+
+class CachingAuthVerifier(AuthVerifier):
+    _token_cache = None
+
+    def set_token_cache(self, token_cache):
+        self._token_cache = token_cache
+
+    def client(self):
+        auth_client = super().client()
+        if not self._token_cache:
+            return auth_client
+        return CachedAuthClient(auth_client, self._token_cache)
+
+
+def _hash(token_id):
+    return hashlib.sha256(token_id.encode()).hexdigest()
+
+
+def _remaining_seconds(token, default):
+    expires_at = token.get('utc_expires_at')
+    if not expires_at:
+        return default
+    try:
+        expiration = datetime.fromisoformat(expires_at)
+    except (TypeError, ValueError):
+        logger.debug('Unknown token expiration format: %s', expires_at)
+        return default
+    return (expiration - datetime.utcnow()).total_seconds()